@@ -0,0 +1,241 @@
+"""Concurrent reads and writes against one shared VectorDB.
+
+Reader threads run hybrid, semantic and keyword searches (as chat sessions
+do) while writer threads ingest contracts with save_to_vector_db, against
+benchmarks/fake_upstage.py. Three phases:
+
+    read-only      readers alone, for the baseline read throughput
+    mixed          readers while writers ingest contracts
+    clear          readers while the collection is cleared
+
+Checks, any failure exits with status 1:
+    - no search raises
+    - a contract is never half visible: whenever its summary is in the
+      contract index, all of its chunks are in the store, and vice versa
+    - after the writers finish, every contract is found by its unique
+      keyword and has exactly the chunks its writer saved
+    - after clear_collection, searches return nothing
+
+Usage:
+    python benchmarks/concurrency_stress.py
+    python benchmarks/concurrency_stress.py --readers 16 --writers 4 --contracts 40 --shards 2
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstage import start_server
+from pipeline import bulk_load, synthetic_contract, synthetic_queries
+
+
+def marker(index: int) -> str:
+    # A token that appears in exactly one contract, for the final keyword check
+    return f"zqmarker{index}"
+
+
+class Readers:
+    """Reader threads that search until stopped, recording latencies and errors."""
+
+    def __init__(self, db, count: int, queries: list):
+        self.db = db
+        self.queries = queries
+        self.stop = threading.Event()
+        self.latencies = []
+        self.errors = []
+        self.torn = []
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run, args=(i,)) for i in range(count)]
+
+    def run(self, worker: int):
+        i = worker
+        while not self.stop.is_set():
+            query = self.queries[i % len(self.queries)]
+            keywords = query.lower().strip("?").split()[3:]
+            start = time.perf_counter()
+            try:
+                kind = i % 3
+                if kind == 0:
+                    self.db.hybrid_search({"keywords": keywords, "key_points": [], "contract_types": []}, n_results=5)
+                elif kind == 1:
+                    self.db.semantic_search(self.db.embed_query(query), n_results=5)
+                else:
+                    self.db.keyword_search(keywords, 5)
+                elapsed = time.perf_counter() - start
+                if (i // len(self.threads)) % 4 == 0:
+                    self.check_snapshot()
+            except Exception:
+                with self.lock:
+                    self.errors.append(traceback.format_exc())
+                continue
+            with self.lock:
+                self.latencies.append(elapsed)
+            i += len(self.threads)
+
+    def check_snapshot(self):
+        # Under one read lock, chunks and summaries must agree for every ingested contract
+        with self.db.rw_lock.read():
+            summarized = {m["contract_id"] for m in self.db.contract_index.get(
+                where={"file_name": {"$ne": "bulk.pdf"}}, include=["metadatas"])["metadatas"]}
+            chunked = set()
+            for shard in self.db.shards:
+                chunked.update(m["contract_id"] for m in shard.get(
+                    where={"file_name": {"$ne": "bulk.pdf"}}, include=["metadatas"])["metadatas"])
+        if summarized != chunked:
+            with self.lock:
+                self.torn.append(summarized ^ chunked)
+
+    def __enter__(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def report(self, name: str, elapsed: float) -> dict:
+        return {
+            "phase": name,
+            "reads_per_s": len(self.latencies) / elapsed,
+            "p50": float(np.percentile(self.latencies, 50) * 1000) if self.latencies else float("nan"),
+            "p99": float(np.percentile(self.latencies, 99) * 1000) if self.latencies else float("nan"),
+            "errors": len(self.errors),
+            "torn": len(self.torn),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--contracts", type=int, default=16, help="Contracts ingested in the mixed phase")
+    parser.add_argument("--chunks", type=int, default=2000, help="Chunks bulk-loaded before the run")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=3, help="Length of the read-only phase")
+    parser.add_argument("--embed-latency-ms", type=float, default=5)
+    parser.add_argument("--dim", type=int, default=64)
+    args = parser.parse_args()
+
+    server = start_server(0, 0, args.embed_latency_ms, 0, args.dim)
+    os.environ["UPSTAGE_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["UPSTAGE_API_KEY"] = "benchmark"
+    os.environ["TRACING_ENABLED"] = "0"
+    os.environ["UPSTAGE_EMBEDDINGS_RPS"] = "100000"
+    os.environ["UPSTAGE_EMBEDDINGS_BURST"] = "100000"
+    os.environ["UPSTAGE_EMBEDDINGS_MAX_IN_FLIGHT"] = "64"
+
+    from src.database.vector_db import VectorDB
+    from src.database import sqlite_db
+
+    workdir = tempfile.mkdtemp(prefix="concurrency-stress-")
+    # Ingestion also writes clause records; keep them out of data/contract_events.db
+    sqlite_db.DB_PATH = os.path.join(workdir, "events.db")
+    sqlite_db.init_db()
+    rng = np.random.default_rng(0)
+    queries = synthetic_queries(200, rng)
+    failures = []
+    results = []
+    devnull = open(os.devnull, "w")
+    try:
+        with contextlib.redirect_stdout(devnull):
+            db = VectorDB(persist_directory=workdir, num_shards=args.shards)
+            bulk_load(db, args.chunks, args.dim, rng)
+
+        # Phase 1: readers alone
+        with contextlib.redirect_stdout(devnull), Readers(db, args.readers, queries) as readers:
+            start = time.perf_counter()
+            time.sleep(args.seconds)
+        results.append(readers.report("read-only", time.perf_counter() - start))
+        failures += readers.errors
+
+        # Phase 2: readers while writers ingest
+        contracts = []
+        for index in range(args.contracts):
+            contract = synthetic_contract(index, 2, rng)
+            contract["ocr"]["pages"][0]["text"] += (f"\n\nReference code {marker(index)} applies to every order, invoice and notice "
+                                                  f"sent under this agreement and must be quoted in all correspondence.")
+            contracts.append(contract)
+        saved = {}
+        write_errors = []
+
+        def writer(worker: int):
+            for index in range(worker, len(contracts), args.writers):
+                contract = contracts[index]
+                try:
+                    contract_id = db.save_to_vector_db(contract["summary"], contract["ocr"], contract["file_name"])
+                    chunks = sum(len(shard.get(where={"contract_id": contract_id})["ids"]) for shard in db.shards)
+                    saved[index] = (contract_id, chunks)
+                except Exception:
+                    write_errors.append(traceback.format_exc())
+
+        write_lock_before = dict(db.rw_lock.stats)
+        with contextlib.redirect_stdout(devnull), Readers(db, args.readers, queries) as readers:
+            start = time.perf_counter()
+            writers = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+            for thread in writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+        elapsed = time.perf_counter() - start
+        results.append(readers.report("mixed", elapsed))
+        failures += readers.errors + write_errors
+        failures += [f"Torn read: {sorted(diff)}" for diff in readers.torn]
+        writes = db.rw_lock.stats["writes"] - write_lock_before["writes"]
+        print(f"Ingested {len(saved)}/{len(contracts)} contracts in {elapsed:.1f}s "
+              f"({writes} write-lock sections, {len(saved) / elapsed:.1f} contracts/s)")
+
+        # Every contract is complete and findable once the writers are done
+        with contextlib.redirect_stdout(devnull):
+            for index, (contract_id, chunks) in saved.items():
+                hits = db.keyword_search([marker(index)], 5)
+                if not hits or hits[0]["metadata"]["contract_id"] != contract_id:
+                    failures.append(f"Contract {index} not found by its keyword after ingestion")
+                stored = sum(len(shard.get(where={"contract_id": contract_id})["ids"]) for shard in db.shards)
+                if stored != chunks:
+                    failures.append(f"Contract {index}: {stored} chunks stored, {chunks} saved")
+
+        # Phase 3: clear while reading
+        with contextlib.redirect_stdout(devnull), Readers(db, args.readers, queries) as readers:
+            start = time.perf_counter()
+            time.sleep(0.2)
+            db.clear_collection()
+            time.sleep(0.5)
+        results.append(readers.report("clear", time.perf_counter() - start))
+        failures += readers.errors + [f"Torn read: {sorted(diff)}" for diff in readers.torn]
+        with contextlib.redirect_stdout(devnull):
+            leftover = db.keyword_search(["payment"], 5) + db.semantic_search(db.embed_query("payment"), 5)
+        if leftover:
+            failures.append(f"{len(leftover)} results after clear_collection")
+
+        print(f"{'phase':>10} {'reads/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'torn':>5}")
+        for r in results:
+            print(f"{r['phase']:>10} {r['reads_per_s']:>9.1f} {r['p50']:>8.1f} {r['p99']:>8.1f} {r['errors']:>7} {r['torn']:>5}")
+        stats = db.rw_lock.stats
+        print(f"Lock: {stats['reads']} reads waited {stats['read_wait_s'] * 1000:.0f} ms in total, "
+              f"{stats['writes']} writes waited {stats['write_wait_s'] * 1000:.0f} ms in total")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"FAILED: {len(failures)} problem(s)")
+        for failure in failures[:10]:
+            print(failure)
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Deadline index: portfolio date queries as the number of contracts grows.
+
+Indexes synthetic contract summaries (renewing and fixed-term, with relative
+and recurring dates) into a temporary SQLite file, then times typical
+portfolio questions. Query time should grow with the number of matches, not
+with the number of contracts.
+
+Usage:
+    python benchmarks/deadlines.py --sizes 1000 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUESTIONS = [
+    "Which renewals are in Q3?",
+    "notice periods ending within 45 days",
+    "List all deadlines in the next 7 days",
+    "Which contracts expire next month?",
+]
+
+
+def synthetic_summary(index: int, rng) -> dict:
+    start = date(2020, 1, 1) + timedelta(days=int(rng.integers(0, 365 * 6)))
+    years = int(rng.integers(1, 5))
+    renewing = rng.random() < 0.6
+    return {
+        "title": f"Agreement {index}",
+        "duration": {
+            "start_date": start.isoformat(),
+            "end_date": start.replace(year=start.year + years).isoformat() if start.month != 2 or start.day != 29 else "None",
+            "initial_term": f"{years} years" + (", renews automatically for successive 1 year terms" if renewing else "")
+        },
+        "key_conditions": [{"description": f"Non-renewal requires {int(rng.choice([30, 60, 90]))} days written notice before the end of the term"}],
+        "important_dates": [
+            {"date": f"{int(rng.integers(10, 90))} days after the Effective Date", "description": "First delivery"},
+            {"date": "Annually", "description": "Price review"},
+            {"date": f"{int(rng.integers(1, 28))}th of each month", "description": "Invoice payment due"},
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from src.database import sqlite_db
+    from src.services import deadlines
+
+    print(f"{'contracts':>10} {'rows':>9} {'index s':>8}  " + "  ".join(f"{q[:24]:>24}" for q in QUESTIONS))
+    for size in args.sizes:
+        sqlite_db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="deadlines-"), "events.db")
+        sqlite_db.init_db()
+        rng = np.random.default_rng(size)
+        today = date(2026, 6, 15)
+
+        start = time.perf_counter()
+        for index in range(size):
+            deadlines.index_contract_deadlines(f"contract-{index}", synthetic_summary(index, rng), today)
+        index_seconds = time.perf_counter() - start
+        rows = len(sqlite_db.query_deadlines("0000-01-01", "9999-12-31"))
+
+        cells = []
+        for question in QUESTIONS:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = deadlines.answer_deadline_question(question, today)
+                timings.append(time.perf_counter() - start)
+            cells.append(f"{np.median(timings) * 1000:>9.2f} ms {len(response['deadlines']):>6} hits")
+        print(f"{size:>10} {rows:>9} {index_seconds:>8.1f}  " + "  ".join(f"{c:>24}" for c in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Near-duplicate chunk deduplication at ingest, on a boilerplate-heavy corpus.
+
+Ingests synthetic contracts built from a shared library of boilerplate clauses
+(some with small per-contract edits) plus contract-specific terms, once with
+deduplication off and once with it on, against benchmarks/fake_upstage.py.
+Reports the chunks stored, embedding requests, ingest time, and how many of
+the top search results are near-duplicates of a better-ranked result.
+
+Usage:
+    python benchmarks/dedup.py
+    python benchmarks/dedup.py --contracts 200 --queries 50
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstage import start_server
+from pipeline import CLAUSES, PARTIES
+
+BOILERPLATE = [
+    "Definitions. In this Agreement, \"Affiliate\" means any entity that directly or indirectly controls, is controlled by or is under "
+    "common control with a party; \"Business Day\" means a day other than a Saturday, Sunday or public holiday; \"Confidential "
+    "Information\" means all information disclosed by a party that is marked confidential or would reasonably be understood to be "
+    "confidential; and \"Intellectual Property Rights\" means patents, copyrights, trade marks, designs and all similar rights.",
+    "Confidentiality. Each party shall keep confidential all Confidential Information disclosed by the other party in connection with "
+    "this Agreement and shall not disclose it to any third party without prior written consent, except as required by law or by order "
+    "of a competent court. These obligations do not apply to information that is or becomes publicly available through no fault of the "
+    "receiving party, or that was lawfully known to the receiving party before disclosure.",
+    "Force Majeure. Neither party shall be liable for any failure or delay in performing its obligations where such failure or delay "
+    "results from events beyond its reasonable control, including acts of God, war, terrorism, riots, epidemics, fire, flood, strikes "
+    "or failures of public utilities. The affected party shall notify the other party promptly and use reasonable efforts to resume "
+    "performance as soon as possible.",
+    "Entire Agreement. This Agreement constitutes the entire agreement between the parties relating to its subject matter and "
+    "supersedes all prior agreements, representations and understandings, whether written or oral. No amendment or variation of this "
+    "Agreement shall be effective unless it is in writing and signed by authorised representatives of both parties.",
+    "Assignment. Neither party may assign, transfer, subcontract or otherwise deal with any of its rights or obligations under this "
+    "Agreement without the prior written consent of the other party, such consent not to be unreasonably withheld or delayed, except "
+    "that either party may assign this Agreement to an Affiliate or to a successor to all or substantially all of its business.",
+    "Severability. If any provision of this Agreement is held by a court of competent jurisdiction to be invalid, illegal or "
+    "unenforceable, that provision shall be modified to the minimum extent necessary to make it enforceable, and the remaining "
+    "provisions of this Agreement shall continue in full force and effect without being impaired or invalidated in any way.",
+    "Anti-Bribery. Each party shall comply with all applicable laws relating to anti-bribery and anti-corruption, shall not offer, "
+    "give, request or accept any bribe or improper payment, and shall maintain adequate policies and procedures to prevent bribery by "
+    "its employees, agents and subcontractors. Any breach of this clause is a material breach of this Agreement.",
+    "Data Protection. Each party shall comply with applicable data protection laws when processing personal data under this "
+    "Agreement, shall implement appropriate technical and organisational measures to protect such data against unauthorised or "
+    "unlawful processing and accidental loss, and shall notify the other party without undue delay of any personal data breach.",
+]
+QUERIES = ["confidential information disclosure third party", "force majeure events beyond reasonable control",
+           "entire agreement amendment in writing", "assignment consent affiliate successor", "personal data breach notification",
+           "anti-bribery improper payment", "severability invalid provision", "payment invoice late interest",
+           "termination written notice", "liability limited fees"]
+
+
+def synthetic_contract(index: int, rng) -> dict:
+    seller, buyer = rng.choice(PARTIES, size=2, replace=False)
+    specific = [" ".join(clause.format(buyer=buyer, seller=seller, days=int(rng.integers(10, 120)),
+                                       rate=round(float(rng.uniform(0.5, 3)), 1), years=int(rng.integers(1, 6)),
+                                       months=int(rng.integers(3, 36))) for clause in rng.choice(CLAUSES, size=2))
+                for _ in range(4)]
+    boilerplate = list(rng.choice(BOILERPLATE, size=6, replace=False))
+    # A third of the contracts edit their copy slightly, as negotiated templates do
+    if rng.random() < 0.33:
+        boilerplate[0] = boilerplate[0].replace("this Agreement", f"this Agreement between {seller} and {buyer}", 1)
+    paragraphs = specific + boilerplate
+    rng.shuffle(paragraphs)
+    pages = [{"id": page + 1, "text": "\n\n".join(paragraphs[page * 5:(page + 1) * 5])} for page in range(2)]
+    summary = {
+        "title": f"Supply Agreement {index}",
+        "parties": [{"name": seller, "role": "Supplier"}, {"name": buyer, "role": "Distributor"}],
+        "overview": f"{seller} supplies goods to {buyer}."
+    }
+    return {"summary": summary, "ocr": {"pages": pages}, "file_name": f"contract_{index}.pdf"}
+
+
+def run(dedup: bool, contracts: list, args, server) -> dict:
+    from src.database import sqlite_db
+    from src.database.vector_db import VectorDB
+    from src.database.near_duplicates import NearDuplicateIndex
+
+    workdir = tempfile.mkdtemp(prefix="dedup-bench-")
+    sqlite_db.DB_PATH = os.path.join(workdir, "events.db")
+    sqlite_db.init_db()
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db = VectorDB(persist_directory=workdir)
+            db.dedup = dedup
+            requests_before = server.stats["requests"]
+            start = time.perf_counter()
+            for contract in contracts:
+                db.save_to_vector_db(contract["summary"], contract["ocr"], contract["file_name"])
+            ingest_seconds = time.perf_counter() - start
+            requests = server.stats["requests"] - requests_before
+
+            # Near-duplicate hits among the top results, judged the same way for both runs
+            judge = NearDuplicateIndex()
+            semantic_dupes, hybrid_dupes = [], []
+            for query in QUERIES[:args.queries]:
+                hits = [hit["document"] for hit in db.semantic_search(db.embed_query(query), args.top_k)]
+                semantic_dupes.append(len(hits) - len(judge.collapse(hits)))
+                results = [r["document"] for r in db.hybrid_search({"keywords": query.split(), "key_points": [], "contract_types": []},
+                                                                   args.top_k)]
+                hybrid_dupes.append(len(results) - len(judge.collapse(results)))
+        return {
+            "chunks": sum(shard.count() for shard in db.shards),
+            "requests": requests,
+            "ingest_s": ingest_seconds,
+            "semantic_dupes": float(np.mean(semantic_dupes)),
+            "hybrid_dupes": float(np.mean(hybrid_dupes)),
+            "disk_mb": sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(workdir) for f in files) / 1e6,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contracts", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=len(QUERIES))
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--embed-latency-ms", type=float, default=2)
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    server = start_server(0, 0, args.embed_latency_ms, 0, args.dim)
+    os.environ["UPSTAGE_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["UPSTAGE_API_KEY"] = "benchmark"
+    os.environ["TRACING_ENABLED"] = "0"
+    os.environ["UPSTAGE_EMBEDDINGS_RPS"] = "100000"
+    os.environ["UPSTAGE_EMBEDDINGS_BURST"] = "100000"
+
+    rng = np.random.default_rng(0)
+    contracts = [synthetic_contract(index, rng) for index in range(args.contracts)]
+    try:
+        results = {"off": run(False, contracts, args, server), "on": run(True, contracts, args, server)}
+    finally:
+        server.shutdown()
+
+    print(f"{'dedup':>6} {'chunks':>7} {'embed+chat req':>15} {'ingest s':>9} {'disk MB':>8} "
+          f"{'dupes/semantic top-' + str(args.top_k):>22} {'dupes/hybrid top-' + str(args.top_k):>20}")
+    for name, r in results.items():
+        print(f"{name:>6} {r['chunks']:>7} {r['requests']:>15} {r['ingest_s']:>9.1f} {r['disk_mb']:>8.1f} "
+              f"{r['semantic_dupes']:>22.2f} {r['hybrid_dupes']:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
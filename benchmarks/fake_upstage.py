@@ -0,0 +1,192 @@
+"""Local stand-in for the Upstage chat-completions, embeddings and OCR endpoints.
+
+Responses are deterministic: embeddings are hashed bag-of-words vectors (so
+similar texts get similar vectors) and chat replies are canned JSON picked by
+the system prompt. Latency per endpoint is configurable, and a share of
+requests can be failed with 429 (with Retry-After) or slowed down, to exercise
+the request scheduler.
+
+Usage:
+    python benchmarks/fake_upstage.py --port 8765 --latency-ms 300 --embed-latency-ms 20
+    python benchmarks/fake_upstage.py --error-rate 0.2 --slow-rate 0.05 --slow-ms 2000
+    UPSTAGE_API_BASE=http://127.0.0.1:8765 streamlit run main.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+CONTRACT_TERMS = ("termination", "renewal", "payment", "liability", "notice", "confidentiality",
+                  "indemnification", "warranty", "breach", "arbitration", "rent", "invoice", "supplier")
+
+SUMMARY = {
+    "title": "Synthetic Supply Agreement",
+    "duration": {"start_date": "2024-01-01", "end_date": "2026-12-31", "initial_term": "3 years, renews yearly"},
+    "parties": [{"name": "Acme Corp", "role": "Supplier"}, {"name": "Globex Ltd", "role": "Distributor"}],
+    "overview": "Acme supplies goods to Globex. Payment is due within 30 days of invoice. Either party may terminate with 90 days notice.",
+    "key_conditions": [
+        {"priority": "high", "description": "Payment within 30 days of invoice", "potential_impact": "Late fees"},
+        {"priority": "medium", "description": "90 days termination notice", "potential_impact": "Breach of contract"}
+    ],
+    "important_dates": [{"priority": "high", "date": "2024-03-31", "description": "First delivery"}],
+    "others": [{"topic": "Governing law", "details": "Laws of the State of New York"}]
+}
+
+
+def fake_embedding(text: str, dim: int = 256) -> list:
+    """Feature-hashed bag of words plus a little text-specific noise, unit length."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        digest = int(hashlib.md5(token.encode("utf-8")).hexdigest()[:8], 16)
+        vector[digest % dim] += 1.0 if digest & 1 else -1.0
+    rng = np.random.default_rng(int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16))
+    vector += rng.normal(0, 0.1, dim).astype(np.float32)
+    return (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+
+
+def fake_chat_reply(messages: list) -> str:
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    if "extracting key information" in system:
+        return json.dumps(SUMMARY)
+    if "dividing text into logical chunks" in system:
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", user) if p.strip()]
+        return json.dumps([{"content": p, "title": p[:30]} for p in paragraphs])
+    if "analyzing user queries" in system:
+        query = user.lower()
+        keywords = [term for term in CONTRACT_TERMS if term in query] or ["agreement"]
+        return json.dumps({"is_contract_related": True, "key_points": keywords[:2],
+                           "contract_types": ["supply agreement"], "keywords": keywords})
+    if "answering questions about contracts" in system:
+        return json.dumps({"answer": "Payment is due within 30 days of invoice.",
+                           "references": [{"file_name": "contract_0.pdf", "page": 1, "relevance": "Payment clause"}],
+                           "confidence": 0.8})
+    if "evaluating responses" in system:
+        return json.dumps({"evaluation_score": 0.85, "feedback": "Accurate.", "suggestions_for_improvement": []})
+    if "completing JSON" in system:
+        return json.dumps({"answer": "", "references": [], "confidence": 0.0})
+    return "This is a general answer."
+
+
+class FakeUpstageHandler(BaseHTTPRequestHandler):
+    server_version = "FakeUpstage/1.0"
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_faults(self) -> bool:
+        """Maybe delay the request or fail it with a 429. Returns True if a 429 was sent."""
+        config = self.server.config
+        with self.server.fault_lock:
+            throttle = self.server.fault_rng.random() < config["error_rate"]
+            slow = not throttle and self.server.fault_rng.random() < config["slow_rate"]
+            self.server.stats["requests"] += 1
+            self.server.stats["throttled"] += throttle
+            self.server.stats["slowed"] += slow
+        if throttle:
+            body = b'{"error": {"message": "Too many requests", "code": "too_many_requests"}}'
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", str(config["retry_after"]))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return True
+        if slow:
+            time.sleep(config["slow_ms"] / 1000)
+        return False
+
+    def do_POST(self):
+        config = self.server.config
+        body = self._read_body()
+        if self._inject_faults():
+            return
+        if self.path.endswith("/chat/completions"):
+            request = json.loads(body)
+            time.sleep(config["latency_ms"] / 1000)
+            content = fake_chat_reply(request.get("messages", []))
+            prompt_tokens = sum(len(m["content"].split()) for m in request.get("messages", []))
+            self._send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "solar-1-mini-chat"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split()),
+                          "total_tokens": prompt_tokens + len(content.split())}
+            })
+        elif self.path.endswith("/embeddings"):
+            request = json.loads(body)
+            time.sleep(config["embed_latency_ms"] / 1000)
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            tokens = sum(len(text.split()) for text in inputs)
+            self._send_json({
+                "object": "list", "model": request.get("model", ""),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, config["dim"])}
+                         for i, text in enumerate(inputs)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+            })
+        elif self.path.endswith("/document-ai/ocr"):
+            time.sleep(config["ocr_latency_ms"] / 1000)
+            text = f"Scanned page. Payment is due within 30 days of invoice. Document size {len(body)} bytes."
+            self._send_json({"text": text, "pages": [{"id": 1, "text": text}],
+                             "numBilledPages": 1, "modelVersion": "fake-ocr"})
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 0, latency_ms: float = 0, embed_latency_ms: float = 0,
+                 ocr_latency_ms: float = 0, dim: int = 256, error_rate: float = 0.0, slow_rate: float = 0.0,
+                 slow_ms: float = 0.0, retry_after: float = 0.0, seed: int = 0) -> ThreadingHTTPServer:
+    """Start the fake server on a daemon thread; port 0 picks a free port (see server.server_address)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeUpstageHandler)
+    server.daemon_threads = True
+    server.config = {"latency_ms": latency_ms, "embed_latency_ms": embed_latency_ms,
+                     "ocr_latency_ms": ocr_latency_ms, "dim": dim, "error_rate": error_rate,
+                     "slow_rate": slow_rate, "slow_ms": slow_ms, "retry_after": retry_after}
+    server.fault_rng = random.Random(seed)
+    server.fault_lock = threading.Lock()
+    server.stats = {"requests": 0, "throttled": 0, "slowed": 0}
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-upstage").start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency of chat completions")
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--ocr-latency-ms", type=float, default=0)
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimensions")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    server = start_server(args.port, args.latency_ms, args.embed_latency_ms, args.ocr_latency_ms, args.dim,
+                          args.error_rate, args.slow_rate, args.slow_ms, args.retry_after)
+    print(f"Fake Upstage API on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
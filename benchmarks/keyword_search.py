@@ -0,0 +1,95 @@
+"""Keyword search benchmark: columnar BM25Index vs. the old BM25Okapi + argsort path.
+
+Usage:
+    python benchmarks/keyword_search.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.bm25_index import BM25Index
+
+CONTRACT_TERMS = ["termination", "renewal", "payment", "governing", "law", "liability", "notice",
+                  "confidentiality", "indemnification", "supplier", "distributor", "agreement",
+                  "effective", "date", "invoice", "warranty", "breach", "arbitration"]
+
+
+def synthetic_corpus(n_docs: int, doc_length: int = 120, vocab_size: int = 20000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)] + CONTRACT_TERMS)
+    # Zipf-like term distribution, close to what real contract text looks like
+    ranks = np.arange(1, len(vocab) + 1)
+    probs = 1 / ranks
+    probs /= probs.sum()
+    rng.shuffle(probs)
+    words = rng.choice(vocab, size=(n_docs, doc_length), p=probs)
+    documents = [" ".join(row).capitalize() + "." for row in words]
+    ids = [f"doc_{i}" for i in range(n_docs)]
+    metadatas = [{"contract_id": f"c{i // 50}", "page_number": 1} for i in range(n_docs)]
+    return ids, documents, metadatas
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def bench_columnar(ids, documents, metadatas, queries, n_results):
+    start = time.perf_counter()
+    index = BM25Index(ids, documents, metadatas)
+    build = time.perf_counter() - start
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.top_k(query, n_results)
+        timings.append(time.perf_counter() - start)
+    return build, timings
+
+
+def bench_legacy(ids, documents, metadatas, queries, n_results):
+    from rank_bm25 import BM25Okapi
+    start = time.perf_counter()
+    bm25 = BM25Okapi([doc.split() for doc in documents])
+    build = time.perf_counter() - start
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        scores = bm25.get_scores(query.split())
+        [{'id': ids[i], 'document': documents[i], 'metadata': metadatas[i], 'score': scores[i]}
+         for i in scores.argsort()[::-1][:n_results]]
+        timings.append(time.perf_counter() - start)
+    return build, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--legacy-max", type=int, default=100_000,
+                        help="Skip the old path above this corpus size (it is very slow)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = [" ".join(rng.choice(CONTRACT_TERMS, size=4)) for _ in range(args.queries)]
+
+    print(f"{'chunks':>10} {'path':>9} {'build s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for size in args.sizes:
+        ids, documents, metadatas = synthetic_corpus(size)
+        paths = [("columnar", bench_columnar)]
+        if size <= args.legacy_max:
+            try:
+                import rank_bm25  # noqa: F401
+                paths.append(("legacy", bench_legacy))
+            except ImportError:
+                pass
+        for name, bench in paths:
+            build, timings = bench(ids, documents, metadatas, queries, args.n_results)
+            print(f"{size:>10} {name:>9} {build:>9.2f} {percentile_ms(timings, 50):>9.2f} {percentile_ms(timings, 99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Offline ingestion and retrieval benchmark against a local fake Upstage API.
+
+Starts benchmarks/fake_upstage.py in-process, points Solar and OCR at it and
+drives the real code paths over synthetic contract corpora:
+
+    ocr        OCR.process_document
+    splitter   VectorDB.semantic_splitter, per page
+    ingest     VectorDB.save_to_vector_db, per contract
+    keyword    VectorDB.keyword_search, per query (BM25 build reported separately)
+    hybrid     VectorDB.hybrid_search, per query
+    chat       local query analysis -> hybrid search -> answer -> self-evaluate, as on the chat page
+
+Corpus size is the number of chunks in the store. Only --ingest-contracts
+contracts go through save_to_vector_db; the rest of the corpus is bulk-loaded
+with the same fake vectors so large sizes stay practical. Each size uses a
+fresh Chroma directory under a temp dir, never data/chroma_db.
+
+Reports throughput, p50/p99 latency and the process's peak RSS after each
+stage. --save-baseline stores the results in benchmarks/baselines/pipeline.json;
+--check compares against it and exits with status 1 on a regression.
+
+Usage:
+    python benchmarks/pipeline.py --sizes 10 1000 10000
+    python benchmarks/pipeline.py --repeat 3 --save-baseline
+    python benchmarks/pipeline.py --repeat 3 --check
+    python benchmarks/pipeline.py --sizes 100000 --latency-ms 300 --embed-latency-ms 20
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstage import start_server, fake_embedding, CONTRACT_TERMS
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "pipeline.json")
+# Latency differences below this are noise, whatever the relative change
+MIN_REGRESSION_MS = 0.5
+
+PARTIES = ["Acme Corp", "Globex Ltd", "Initech", "Umbrella Inc", "Stark Industries", "Wayne Enterprises"]
+CLAUSES = [
+    "Payment. The {buyer} shall pay each invoice within {days} days of receipt. Late payment accrues interest of {rate}% per month.",
+    "Termination. Either party may terminate this agreement with {days} days written notice. Termination for breach requires a cure period.",
+    "Renewal. This agreement renews automatically for successive {years} year terms unless either party gives notice of non-renewal.",
+    "Confidentiality. Each party shall keep the other party's confidential information secret for {years} years after termination.",
+    "Liability. The liability of {seller} under this agreement is limited to the fees paid in the preceding {months} months.",
+    "Indemnification. {seller} shall indemnify {buyer} against third-party claims arising from a breach of warranty.",
+    "Warranty. {seller} warrants that the goods are free from defects for {months} months after delivery.",
+    "Governing law. This agreement is governed by the laws of the State of New York. Disputes go to binding arbitration.",
+]
+
+
+def synthetic_contract(index: int, pages: int, rng) -> dict:
+    seller, buyer = rng.choice(PARTIES, size=2, replace=False)
+    ocr_pages = []
+    for page_number in range(1, pages + 1):
+        paragraphs = [clause.format(buyer=buyer, seller=seller, days=int(rng.integers(10, 120)),
+                                    rate=round(float(rng.uniform(0.5, 3)), 1), years=int(rng.integers(1, 6)),
+                                    months=int(rng.integers(3, 36)))
+                      for clause in rng.choice(CLAUSES, size=12)]
+        ocr_pages.append({"id": page_number, "text": "\n\n".join(paragraphs)})
+    summary = {
+        "title": f"Supply Agreement {index}",
+        "parties": [{"name": seller, "role": "Supplier"}, {"name": buyer, "role": "Distributor"}],
+        "overview": f"{seller} supplies goods to {buyer}.",
+        "key_conditions": [{"priority": "high", "description": "Payment terms and termination notice"}]
+    }
+    return {"summary": summary, "ocr": {"pages": ocr_pages}, "file_name": f"contract_{index}.pdf"}
+
+
+def synthetic_queries(n: int, rng) -> list:
+    return [f"What are the {' and '.join(rng.choice(CONTRACT_TERMS, size=2, replace=False))} terms?" for _ in range(n)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def summarize(timings: list, units: int) -> dict:
+    total = sum(timings)
+    return {
+        "throughput": units / total if total > 0 else float("inf"),
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p99_ms": float(np.percentile(timings, 99) * 1000),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def timed(fn, items) -> list:
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bulk_load(db, n_chunks: int, dim: int, rng, batch_size: int = 5000):
+    """Fill the store up to n_chunks with synthetic chunks, bypassing the embedding API."""
+    shard = db.shards[0]
+    loaded = shard.count()
+    while loaded < n_chunks:
+        count = min(batch_size, n_chunks - loaded)
+        documents = [rng.choice(CLAUSES).format(buyer="Globex Ltd", seller="Acme Corp", days=int(rng.integers(10, 120)),
+                                                rate=1.5, years=int(rng.integers(1, 6)), months=int(rng.integers(3, 36)))
+                     for _ in range(count)]
+        ids = [f"bulk_{loaded + i}" for i in range(count)]
+        metadatas = [{"contract_id": f"bulk_contract_{(loaded + i) // 20}", "contract_name": "Bulk", "file_name": "bulk.pdf",
+                      "parties": "", "page_number": 1, "chunk_index": i % 20, "shard_key": "bulk"} for i in range(count)]
+        shard.add(ids=ids, embeddings=[fake_embedding(d, dim) for d in documents], metadatas=metadatas, documents=documents)
+
+        # The bulk contracts need summaries too, or the coarse contract stage would never pick them
+        contract_ids = sorted({m["contract_id"] for m in metadatas})
+        overviews = [f"Bulk supply agreement {contract_id}. Acme Corp supplies goods to Globex Ltd." for contract_id in contract_ids]
+        db.contract_index.upsert(
+            ids=[f"{contract_id}_overview" for contract_id in contract_ids],
+            embeddings=[fake_embedding(text, dim) for text in overviews],
+            metadatas=[{"contract_id": contract_id, "contract_name": "Bulk", "file_name": "bulk.pdf", "view": "overview"}
+                       for contract_id in contract_ids],
+            documents=overviews
+        )
+        loaded += count
+    db.invalidate_keyword_index()
+
+
+def chat_turn(analyzer, solar, db, prompt: str):
+    # Same flow as src/pages/chat_page.py, without the UI
+    analysis = analyzer.analyze(prompt)
+    if not analysis["is_contract_related"]:
+        return solar.talk_general(prompt)
+    results = db.hybrid_search(analysis=analysis, n_results=5)
+    response = solar.generate_response(prompt, results)
+    evaluation = solar.self_evaluate(prompt, response, results)
+    if evaluation["evaluation_score"] < 0.7:
+        improved = db.hybrid_search(analysis=analysis, n_results=10)
+        response = solar.generate_response(prompt, improved)
+        solar.self_evaluate(prompt, response, improved)
+    return response
+
+
+def run_size(size: int, args, rng) -> dict:
+    from src.services.chat import Solar
+    from src.services.ocr import OCR
+    from src.database.vector_db import VectorDB
+    from src.services.query_analyzer import QueryAnalyzer
+    from src.database import sqlite_db
+
+    workdir = tempfile.mkdtemp(prefix="contract-bench-")
+    # Ingestion also writes clause records; keep them out of data/contract_events.db
+    sqlite_db.DB_PATH = os.path.join(workdir, "events.db")
+    sqlite_db.init_db()
+    try:
+        solar = Solar()
+        db = VectorDB(solar=solar, persist_directory=workdir)
+        db.reducer = None  # The fake vectors are not in the stored reducer's input space
+        results = {}
+
+        ocr = OCR()
+        results["ocr"] = summarize(timed(lambda i: ocr.process_document(("page.pdf", b"%PDF-1.4 fake page")),
+                                         range(args.ocr_calls)), args.ocr_calls)
+
+        n_contracts = max(1, min(args.ingest_contracts, size // (args.pages * 2) or 1))
+        contracts = [synthetic_contract(i, args.pages, rng) for i in range(n_contracts)]
+        pages = [page["text"] for contract in contracts for page in contract["ocr"]["pages"]]
+        results["splitter"] = summarize(timed(db.semantic_splitter, pages), len(pages))
+
+        timings = timed(lambda c: db.save_to_vector_db(c["summary"], c["ocr"], c["file_name"]), contracts)
+        results["ingest"] = summarize(timings, db.shards[0].count())
+        results["ingest"]["contracts"] = n_contracts
+
+        bulk_load(db, size, args.dim, rng)
+        queries = synthetic_queries(args.queries, rng)
+        keyword_queries = [q.lower().replace("?", "").split() for q in queries]
+
+        start = time.perf_counter()
+        db.keyword_search(keyword_queries[0], 10)
+        bm25_build_s = time.perf_counter() - start
+        results["keyword"] = summarize(timed(lambda terms: db.keyword_search(terms, 10), keyword_queries), len(queries))
+        results["keyword"]["bm25_build_s"] = bm25_build_s
+
+        analyses = [solar.analyze_user_query(q) for q in queries]
+        results["hybrid"] = summarize(timed(lambda a: db.hybrid_search(a, 5), analyses), len(analyses))
+
+        chat_queries = queries[:args.chat_queries]
+        analyzer = QueryAnalyzer(solar=solar, vector_db=db)
+        results["chat"] = summarize(timed(lambda q: chat_turn(analyzer, solar, db, q), chat_queries), len(chat_queries))
+        results["chat"]["local_analysis"] = analyzer.stats["local"] / max(1, sum(analyzer.stats.values()))
+        results["chunks"] = sum(shard.count() for shard in db.shards)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def median_of(runs: list) -> dict:
+    """Per-metric median over repeated runs of one size."""
+    merged = {}
+    for stage, metrics in runs[0].items():
+        if isinstance(metrics, dict):
+            merged[stage] = {key: float(np.median([run[stage][key] for run in runs])) for key in metrics}
+        else:
+            merged[stage] = metrics
+    return merged
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    regressions = []
+    for size, stages in current.items():
+        for stage, metrics in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if not isinstance(metrics, dict) or not base:
+                continue
+            # p99 over a few dozen samples is close to the max, so it gets twice the slack
+            for key, allowed in (("p50_ms", tolerance), ("p99_ms", 2 * tolerance)):
+                if metrics[key] > base[key] * (1 + allowed) and metrics[key] - base[key] > MIN_REGRESSION_MS:
+                    regressions.append(f"{size} {stage} {key}: {base[key]:.2f} -> {metrics[key]:.2f}")
+            if metrics["throughput"] < base["throughput"] * (1 - tolerance):
+                regressions.append(f"{size} {stage} throughput: {base['throughput']:.1f} -> {metrics['throughput']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--chat-queries", type=int, default=10)
+    parser.add_argument("--ocr-calls", type=int, default=10)
+    parser.add_argument("--ingest-contracts", type=int, default=20, help="Contracts sent through save_to_vector_db per size")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per synthetic contract")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Fake chat-completions latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=0, help="Fake embeddings latency")
+    parser.add_argument("--ocr-latency-ms", type=float, default=0, help="Fake OCR latency")
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimensions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; each metric is the median")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.35,
+                        help="Allowed relative slowdown; run-to-run noise on a laptop is around 20%%")
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's debug output")
+    args = parser.parse_args()
+
+    server = start_server(0, args.latency_ms, args.embed_latency_ms, args.ocr_latency_ms, args.dim)
+    os.environ["UPSTAGE_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["UPSTAGE_API_KEY"] = "benchmark"
+    # Measure the code, not the request scheduler's production rate limits
+    for endpoint in ("CHAT", "EMBEDDINGS", "OCR"):
+        os.environ.setdefault(f"UPSTAGE_{endpoint}_RPS", "100000")
+        os.environ.setdefault(f"UPSTAGE_{endpoint}_BURST", "100000")
+
+    results = {}
+    print(f"{'chunks':>8} {'stage':>9} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>9}")
+    for size in args.sizes:
+        runs = []
+        for _ in range(args.repeat):
+            rng = np.random.default_rng(args.seed)
+            # The app's own debug prints would drown the table
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                runs.append(run_size(size, args, rng))
+        results[str(size)] = median_of(runs)
+        for stage, metrics in results[str(size)].items():
+            if isinstance(metrics, dict):
+                print(f"{size:>8} {stage:>9} {metrics['throughput']:>10.1f} {metrics['p50_ms']:>9.2f} "
+                      f"{metrics['p99_ms']:>9.2f} {metrics['peak_rss_mb']:>9.0f}")
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            sys.exit(f"No baseline at {BASELINE_PATH}; run with --save-baseline first")
+        with open(BASELINE_PATH) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Cross-session micro-batching of query embeddings and retrieval.
+
+Simulates many chat sessions calling VectorDB.hybrid_search at the same time,
+against benchmarks/fake_upstage.py and a synthetic corpus, once with batching
+off (RETRIEVAL_BATCH_WINDOW_MS=0) and once with the given window. The
+embeddings endpoint keeps the app's default rate limits, so unbatched
+sessions queue for request slots just as they would against the real API.
+
+Usage:
+    python benchmarks/retrieval_batching.py
+    python benchmarks/retrieval_batching.py --sessions 1 10 50 --chunks 20000 --window-ms 5
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstage import start_server
+from pipeline import bulk_load, synthetic_queries
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else float("nan")
+
+
+def run_sessions(db, sessions: int, queries_per_session: int, window_ms: float, rng) -> dict:
+    from src.services import scheduler
+    from src.services.micro_batch import MicroBatcher
+
+    scheduler.reset_schedulers()  # Fresh token buckets for every run
+    for name in ("embed_batcher", "semantic_batcher", "keyword_batcher"):
+        batcher = getattr(db, name)
+        setattr(db, name, MicroBatcher(batcher.name, batcher.handler, window_ms=window_ms))
+
+    queries = synthetic_queries(sessions * queries_per_session, rng)
+    latencies = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(sessions)
+
+    def session(worker: int):
+        start_barrier.wait()
+        for query in queries[worker::sessions]:
+            analysis = {"keywords": query.lower().strip("?").split()[3:], "key_points": [], "contract_types": []}
+            start = time.perf_counter()
+            db.hybrid_search(analysis, n_results=5)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=session, args=(w,)) for w in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    embed_stats = db.embed_batcher.stats
+    return {
+        "sessions": sessions,
+        "window_ms": window_ms,
+        "queries_per_s": len(latencies) / elapsed,
+        "p50": percentile_ms(latencies, 50),
+        "p99": percentile_ms(latencies, 99),
+        "embed_requests": embed_stats["batches"] if window_ms > 0 else len(latencies),
+        "avg_batch": embed_stats["items"] / embed_stats["batches"] if embed_stats["batches"] else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--queries-per-session", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=5000, help="Corpus size in chunks")
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    parser.add_argument("--dim", type=int, default=64)
+    args = parser.parse_args()
+
+    server = start_server(0, 0, args.embed_latency_ms, 0, args.dim)
+    os.environ["UPSTAGE_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["UPSTAGE_API_KEY"] = "benchmark"
+    os.environ["TRACING_ENABLED"] = "0"
+    os.environ["VECTOR_DB_TOP_CONTRACTS"] = str(10 ** 9)  # Measure chunk search, not the coarse stage
+
+    from src.database.vector_db import VectorDB
+
+    workdir = tempfile.mkdtemp(prefix="retrieval-batching-")
+    rng = np.random.default_rng(0)
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db = VectorDB(persist_directory=workdir)
+            bulk_load(db, args.chunks, args.dim, rng)
+            db.keyword_search(["payment"], 5)  # Build the BM25 index outside the timings
+
+        print(f"{args.chunks} chunks, embeddings latency {args.embed_latency_ms:.0f} ms, default rate limits")
+        print(f"{'sessions':>9} {'window':>7} {'queries/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'embed reqs':>11} {'avg batch':>10}")
+        for sessions in args.sessions:
+            for window_ms in (0, args.window_ms):
+                with contextlib.redirect_stdout(open(os.devnull, "w")):
+                    r = run_sessions(db, sessions, args.queries_per_session, window_ms, rng)
+                print(f"{r['sessions']:>9} {r['window_ms']:>7.0f} {r['queries_per_s']:>10.1f} {r['p50']:>8.1f} "
+                      f"{r['p99']:>8.1f} {r['embed_requests']:>11} {r['avg_batch']:>10.1f}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
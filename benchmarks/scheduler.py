@@ -0,0 +1,141 @@
+"""Request scheduler under injected 429s and slow responses.
+
+Runs a bulk embedding job (ingestion priority) while interactive chat
+requests arrive, against benchmarks/fake_upstage.py with fault injection.
+It is run once without hedging and once with hedging, and reports
+interactive latency, success rate and what the scheduler did (retries,
+throttles, hedges). A final scenario fails every request to show the
+circuit breaker opening and rejecting calls.
+
+Usage:
+    python benchmarks/scheduler.py
+    python benchmarks/scheduler.py --error-rate 0.3 --slow-rate 0.05 --slow-ms 1500 --hedge-ms 300
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstage import start_server
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else float("nan")
+
+
+def run_scenario(args, hedge_ms: float) -> dict:
+    from src.services import scheduler
+    from src.services.chat import Solar
+
+    os.environ["UPSTAGE_CHAT_HEDGE_MS"] = str(hedge_ms)
+    os.environ["UPSTAGE_EMBEDDINGS_HEDGE_MS"] = str(hedge_ms)
+    scheduler.reset_schedulers()
+    solar = Solar()
+
+    errors = []
+    bulk_done = []
+
+    def bulk_worker(worker: int):
+        with scheduler.request_priority(scheduler.BULK):
+            for i in range(args.bulk_calls // args.bulk_workers):
+                try:
+                    solar.embed_document(f"bulk chunk {worker}-{i} payment terms")
+                    bulk_done.append(1)
+                except Exception as e:
+                    errors.append(e)
+
+    workers = [threading.Thread(target=bulk_worker, args=(w,)) for w in range(args.bulk_workers)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    interactive = []
+    for i in range(args.chat_calls):
+        call_start = time.perf_counter()
+        try:
+            solar.talk_general(f"question {i}")
+            interactive.append(time.perf_counter() - call_start)
+        except Exception as e:
+            errors.append(e)
+        time.sleep(args.chat_interval_ms / 1000)
+
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    stats = {}
+    for name in ("chat", "embeddings"):
+        for key, value in scheduler.get_scheduler(name).stats.items():
+            stats[key] = stats.get(key, 0) + value
+    total = args.chat_calls + (args.bulk_calls // args.bulk_workers) * args.bulk_workers
+    return {
+        "hedge_ms": hedge_ms,
+        "chat_p50": percentile_ms(interactive, 50),
+        "chat_p99": percentile_ms(interactive, 99),
+        "bulk_per_s": len(bulk_done) / elapsed,
+        "success": 1 - len(errors) / total,
+        **stats
+    }
+
+
+def run_circuit_scenario(server) -> dict:
+    from src.services import scheduler
+    from src.services.chat import Solar
+
+    server.config["error_rate"] = 1.0
+    os.environ["UPSTAGE_MAX_RETRIES"] = "1"
+    os.environ["UPSTAGE_CIRCUIT_FAILURES"] = "4"
+    scheduler.reset_schedulers()
+    solar = Solar()
+    outcomes = {}
+    for i in range(10):
+        try:
+            solar.embed_query(f"query {i}")
+            outcome = "ok"
+        except Exception as e:
+            outcome = type(e).__name__
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return {"outcomes": outcomes, **scheduler.get_scheduler("embeddings").stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Share of requests answered with 429")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Normal chat latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=10)
+    parser.add_argument("--hedge-ms", type=float, default=250)
+    parser.add_argument("--bulk-calls", type=int, default=300)
+    parser.add_argument("--bulk-workers", type=int, default=6)
+    parser.add_argument("--chat-calls", type=int, default=30)
+    parser.add_argument("--chat-interval-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    server = start_server(0, args.latency_ms, args.embed_latency_ms, 0, 64,
+                          error_rate=args.error_rate, slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    os.environ["UPSTAGE_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["UPSTAGE_API_KEY"] = "benchmark"
+    os.environ["TRACING_ENABLED"] = "0"
+
+    print(f"{'hedge ms':>9} {'chat p50':>9} {'chat p99':>9} {'bulk/s':>8} {'success':>8} "
+          f"{'retries':>8} {'429s':>6} {'hedged':>7} {'wins':>5}")
+    for hedge_ms in (0, args.hedge_ms):
+        r = run_scenario(args, hedge_ms)
+        print(f"{r['hedge_ms']:>9.0f} {r['chat_p50']:>9.1f} {r['chat_p99']:>9.1f} {r['bulk_per_s']:>8.1f} "
+              f"{r['success']:>8.1%} {r['retries']:>8} {r['throttled']:>6} {r['hedged']:>7} {r['hedge_wins']:>5}")
+
+    circuit = run_circuit_scenario(server)
+    print(f"Circuit breaker with every request failing: {circuit['outcomes']}, "
+          f"opened {circuit['circuit_opened']} time(s), rejected {circuit['rejected']} call(s)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
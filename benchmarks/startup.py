@@ -0,0 +1,68 @@
+"""Cold-start import cost per module.
+
+Each module is imported in a fresh interpreter with `-X importtime`, so the
+numbers include everything that module pulls in, as a new Streamlit worker
+would see it.
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --top 15 main src.pages.chat_page
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    "main",
+    "src.pages.upload_page",
+    "src.pages.summary_page",
+    "src.pages.save_page",
+    "src.pages.storage_page",
+    "src.pages.calendar_page",
+    "src.pages.chat_page",
+    "src.services.registry",
+    "src.services.chat",
+    "src.database.vector_db",
+    "src.database.google_drive_db",
+]
+
+
+def import_times(module: str):
+    """(cumulative microseconds per imported module, wall-clock seconds) for one fresh import."""
+    env = dict(os.environ, UPSTAGE_API_KEY=os.environ.get("UPSTAGE_API_KEY", "benchmark"))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, rest = line.partition(":")
+        self_us, cumulative_us, name = [part.strip() for part in rest.split("|")]
+        cumulative[name] = int(cumulative_us)
+    return cumulative, float(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=8, help="Heaviest top-level packages to list per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<32} {'import ms':>10}   heaviest top-level imports")
+    for module in args.modules:
+        cumulative, seconds = import_times(module)
+        top_level = {name: us for name, us in cumulative.items() if "." not in name and name != module}
+        heaviest = sorted(top_level.items(), key=lambda x: x[1], reverse=True)[:args.top]
+        print(f"{module:<32} {seconds * 1000:>10.1f}   " + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest))
+
+
+if __name__ == "__main__":
+    main()
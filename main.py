@@ -1,8 +1,19 @@
+import importlib
+import uuid
 import streamlit as st
 from streamlit_option_menu import option_menu
-from src.pages import summary_page, upload_page, storage_page, calendar_page, save_page, chat_page
 from src.utils.config import load_environment_variables
+from src.utils.tracing import start_metrics_server
 
+# Page modules are imported on first visit, so startup doesn't pay for chromadb or the Google client
+PAGES = {
+    'upload': 'src.pages.upload_page',
+    'summary': 'src.pages.summary_page',
+    'storage': 'src.pages.storage_page',
+    'calendar': 'src.pages.calendar_page',
+    'save': 'src.pages.save_page',
+    'chat': 'src.pages.chat_page',
+}
 
 
 def main():
@@ -30,6 +41,9 @@ def main():
     # Initialize session state
     if 'page' not in st.session_state:
         st.session_state.page = 'upload'
+    # Keys this browser session's background work (see src/services/staging.py)
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
     if select == "Contract Summarizer" and st.session_state.page != 'summary' and st.session_state.page != 'save':
         st.session_state.page = 'upload'
@@ -43,19 +57,12 @@ def main():
     # Load environment variables
     load_environment_variables()
 
+    # Prometheus text endpoint for the traced stage latencies (off unless TRACE_METRICS_PORT is set)
+    start_metrics_server()
+
     # Render appropriate page
-    if st.session_state.page == 'upload':
-        upload_page.render()
-    elif st.session_state.page == 'summary':
-        summary_page.render()
-    elif st.session_state.page == 'storage':
-        storage_page.render()
-    elif st.session_state.page == 'calendar':
-        calendar_page.render()
-    elif st.session_state.page == 'save':
-        save_page.render()
-    elif st.session_state.page == 'chat':
-        chat_page.render()
+    if st.session_state.page in PAGES:
+        importlib.import_module(PAGES[st.session_state.page]).render()
     else:
         st.error("Invalid page selection.")
 
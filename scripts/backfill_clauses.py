@@ -0,0 +1,38 @@
+"""Extract clause records for contracts indexed before clause extraction existed.
+
+Reads every chunk from the Chroma store, groups them by contract and stores the
+clause records in data/contract_events.db, as saving a contract now does.
+
+Usage:
+    python scripts/backfill_clauses.py
+"""
+import os
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.utils.config import load_environment_variables
+from src.database.vector_db import VectorDB
+from src.services.clauses import index_contract_clauses
+
+
+def main():
+    load_environment_variables()
+    data = VectorDB().get_all_documents()
+    contracts = defaultdict(list)
+    for chunk_id, metadata, document in zip(data["ids"], data["metadatas"], data["documents"]):
+        contracts[metadata["contract_id"]].append((chunk_id, metadata, document))
+
+    for contract_id, chunks in contracts.items():
+        metadata = chunks[0][1]
+        clauses = index_contract_clauses(contract_id, metadata.get("contract_name", ""), metadata.get("parties", ""),
+                                         metadata.get("file_name", ""),
+                                         [{"id": chunk_id, "text": document, "page_number": m.get("page_number")}
+                                          for chunk_id, m, document in sorted(chunks, key=lambda c: c[0])])
+        print(f"{metadata.get('contract_name', contract_id)}: {len(clauses)} clause records")
+
+
+if __name__ == "__main__":
+    main()
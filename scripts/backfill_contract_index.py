@@ -0,0 +1,50 @@
+"""Index the summaries of contracts saved before the contract-level index existed.
+
+Chat searches over more than VECTOR_DB_TOP_CONTRACTS contracts, and comparison
+questions, only see contracts in the contract-level index. This adds the ones
+whose chunks are stored but that have no summary entries, from the summary kept
+in data/contract_events.db or, failing that, from the title and parties stored
+on their chunks.
+
+Usage:
+    python scripts/backfill_contract_index.py
+"""
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.utils.config import load_environment_variables
+from src.database.vector_db import VectorDB
+from src.database.sqlite_db import get_summary
+
+
+def main():
+    load_environment_variables()
+    vector_db = VectorDB()
+    indexed = {contract["contract_id"] for contract in vector_db.list_contracts()}
+    data = vector_db.get_all_documents()
+    missing = {}
+    for metadata in data["metadatas"]:
+        if metadata["contract_id"] not in indexed:
+            missing.setdefault(metadata["contract_id"], metadata)
+
+    for contract_id, metadata in missing.items():
+        stored = get_summary(contract_id)
+        if stored is not None:
+            summary = json.loads(stored)
+        else:
+            # Chunk metadata keeps the parties as "Name (Role), Name (Role)"
+            summary = {"title": metadata.get("contract_name", ""),
+                       "parties": [{"name": name.strip(), "role": role}
+                                   for name, role in re.findall(r"([^,(]+)\(([^)]*)\)", metadata.get("parties", ""))]}
+        vector_db.index_contract(contract_id, summary, metadata.get("file_name", ""))
+        print(f"{summary.get('title') or contract_id}: indexed from {'the stored summary' if stored else 'chunk metadata'}")
+    print(f"{len(missing)} contracts added, {len(indexed)} already indexed")
+
+
+if __name__ == "__main__":
+    main()
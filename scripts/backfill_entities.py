@@ -0,0 +1,28 @@
+"""Index the parties of contracts saved before the entity index existed.
+
+Reads every stored summary from data/contract_events.db and writes its parties'
+normalized names and aliases, as saving a contract now does.
+
+Usage:
+    python scripts/backfill_entities.py
+"""
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.database.sqlite_db import list_summaries, get_summary
+from src.services.entities import index_contract_entities
+
+
+def main():
+    for contract in list_summaries():
+        summary = json.loads(get_summary(contract["contract_id"]))
+        entities = index_contract_entities(contract["contract_id"], summary, contract["file_name"])
+        print(f"{contract['title'] or contract['contract_id']}: {len(entities)} party names and aliases")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Migrate the Chroma store to storage-efficiency mode.
+
+Fits a PCA or random-projection reducer on the stored chunk vectors, rewrites
+every shard with the reduced vectors and without the duplicated chunk text in
+metadata, then prints the recall@10 of the reduced vectors against the
+full-dimension neighbours and the on-disk size of data/chroma_db.
+
+Usage:
+    python scripts/migrate_vector_storage.py --method pca --dim 256
+    python scripts/migrate_vector_storage.py --method none   # only strip duplicated text
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.utils.config import load_environment_variables
+from src.database.vector_db import VectorDB
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--method", choices=["pca", "random", "none"], default="pca")
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    load_environment_variables()
+    chroma_path = os.path.join(ROOT, 'data', 'chroma_db')
+    size_before = directory_size(chroma_path)
+
+    report = VectorDB().migrate_storage(method=None if args.method == "none" else args.method, dim=args.dim)
+    report["disk_bytes_before"] = size_before
+    report["disk_bytes_after"] = directory_size(chroma_path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import re
+from typing import List, Dict, Any, Optional, Iterable
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Longest suffix first; the minimum stem length keeps short words like "was" intact
+SUFFIXES = (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", ""))
+MIN_STEM_LENGTH = 3
+# "es" is only a plural ending after these ("boxes", "businesses"); "licenses" just drops the "s"
+SIBILANT_ENDINGS = ("ss", "x", "z", "ch", "sh")
+
+
+def light_stem(token: str) -> str:
+    for suffix, replacement in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            stem = token[:-len(suffix)]
+            if suffix == "es" and not stem.endswith(SIBILANT_ENDINGS):
+                continue
+            if suffix == "s" and stem.endswith("s"):
+                return token  # "business", "process" are singular
+            return stem + replacement
+    return token
+
+
+def tokenize(text: str, stem: bool = False) -> List[str]:
+    # Case folding plus punctuation stripping, so "Termination," and "termination" match
+    tokens = TOKEN_PATTERN.findall(text.casefold())
+    if stem:
+        tokens = [light_stem(token) for token in tokens]
+    return tokens
+
+
+class BM25Index:
+    """Columnar BM25 over a CSR document-term matrix.
+
+    BM25 term weights are computed once at build time, so scoring a query is a
+    single sparse matrix-vector product followed by an argpartition top-k.
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 k1: float = 1.5, b: float = 0.75, stem: bool = False):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.stem = stem
+
+        self.vectorizer = CountVectorizer(tokenizer=lambda x: tokenize(x, stem), lowercase=False, token_pattern=None)
+        term_counts = self.vectorizer.fit_transform(documents).tocsr().astype(np.float32)
+        self.vocabulary = self.vectorizer.vocabulary_
+
+        n_docs = term_counts.shape[0]
+        doc_lengths = np.asarray(term_counts.sum(axis=1)).ravel()
+        avg_length = doc_lengths.mean() if n_docs else 0.0
+        doc_freq = np.bincount(term_counts.indices, minlength=term_counts.shape[1])
+        # Non-negative IDF, so terms found in most chunks still add a little
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        self.idf = idf
+
+        # Rewrite every non-zero term frequency into its BM25 weight in place
+        row_lengths = np.repeat(doc_lengths, np.diff(term_counts.indptr))
+        tf = term_counts.data
+        norm = k1 * (1 - b + b * row_lengths / max(avg_length, 1e-9))
+        term_counts.data = (idf[term_counts.indices] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self.weights = term_counts
+
+        # Row positions per contract, so a query can be restricted to a few contracts
+        self.contract_rows = {}
+        for row, metadata in enumerate(metadatas):
+            self.contract_rows.setdefault(metadata.get("contract_id", ""), []).append(row)
+        self.id_rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    def rows_for(self, contract_ids: Iterable[str], chunk_ids: Iterable[str] = ()) -> np.ndarray:
+        # Shared chunks are owned by one contract but referenced by others, so they are added by id
+        rows = {row for contract_id in contract_ids for row in self.contract_rows.get(contract_id, [])}
+        rows.update(self.id_rows[chunk_id] for chunk_id in chunk_ids if chunk_id in self.id_rows)
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _query_columns(self, query: str) -> List[int]:
+        return [self.vocabulary[token] for token in tokenize(query, self.stem) if token in self.vocabulary]
+
+    def get_scores(self, query: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        weights = self.weights if rows is None else self.weights[rows]
+        columns = self._query_columns(query)
+        if not columns:
+            return np.zeros(weights.shape[0], dtype=np.float32)
+        # Repeated query terms count once per occurrence, as in BM25Okapi
+        query_vector = np.bincount(columns, minlength=self.weights.shape[1]).astype(np.float32)
+        return weights @ query_vector
+
+    def get_scores_batch(self, queries: List[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Scores of several queries at once: one sparse matrix product, documents x queries."""
+        weights = self.weights if rows is None else self.weights[rows]
+        columns = [self._query_columns(query) for query in queries]
+        query_matrix = sparse.csc_matrix(
+            (np.ones(sum(len(c) for c in columns), dtype=np.float32),
+             [column for query_columns in columns for column in query_columns],
+             np.cumsum([0] + [len(c) for c in columns])),
+            shape=(self.weights.shape[1], len(queries))
+        )  # Duplicate entries are summed, so repeated terms still count twice
+        return (weights @ query_matrix).toarray()
+
+    def _top_results(self, scores: np.ndarray, n_results: int, rows: Optional[np.ndarray]) -> List[Dict[str, Any]]:
+        if not len(scores) or n_results <= 0:
+            return []
+
+        # argpartition is O(N); only the k survivors are sorted
+        k = min(n_results, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        top = candidates[np.argsort(-scores[candidates])]
+        top_scores = scores[top]
+        if rows is not None:
+            top = rows[top]
+
+        return [{
+            'id': self.ids[idx],
+            'document': self.documents[idx],
+            'metadata': self.metadatas[idx],
+            'score': float(score)
+        } for idx, score in zip(top, top_scores) if score > 0]
+
+    def top_k(self, query: str, n_results: int, contract_ids: Optional[Iterable[str]] = None,
+              chunk_ids: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        # Only the rows of the requested contracts are scored
+        rows = self.rows_for(contract_ids, chunk_ids) if contract_ids is not None else None
+        return self._top_results(self.get_scores(query, rows), n_results, rows)
+
+    def top_k_batch(self, queries: List[str], n_results: List[int], contract_ids: Optional[Iterable[str]] = None,
+                    chunk_ids: Iterable[str] = ()) -> List[List[Dict[str, Any]]]:
+        if len(queries) == 1:
+            return [self.top_k(queries[0], n_results[0], contract_ids, chunk_ids)]
+        rows = self.rows_for(contract_ids, chunk_ids) if contract_ids is not None else None
+        scores = self.get_scores_batch(queries, rows)
+        return [self._top_results(scores[:, j], n, rows) for j, n in enumerate(n_results)]
@@ -0,0 +1,118 @@
+import sqlite3
+from src.database.sqlite_db import DB_PATH
+
+# Local mirror of the Drive folder's file metadata, kept current with the Changes API
+SORT_COLUMNS = {
+    "Name": "f.name COLLATE NOCASE ASC",
+    "Size": "f.size DESC",
+    "Last Modified": "f.modified DESC",
+}
+# The trigram tokenizer needs at least three characters to use the index
+MIN_FTS_TERM_LENGTH = 3
+
+def init_mirror(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS drive_files
+                 (id TEXT PRIMARY KEY,
+                  name TEXT,
+                  mime_type TEXT,
+                  size INTEGER,
+                  modified TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS drive_sync_state
+                 (key TEXT PRIMARY KEY,
+                  value TEXT)''')
+    # Each sort option walks an index, so a page costs O(page size) rather than a full sort
+    c.execute("CREATE INDEX IF NOT EXISTS idx_drive_files_name ON drive_files (name COLLATE NOCASE)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_drive_files_size ON drive_files (size)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_drive_files_modified ON drive_files (modified)")
+
+    # Trigram full-text index over names gives indexed substring search
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'drive_files_fts'")
+    fts_exists = c.fetchone() is not None
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS drive_files_fts
+                 USING fts5(name, content='drive_files', content_rowid='rowid', tokenize='trigram')''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS drive_files_ai AFTER INSERT ON drive_files BEGIN
+                     INSERT INTO drive_files_fts (rowid, name) VALUES (new.rowid, new.name);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS drive_files_ad AFTER DELETE ON drive_files BEGIN
+                     INSERT INTO drive_files_fts (drive_files_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS drive_files_au AFTER UPDATE ON drive_files BEGIN
+                     INSERT INTO drive_files_fts (drive_files_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+                     INSERT INTO drive_files_fts (rowid, name) VALUES (new.rowid, new.name);
+                 END''')
+    if not fts_exists:
+        c.execute("INSERT INTO drive_files_fts (drive_files_fts) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
+
+def get_page_token(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT value FROM drive_sync_state WHERE key = 'page_token'")
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def _file_row(file):
+    return (file['id'], file['name'], file.get('mimeType'),
+            int(file['size']) if 'size' in file else None, file.get('modifiedTime'))
+
+# An upsert (not INSERT OR REPLACE) so the update trigger keeps the FTS index in step
+UPSERT_FILE = '''INSERT INTO drive_files (id, name, mime_type, size, modified) VALUES (?, ?, ?, ?, ?)
+                 ON CONFLICT (id) DO UPDATE SET name = excluded.name, mime_type = excluded.mime_type,
+                                                size = excluded.size, modified = excluded.modified'''
+
+def replace_files(files, page_token, db_path=DB_PATH):
+    """Full resync: swap the mirror contents and the change token in one transaction."""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM drive_files")
+        conn.executemany(UPSERT_FILE, [_file_row(f) for f in files])
+        conn.execute("INSERT OR REPLACE INTO drive_sync_state (key, value) VALUES ('page_token', ?)", (page_token,))
+    conn.close()
+
+def apply_changes(upserts, removed_ids, page_token, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(UPSERT_FILE, [_file_row(f) for f in upserts])
+        conn.executemany("DELETE FROM drive_files WHERE id = ?", [(file_id,) for file_id in removed_ids])
+        if page_token is not None:
+            conn.execute("INSERT OR REPLACE INTO drive_sync_state (key, value) VALUES ('page_token', ?)", (page_token,))
+    conn.close()
+
+def _name_filter(search_term, also_names=()):
+    if not search_term:
+        return "", ()
+    if len(search_term) >= MIN_FTS_TERM_LENGTH:
+        # Quoted as a phrase, a trigram MATCH is a case-insensitive substring test
+        phrase = '"' + search_term.replace('"', '""') + '"'
+        condition, params = "f.rowid IN (SELECT rowid FROM drive_files_fts WHERE drive_files_fts MATCH ?)", (phrase,)
+    else:
+        condition, params = "f.name LIKE ? ESCAPE '\\'", (f"%{_escape_like(search_term)}%",)
+    # Files whose contracts matched the term some other way (e.g. by party name)
+    if also_names:
+        condition = f"({condition} OR f.name IN ({', '.join('?' * len(also_names))}))"
+        params += tuple(also_names)
+    return f"WHERE {condition}", params
+
+def query_files(search_term="", sort_option="Name", limit=None, offset=0, also_names=(), db_path=DB_PATH):
+    """One page of matching files plus the total match count."""
+    order_by = SORT_COLUMNS.get(sort_option, SORT_COLUMNS["Name"])
+    where, params = _name_filter(search_term, also_names)
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(f"SELECT COUNT(*) FROM drive_files f {where}", params)
+    total = c.fetchone()[0]
+    c.execute(f"SELECT f.id, f.name, f.size, f.modified FROM drive_files f {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+              params + (-1 if limit is None else limit, offset))
+    rows = c.fetchall()
+    conn.close()
+    return [{'id': r[0], 'name': r[1], 'size': r[2], 'modified': r[3]} for r in rows], total
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# Initialize the mirror tables when this module is imported
+init_mirror()
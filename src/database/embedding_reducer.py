@@ -0,0 +1,87 @@
+import os
+from typing import Dict, Any, Optional
+import numpy as np
+
+# The reducer belongs to the vectors it produced, so it lives inside the Chroma persist directory
+REDUCER_FILE = "embedding_reducer.npz"
+# Where the app's reducer was kept before that
+LEGACY_REDUCER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', REDUCER_FILE)
+REDUCER_METHODS = ("pca", "random")
+
+
+class EmbeddingReducer:
+    """Linear projection from the full embedding space to a smaller one.
+
+    The projection is fitted on the stored corpus (PCA) or drawn at random
+    (Gaussian random projection) and persisted as float16, which is plenty of
+    precision for a projection matrix and halves its size.
+    """
+
+    def __init__(self, components: np.ndarray, mean: np.ndarray, method: str):
+        self.components = components.astype(np.float16)
+        self.mean = mean.astype(np.float16)
+        self.method = method
+
+    @property
+    def input_dim(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def output_dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, method: str = "pca", dim: int = 256, seed: int = 0) -> "EmbeddingReducer":
+        if method not in REDUCER_METHODS:
+            raise ValueError(f"method must be one of {REDUCER_METHODS}, got {method!r}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        if method == "pca":
+            from sklearn.decomposition import PCA
+            dim = min(dim, vectors.shape[0], vectors.shape[1])
+            pca = PCA(n_components=dim, random_state=seed).fit(vectors)
+            return cls(pca.components_, pca.mean_, method)
+
+        rng = np.random.default_rng(seed)
+        components = rng.normal(0, 1 / np.sqrt(dim), size=(dim, vectors.shape[1]))
+        return cls(components, np.zeros(vectors.shape[1]), method)
+
+    def transform(self, vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        reduced = (vectors - self.mean.astype(np.float32)) @ self.components.astype(np.float32).T
+        # Unit length keeps Chroma's L2 distance rank-equivalent to cosine similarity
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.maximum(norms, 1e-12)
+
+    def save(self, path: str):
+        np.savez(path, components=self.components, mean=self.mean, method=np.array(self.method))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["EmbeddingReducer"]:
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data["components"], data["mean"], str(data["method"]))
+
+
+def recall_at_k(full_vectors: np.ndarray, reduced_vectors: np.ndarray, k: int = 10,
+                sample_size: int = 200, seed: int = 0) -> Dict[str, Any]:
+    """Share of each sampled chunk's exact top-k neighbours that survive the reduction."""
+    full_vectors = np.asarray(full_vectors, dtype=np.float32)
+    reduced_vectors = np.asarray(reduced_vectors, dtype=np.float32)
+    n = full_vectors.shape[0]
+    if n < 2:
+        return {"recall": 1.0, "k": k, "queries": 0}
+
+    k = min(k, n - 1)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(n, size=min(sample_size, n), replace=False)
+
+    def top_k(vectors, q):
+        normed = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = normed @ normed[q]
+        scores[q] = -np.inf  # The chunk itself is not a neighbour
+        return set(np.argpartition(-scores, k - 1)[:k])
+
+    hits = [len(top_k(full_vectors, q) & top_k(reduced_vectors, q)) / k for q in queries]
+    return {"recall": float(np.mean(hits)), "k": k, "queries": len(queries)}
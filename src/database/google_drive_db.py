@@ -1,16 +1,27 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.errors import HttpError
 import io
 import os
+import random
+import socket
+import time
 import streamlit as st
 from src.utils.config import load_environment_variables
+from src.database import drive_mirror
 
 load_environment_variables()
 
 SERVICE_ACCOUNT_FILE = 'service_account.json'
 SCOPES = ['https://www.googleapis.com/auth/drive']
 FOLDER_ID = os.getenv('DRIVE_FOLDER_ID')
+FILE_FIELDS = "id, name, mimeType, size, modifiedTime"
+
+# Transfers move in chunks of this size; a failed chunk is retried, not the whole file
+CHUNK_SIZE = int(os.getenv('DRIVE_CHUNK_SIZE_MB', '8')) * 1024 * 1024
+MAX_RETRIES = int(os.getenv('DRIVE_MAX_RETRIES', '5'))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
 @st.cache_resource
 def get_drive_service():
@@ -29,53 +40,157 @@ def get_drive_service():
         print(f"FOLDER_ID: {FOLDER_ID}")
         return None
 
-def save_to_google_drive(uploaded_file):
+def next_chunk_with_retry(request, max_retries=MAX_RETRIES):
+    """Advance a resumable upload or chunked download by one chunk, backing off on transient errors.
+
+    After a failure the resumable session continues from the last byte the server acknowledged.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return request.next_chunk()
+        except HttpError as e:
+            if e.resp.status not in RETRYABLE_STATUS or attempt == max_retries:
+                raise
+        except (ConnectionError, socket.timeout):
+            if attempt == max_retries:
+                raise
+        delay = min(2 ** attempt, 32) + random.uniform(0, 1)
+        print(f"Drive transfer interrupted, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        time.sleep(delay)
+
+def _upload_media(name, mime_type, media):
     service = get_drive_service()
     if service is None:
         return None
 
     file_metadata = {
-        'name': uploaded_file.name,
-        'mimeType': uploaded_file.type,
+        'name': name,
+        'mimeType': mime_type,
         'parents': [FOLDER_ID]
     }
 
-    file_io = io.BytesIO(uploaded_file.getvalue())
-    media = MediaIoBaseUpload(file_io, mimetype=uploaded_file.type)
+    request = service.files().create(body=file_metadata,
+                                     media_body=media,
+                                     fields=FILE_FIELDS)
+    file = None
+    while file is None:
+        status, file = next_chunk_with_retry(request)
+        if status:
+            print(f"Uploaded {int(status.progress() * 100)}% of {name}")
 
-    file = service.files().create(body=file_metadata,
-                                  media_body=media,
-                                  fields='id').execute()
+    # Show the new file right away instead of waiting for the next change sync
+    drive_mirror.apply_changes([file], [], None)
 
     return file.get('id')
 
-@st.cache_data(ttl=600)  # Cache for 10 minutes
-def get_files_from_drive():
-    service = get_drive_service()
-    
-    results = service.files().list(
-        q=f"'{FOLDER_ID}' in parents",
-        pageSize=1000,
-        fields="nextPageToken, files(id, name, mimeType, size, modifiedTime)"
-    ).execute()
-    
-    files = results.get('files', [])
-    
+def save_to_google_drive(uploaded_file, local_path=None, chunk_size=CHUNK_SIZE):
+    if local_path is not None:
+        # Already written by pdf_handler.save_pdf, so stream it from disk
+        media = MediaFileUpload(local_path, mimetype=uploaded_file.type, chunksize=chunk_size, resumable=True)
+    else:
+        # UploadedFile is itself a BytesIO, so it can be read in place without getvalue()
+        uploaded_file.seek(0)
+        media = MediaIoBaseUpload(uploaded_file, mimetype=uploaded_file.type, chunksize=chunk_size, resumable=True)
+    return _upload_media(uploaded_file.name, uploaded_file.type, media)
+
+def save_spooled_to_google_drive(contract_file, chunk_size=CHUNK_SIZE):
+    """Upload a record from pdf_handler.spool_upload, streaming the PDF from data/contracts."""
+    media = MediaFileUpload(contract_file['path'], mimetype=contract_file['type'], chunksize=chunk_size, resumable=True)
+    return _upload_media(contract_file['name'], contract_file['type'], media)
+
+def list_folder_files(service, folder_id=FOLDER_ID):
+    """Every file in the folder, following nextPageToken past the 1000-per-page limit."""
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            pageSize=1000,
+            pageToken=page_token,
+            fields=f"nextPageToken, files({FILE_FIELDS})"
+        ).execute()
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
+def sync_drive_files(service=None, folder_id=FOLDER_ID, db_path=drive_mirror.DB_PATH):
+    """Bring the local mirror up to date. Only the first sync lists the whole folder;
+    later syncs read the Changes API from the stored token, so cost is O(changes)."""
+    service = service or get_drive_service()
+    if service is None:
+        return
+
+    page_token = drive_mirror.get_page_token(db_path)
+    if page_token is None:
+        # Take the token before listing so changes made during the listing are replayed next time
+        start_token = service.changes().getStartPageToken().execute()['startPageToken']
+        drive_mirror.replace_files(list_folder_files(service, folder_id), start_token, db_path)
+        return
+
+    while page_token is not None:
+        results = service.changes().list(
+            pageToken=page_token,
+            spaces='drive',
+            includeRemoved=True,
+            fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, parents, trashed))"
+        ).execute()
+
+        upserts, removed_ids = [], []
+        for change in results.get('changes', []):
+            file = change.get('file')
+            if change.get('removed') or file is None or file.get('trashed') or folder_id not in file.get('parents', []):
+                removed_ids.append(change['fileId'])
+            else:
+                upserts.append(file)
+
+        # The last page carries newStartPageToken; earlier pages carry nextPageToken
+        page_token = results.get('nextPageToken')
+        drive_mirror.apply_changes(upserts, removed_ids, page_token or results.get('newStartPageToken'), db_path)
+
+@st.cache_data(ttl=60)  # Syncing is incremental, so it can run often
+def refresh_drive_mirror():
+    sync_drive_files()
+
+def get_files_from_drive(search_term="", sort_option="Name", page=1, page_size=50, also_names=()):
+    """Only the requested page of files, plus the total number of matches."""
+    refresh_drive_mirror()
+    files, total = drive_mirror.query_files(search_term, sort_option, limit=page_size, offset=(page - 1) * page_size,
+                                            also_names=also_names)
+
     return [{
         'id': file['id'],
         'name': file['name'],
         'type': '📄',
-        'size': f"{int(file['size']) / 1024:.2f} KB" if 'size' in file else 'N/A',
-        'modified': file['modifiedTime']
-    } for file in files]
+        'size': f"{file['size'] / 1024:.2f} KB" if file['size'] is not None else 'N/A',
+        'modified': file['modified']
+    } for file in files], total
 
-def download_file(file_id):
+def iter_file_chunks(file_id, chunk_size=CHUNK_SIZE):
+    """Yield the file's bytes one chunk at a time; only one chunk is held in memory."""
     service = get_drive_service()
     request = service.files().get_media(fileId=file_id)
-    file = io.BytesIO()
-    downloader = MediaIoBaseDownload(file, request)
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
     done = False
     while done is False:
-        status, done = downloader.next_chunk()
+        status, done = next_chunk_with_retry(downloader)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def download_file_to(file_id, path, chunk_size=CHUNK_SIZE):
+    with open(path, 'wb') as f:
+        downloader = MediaIoBaseDownload(f, get_drive_service().files().get_media(fileId=file_id), chunksize=chunk_size)
+        done = False
+        while done is False:
+            status, done = next_chunk_with_retry(downloader)
+    return path
+
+def download_file(file_id):
+    # Kept for callers that need the whole file in memory; prefer iter_file_chunks or download_file_to
+    file = io.BytesIO()
+    for chunk in iter_file_chunks(file_id):
+        file.write(chunk)
     file.seek(0)
     return file
\ No newline at end of file
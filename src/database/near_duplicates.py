@@ -0,0 +1,110 @@
+import re
+import zlib
+from typing import List, Optional, Tuple
+import numpy as np
+from src.database.bm25_index import tokenize
+
+# Numbers, dates and amounts, including spelled-out ones: clauses that differ only in these are not duplicates
+FACT_PATTERN = re.compile(
+    r"\d+(?:[.,/:-]\d+)*|[$€£¥%]|\b(?:usd|eur|gbp|jpy|krw|percent"
+    r"|january|february|march|april|may|june|july|august|september|october|november|december"
+    r"|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec"
+    r"|zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen"
+    r"|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety"
+    r"|hundred|thousand|million|billion)\b",
+    re.IGNORECASE
+)
+
+
+def facts(text: str) -> Tuple[str, ...]:
+    """The numbers, dates and amounts in the text, in order, with thousands separators dropped."""
+    return tuple(re.sub(r"(?<=\d),(?=\d{3}\b)", "", token.lower()) for token in FACT_PATTERN.findall(text))
+
+
+class NearDuplicateIndex:
+    """MinHash signatures over word shingles, bucketed with LSH banding.
+
+    Two chunks whose shingle sets have a Jaccard similarity of at least
+    `threshold` are near-duplicates, as long as they also state the same
+    numbers, dates and amounts: the estimate alone would merge a 30-day and a
+    60-day notice period. Banding makes finding candidates a few dict lookups
+    instead of a scan over every stored chunk; candidates are then checked
+    against the full signature and their facts.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, min_words: int = 20, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        # Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits. uint64 wraps, so no modulo is needed
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.signatures = {}
+        self.facts = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of the text, or None for chunks too short to share."""
+        words = tokenize(text)
+        if len(words) < self.min_words:
+            return None
+        shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self.a, hashes) + self.b[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        # The share of agreeing minima estimates the Jaccard similarity
+        return float(np.mean(first == second))
+
+    def find(self, signature: Optional[np.ndarray], text: str) -> Optional[Tuple[str, float]]:
+        """The most similar stored key at or above the threshold with the same facts as the text, with its similarity."""
+        if signature is None:
+            return None
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, ()))
+        text_facts = facts(text)
+        best = None
+        for candidate in candidates:
+            similarity = self.similarity(signature, self.signatures[candidate])
+            if similarity >= self.threshold and self.facts[candidate] == text_facts and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def add(self, key: str, signature: Optional[np.ndarray], text: str):
+        if signature is None or key in self.signatures:
+            return
+        self.signatures[key] = signature
+        self.facts[key] = facts(text)
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+    def collapse(self, texts: List[str], limit: Optional[int] = None) -> List[int]:
+        """Positions of the texts to keep: each one that is not a near-duplicate of an earlier one, up to limit."""
+        kept, kept_signatures = [], []
+        for position, text in enumerate(texts):
+            if limit is not None and len(kept) >= limit:
+                break
+            signature = self.signature(text)
+            if signature is not None:
+                text_facts = facts(text)
+                if any(self.similarity(signature, other) >= self.threshold and other_facts == text_facts
+                       for other, other_facts in kept_signatures):
+                    continue
+            kept.append(position)
+            if signature is not None:
+                kept_signatures.append((signature, text_facts))
+        return kept
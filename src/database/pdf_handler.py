@@ -1,10 +1,69 @@
 import os
+import re
+import json
+import hashlib
+
+CONTRACTS_DIR = os.path.join('data', 'contracts')
+# Spooled uploads and their OCR results are named by the document hash
+SPOOLED_FILE = re.compile(r"[0-9a-f]{64}\.(pdf|ocr\.json)")
 
 def save_pdf(uploaded_file, filename):
-    save_path = os.path.join('data', 'contracts', filename)
+    os.makedirs(CONTRACTS_DIR, exist_ok=True)
+    save_path = os.path.join(CONTRACTS_DIR, filename)
     with open(save_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
     return save_path
 
 def get_pdf_path(filename):
-    return os.path.join('data', 'contracts', filename)
\ No newline at end of file
+    return os.path.join(CONTRACTS_DIR, filename)
+
+def document_hash(uploaded_file):
+    # getbuffer() is a view over the upload, so hashing does not copy it
+    return hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+
+def spool_upload(uploaded_file):
+    """Write the upload to disk once and return a small record to keep in session state.
+
+    Later steps open the PDF from this path instead of holding the upload in memory.
+    """
+    doc_hash = document_hash(uploaded_file)
+    path = get_pdf_path(f"{doc_hash}.pdf")
+    if not os.path.exists(path):
+        path = save_pdf(uploaded_file, f"{doc_hash}.pdf")
+    return {
+        'name': uploaded_file.name,
+        'type': uploaded_file.type,
+        'size': uploaded_file.size,
+        'path': path,
+        'hash': doc_hash
+    }
+
+def get_ocr_result_path(doc_hash):
+    return os.path.join(CONTRACTS_DIR, f"{doc_hash}.ocr.json")
+
+def save_ocr_result(doc_hash, ocr_result):
+    os.makedirs(CONTRACTS_DIR, exist_ok=True)
+    with open(get_ocr_result_path(doc_hash), "w", encoding="utf-8") as f:
+        json.dump(ocr_result, f, ensure_ascii=False)
+
+def load_ocr_result(doc_hash):
+    path = get_ocr_result_path(doc_hash)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def delete_spooled(doc_hash):
+    """Remove a document's spooled PDF and OCR result once it is saved or discarded."""
+    if not doc_hash:
+        return
+    for path in (get_pdf_path(f"{doc_hash}.pdf"), get_ocr_result_path(doc_hash)):
+        if os.path.exists(path):
+            os.remove(path)
+
+def clear_spooled():
+    if not os.path.isdir(CONTRACTS_DIR):
+        return
+    for filename in os.listdir(CONTRACTS_DIR):
+        if SPOOLED_FILE.fullmatch(filename):
+            os.remove(os.path.join(CONTRACTS_DIR, filename))
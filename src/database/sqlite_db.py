@@ -1,5 +1,8 @@
 import sqlite3
 import os
+import zlib
+import json
+from datetime import datetime
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'contract_events.db')
 
@@ -13,26 +16,391 @@ def init_db():
                   start_date TEXT,
                   end_date TEXT,
                   event_type TEXT)''')
+    # Full summary JSON, zlib-compressed, so a saved contract never needs OCR or the LLM again
+    c.execute('''CREATE TABLE IF NOT EXISTS summaries
+                 (contract_id TEXT PRIMARY KEY,
+                  document_hash TEXT,
+                  file_id TEXT,
+                  file_name TEXT,
+                  title TEXT,
+                  summary BLOB,
+                  created_at TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_summaries_hash ON summaries (document_hash)")
+    # Deadline rules resolved from the summaries (see src/services/deadlines.py). Recurring
+    # rules are materialized into dated rows lazily, up to materialized_until.
+    c.execute('''CREATE TABLE IF NOT EXISTS deadline_rules
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  contract_id TEXT,
+                  contract_title TEXT,
+                  title TEXT,
+                  kind TEXT,
+                  first_date TEXT,
+                  every_n INTEGER,
+                  every_unit TEXT,
+                  until TEXT,
+                  materialized_until TEXT,
+                  source TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS deadlines
+                 (rule_id INTEGER,
+                  contract_id TEXT,
+                  contract_title TEXT,
+                  title TEXT,
+                  kind TEXT,
+                  due_date TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_deadlines_due ON deadlines (due_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_deadlines_kind_due ON deadlines (kind, due_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_deadlines_contract ON deadlines (contract_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rules_materialized ON deadline_rules (materialized_until)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rules_contract ON deadline_rules (contract_id)")
+    # Clause records classified from the chunks at ingest (see src/services/clauses.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS clauses
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  contract_id TEXT,
+                  contract_title TEXT,
+                  parties TEXT,
+                  file_name TEXT,
+                  clause_type TEXT,
+                  page_number INTEGER,
+                  chunk_id TEXT,
+                  text TEXT,
+                  facts TEXT,
+                  score REAL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_clauses_contract_type ON clauses (contract_id, clause_type, score)")
+    # Contracts that share a near-duplicate chunk stored once in the vector store (see VectorDB.save_to_vector_db)
+    c.execute('''CREATE TABLE IF NOT EXISTS chunk_references
+                 (chunk_id TEXT,
+                  contract_id TEXT,
+                  contract_name TEXT,
+                  file_name TEXT,
+                  page_number INTEGER,
+                  similarity REAL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chunk_references_contract ON chunk_references (contract_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_chunk_references_chunk ON chunk_references (chunk_id)")
+    # Parties of each contract under their normalized names and aliases (see src/services/entities.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS entities
+                 (contract_id TEXT,
+                  contract_title TEXT,
+                  file_name TEXT,
+                  party_name TEXT,
+                  role TEXT,
+                  alias TEXT,
+                  kind TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_entities_alias ON entities (alias)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_entities_contract ON entities (contract_id)")
+    # Chat conversations: every message, plus a rolling summary of the turns that left the
+    # verbatim window (see src/services/memory.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS conversation_messages
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  session_id TEXT,
+                  role TEXT,
+                  content TEXT,
+                  contract_ids TEXT,
+                  created_at TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_conversation_messages_session ON conversation_messages (session_id, id)")
+    c.execute('''CREATE TABLE IF NOT EXISTS conversation_memory
+                 (session_id TEXT PRIMARY KEY,
+                  summary TEXT,
+                  summarized_upto INTEGER,
+                  updated_at TEXT)''')
     conn.commit()
     conn.close()
 
-def save_events(events, contract_id):
+def get_all_events():
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    for event in events:
-        c.execute('''INSERT INTO events (contract_id, title, start_date, end_date, event_type)
-                     VALUES (?, ?, ?, ?, ?)''',
-                  (contract_id, event['title'], event['start'], event['end'], event['type']))
+    c.execute("SELECT * FROM events")
+    events = c.fetchall()
+    conn.close()
+    return [{'id': e[0], 'contract_id': e[1], 'title': e[2], 'start': e[3], 'end': e[4], 'type': e[5]} for e in events]
+
+def save_summary(contract_id, document_hash, file_id, file_name, title, summary):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''INSERT OR REPLACE INTO summaries (contract_id, document_hash, file_id, file_name, title, summary, created_at)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
+              (contract_id, document_hash, file_id, file_name, title,
+               zlib.compress(summary.encode('utf-8')), datetime.now().isoformat(timespec='seconds')))
     conn.commit()
     conn.close()
 
-def get_all_events():
+def get_summary(contract_id):
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("SELECT * FROM events")
-    events = c.fetchall()
+    c.execute("SELECT summary FROM summaries WHERE contract_id = ?", (contract_id,))
+    row = c.fetchone()
+    conn.close()
+    return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+def get_summary_by_hash(document_hash):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT contract_id, summary FROM summaries WHERE document_hash = ? ORDER BY created_at DESC LIMIT 1",
+              (document_hash,))
+    row = c.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return {'contract_id': row[0], 'summary': zlib.decompress(row[1]).decode('utf-8')}
+
+def list_summaries():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT contract_id, file_name, title, created_at FROM summaries ORDER BY created_at DESC")
+    rows = c.fetchall()
+    conn.close()
+    return [{'contract_id': r[0], 'file_name': r[1], 'title': r[2], 'created_at': r[3]} for r in rows]
+
+DEADLINE_RULE_COLUMNS = ('id', 'contract_id', 'contract_title', 'title', 'kind', 'first_date',
+                         'every_n', 'every_unit', 'until', 'materialized_until', 'source')
+DEADLINE_COLUMNS = ('rule_id', 'contract_id', 'contract_title', 'title', 'kind', 'due_date')
+
+def replace_deadline_rules(contract_id, contract_title, rules):
+    """Store a contract's deadline rules, replacing earlier ones, and return them with their ids."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("DELETE FROM deadlines WHERE contract_id = ?", (contract_id,))
+    c.execute("DELETE FROM deadline_rules WHERE contract_id = ?", (contract_id,))
+    stored = []
+    for rule in rules:
+        c.execute('''INSERT INTO deadline_rules (contract_id, contract_title, title, kind, first_date, every_n, every_unit, until, source)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (contract_id, contract_title, rule['title'], rule['kind'], rule['first_date'], rule['every_n'],
+                   rule['every_unit'], rule['until'], rule['source']))
+        stored.append({**rule, 'id': c.lastrowid, 'contract_id': contract_id, 'contract_title': contract_title,
+                       'materialized_until': None})
+    conn.commit()
+    conn.close()
+    return stored
+
+def get_rules_materialized_before(until):
+    """Dated rules whose occurrences have not been written up to `until` yet."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(DEADLINE_RULE_COLUMNS)} FROM deadline_rules "
+              "WHERE first_date IS NOT NULL AND (materialized_until IS NULL OR materialized_until < ?)", (until,))
+    rows = c.fetchall()
+    conn.close()
+    return [dict(zip(DEADLINE_RULE_COLUMNS, row)) for row in rows]
+
+def save_deadline_occurrences(rule, due_dates, materialized_until):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany('''INSERT INTO deadlines (rule_id, contract_id, contract_title, title, kind, due_date)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  [(rule['id'], rule['contract_id'], rule['contract_title'], rule['title'], rule['kind'], due_date)
+                   for due_date in due_dates])
+    c.execute("UPDATE deadline_rules SET materialized_until = ? WHERE id = ?", (materialized_until, rule['id']))
+    conn.commit()
+    conn.close()
+
+def query_deadlines(start, end, kinds=None):
+    """Occurrences due between start and end (ISO dates, inclusive), in date order.
+
+    Both lookups are index range scans: (due_date) without kinds, (kind, due_date) with them.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    if kinds:
+        c.execute(f"SELECT {', '.join(DEADLINE_COLUMNS)} FROM deadlines "
+                  f"WHERE kind IN ({', '.join('?' * len(kinds))}) AND due_date BETWEEN ? AND ? ORDER BY due_date",
+                  (*kinds, start, end))
+    else:
+        c.execute(f"SELECT {', '.join(DEADLINE_COLUMNS)} FROM deadlines WHERE due_date BETWEEN ? AND ? ORDER BY due_date",
+                  (start, end))
+    rows = c.fetchall()
+    conn.close()
+    return [dict(zip(DEADLINE_COLUMNS, row)) for row in rows]
+
+def get_calendar_version():
+    """Changes whenever deadline or event rows are added or deleted, in this process or another."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT (SELECT COUNT(*) FROM deadlines), (SELECT MAX(rowid) FROM deadlines), "
+              "(SELECT COUNT(*) FROM events), (SELECT MAX(rowid) FROM events)")
+    row = c.fetchone()
+    conn.close()
+    return row
+
+def get_undated_deadline_rules(contract_id=None):
+    """Rules that could not be resolved to a date, kept so they can still be listed."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    query = f"SELECT {', '.join(DEADLINE_RULE_COLUMNS)} FROM deadline_rules WHERE first_date IS NULL"
+    if contract_id is not None:
+        c.execute(query + " AND contract_id = ?", (contract_id,))
+    else:
+        c.execute(query)
+    rows = c.fetchall()
+    conn.close()
+    return [dict(zip(DEADLINE_RULE_COLUMNS, row)) for row in rows]
+
+CLAUSE_COLUMNS = ('contract_id', 'contract_title', 'parties', 'file_name', 'clause_type',
+                  'page_number', 'chunk_id', 'text', 'facts', 'score')
+
+def replace_clauses(contract_id, clauses):
+    """Store a contract's clause records, replacing earlier ones. facts is a JSON string."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("DELETE FROM clauses WHERE contract_id = ?", (contract_id,))
+    c.executemany(f"INSERT INTO clauses ({', '.join(CLAUSE_COLUMNS)}) VALUES ({', '.join('?' * len(CLAUSE_COLUMNS))})",
+                  [tuple(clause[column] for column in CLAUSE_COLUMNS) for clause in clauses])
+    conn.commit()
+    conn.close()
+
+def get_clauses(contract_ids, clause_type, limit=2):
+    """The best-scoring clause records of one type for each contract, an index lookup per contract."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    rows = []
+    for contract_id in contract_ids:
+        c.execute(f"SELECT {', '.join(CLAUSE_COLUMNS)} FROM clauses WHERE contract_id = ? AND clause_type = ? "
+                  "ORDER BY score DESC LIMIT ?", (contract_id, clause_type, limit))
+        rows.extend(c.fetchall())
+    conn.close()
+    return [dict(zip(CLAUSE_COLUMNS, row)) for row in rows]
+
+def list_clause_contracts():
+    """contract_id, contract_title and parties of every contract with clause records."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT contract_id, contract_title, parties FROM clauses GROUP BY contract_id")
+    rows = c.fetchall()
+    conn.close()
+    return [{'contract_id': r[0], 'contract_title': r[1], 'parties': r[2]} for r in rows]
+
+CHUNK_REFERENCE_COLUMNS = ('chunk_id', 'contract_id', 'contract_name', 'file_name', 'page_number', 'similarity')
+
+def save_chunk_references(references):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany(f"INSERT INTO chunk_references ({', '.join(CHUNK_REFERENCE_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(CHUNK_REFERENCE_COLUMNS))})",
+                  [tuple(reference[column] for column in CHUNK_REFERENCE_COLUMNS) for reference in references])
+    conn.commit()
+    conn.close()
+
+def get_shared_chunk_ids(contract_ids):
+    """Ids of the stored chunks that these contracts reference instead of owning."""
+    if not contract_ids:
+        return []
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(f"SELECT DISTINCT chunk_id FROM chunk_references WHERE contract_id IN ({', '.join('?' * len(contract_ids))})",
+              tuple(contract_ids))
+    rows = c.fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+def get_chunk_references(chunk_ids):
+    """References per chunk id, for the chunks that have any."""
+    if not chunk_ids:
+        return {}
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(CHUNK_REFERENCE_COLUMNS)} FROM chunk_references "
+              f"WHERE chunk_id IN ({', '.join('?' * len(chunk_ids))})", tuple(chunk_ids))
+    rows = c.fetchall()
+    conn.close()
+    references = {}
+    for row in rows:
+        references.setdefault(row[0], []).append(dict(zip(CHUNK_REFERENCE_COLUMNS, row)))
+    return references
+
+# Rows derived from an indexed contract, which go when its vectors go
+CONTRACT_TABLES = ('summaries', 'events', 'deadline_rules', 'deadlines', 'clauses', 'chunk_references', 'entities')
+
+def delete_contract_records(contract_id=None):
+    """Delete the stored summary, events, deadlines, clauses, chunk references and parties of one contract, or of all."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    for table in CONTRACT_TABLES:
+        if contract_id is None:
+            c.execute(f"DELETE FROM {table}")
+        else:
+            c.execute(f"DELETE FROM {table} WHERE contract_id = ?", (contract_id,))
+    conn.commit()
+    conn.close()
+
+ENTITY_COLUMNS = ('contract_id', 'contract_title', 'file_name', 'party_name', 'role', 'alias', 'kind')
+
+def replace_entities(contract_id, entities):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("DELETE FROM entities WHERE contract_id = ?", (contract_id,))
+    c.executemany(f"INSERT INTO entities ({', '.join(ENTITY_COLUMNS)}) VALUES ({', '.join('?' * len(ENTITY_COLUMNS))})",
+                  [tuple(entity[column] for column in ENTITY_COLUMNS) for entity in entities])
+    conn.commit()
+    conn.close()
+
+def get_entities_version():
+    """Changes whenever entity rows are added or replaced, in this process or another."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*), MAX(rowid) FROM entities")
+    row = c.fetchone()
+    conn.close()
+    return row
+
+def list_entities():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(ENTITY_COLUMNS)} FROM entities")
+    rows = c.fetchall()
+    conn.close()
+    return [dict(zip(ENTITY_COLUMNS, row)) for row in rows]
+
+MESSAGE_COLUMNS = ('id', 'session_id', 'role', 'content', 'contract_ids', 'created_at')
+
+def _message(row):
+    message = dict(zip(MESSAGE_COLUMNS, row))
+    message['contract_ids'] = json.loads(message['contract_ids']) if message['contract_ids'] else []
+    return message
+
+def append_message(session_id, role, content, contract_ids=None):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("INSERT INTO conversation_messages (session_id, role, content, contract_ids, created_at) VALUES (?, ?, ?, ?, ?)",
+              (session_id, role, content, json.dumps(contract_ids) if contract_ids else None,
+               datetime.now().isoformat(timespec='seconds')))
+    message_id = c.lastrowid
+    conn.commit()
+    conn.close()
+    return message_id
+
+def get_recent_messages(session_id, limit, before_id=None):
+    """The last `limit` messages of a session (before `before_id`), oldest first; an index range scan."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM conversation_messages WHERE session_id = ? AND id < ? "
+              "ORDER BY id DESC LIMIT ?", (session_id, before_id if before_id is not None else 2 ** 63 - 1, limit))
+    rows = c.fetchall()
+    conn.close()
+    return [_message(row) for row in reversed(rows)]
+
+def get_messages_between(session_id, after_id, upto_id):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM conversation_messages WHERE session_id = ? AND id > ? AND id <= ? "
+              "ORDER BY id", (session_id, after_id, upto_id))
+    rows = c.fetchall()
+    conn.close()
+    return [_message(row) for row in rows]
+
+def get_conversation_memory(session_id):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT summary, summarized_upto FROM conversation_memory WHERE session_id = ?", (session_id,))
+    row = c.fetchone()
+    conn.close()
+    return {'summary': row[0], 'summarized_upto': row[1]} if row else {'summary': '', 'summarized_upto': 0}
+
+def save_conversation_memory(session_id, summary, summarized_upto):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO conversation_memory (session_id, summary, summarized_upto, updated_at) VALUES (?, ?, ?, ?)",
+              (session_id, summary, summarized_upto, datetime.now().isoformat(timespec='seconds')))
+    conn.commit()
     conn.close()
-    return [{'id': e[0], 'contract_id': e[1], 'title': e[2], 'start': e[3], 'end': e[4], 'type': e[5]} for e in events]
 
 # Initialize the database when this module is imported
 init_db()
\ No newline at end of file
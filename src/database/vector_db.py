@@ -1,29 +1,216 @@
 import uuid
 from src.services.chat import Solar
 import chromadb
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
 import re
 import os
+import hashlib
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import CountVectorizer
+from src.database.bm25_index import BM25Index, light_stem
+from src.database.embedding_reducer import EmbeddingReducer, recall_at_k, REDUCER_FILE, LEGACY_REDUCER_PATH
+from src.utils.tracing import span, propagate, traced, set_attributes
+from src.services.scheduler import deprioritized, BULK
+from src.services.micro_batch import MicroBatcher
+from src.services.clauses import index_contract_clauses
+from src.services.entities import index_contract_entities
+from src.database.near_duplicates import NearDuplicateIndex
+from src.database.sqlite_db import save_chunk_references, get_shared_chunk_ids, get_chunk_references, delete_contract_records
+from src.database.pdf_handler import clear_spooled
+from src.utils.rwlock import ReadWriteLock, read_locked, write_locked
+
+COLLECTION_NAME = "contracts"
+CONTRACT_INDEX_NAME = "contract_summaries"
+SHARD_KEYS = ("contract_id", "business_unit", "year")
+SUMMARY_VIEWS = ("overview", "parties", "conditions")
+MIGRATING_SUFFIX = "_migrating"
+MIGRATION_MARKER_FILE = "migration.commit"
 
 class VectorDB:
-    def __init__(self, clear_on_init=False):
-        persist_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'chroma_db')
+    def __init__(self, clear_on_init=False, num_shards: Optional[int] = None, shard_key: Optional[str] = None,
+                 solar: Optional[Solar] = None, persist_directory: Optional[str] = None):
+        # Streamlit sessions share this instance: searches take the read side, changes
+        # to the store the write side. Embedding calls stay outside the lock, so a
+        # search never waits for more than the Chroma write itself.
+        self.rw_lock = ReadWriteLock()
+        default_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'chroma_db')
+        persist_directory = persist_directory or default_directory
         self.chroma_client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.chroma_client.get_or_create_collection(name="contracts")
-        self.solar = Solar()
+        self.reducer_path = os.path.join(persist_directory, REDUCER_FILE)
+        if (os.path.abspath(persist_directory) == os.path.abspath(default_directory)
+                and os.path.exists(LEGACY_REDUCER_PATH) and not os.path.exists(self.reducer_path)):
+            os.replace(LEGACY_REDUCER_PATH, self.reducer_path)
+        # Written once every copy of a storage migration is built; see migrate_storage
+        self.migration_marker = os.path.join(persist_directory, MIGRATION_MARKER_FILE)
+        self._recover_migration()
+
+        # Number of shards new chunks are routed to, and the key used to route them
+        self.num_shards = max(1, num_shards or int(os.getenv("VECTOR_DB_SHARDS", "1")))
+        self.shard_key = shard_key or os.getenv("VECTOR_DB_SHARD_KEY", "contract_id")
+        if self.shard_key not in SHARD_KEYS:
+            raise ValueError(f"shard_key must be one of {SHARD_KEYS}, got {self.shard_key!r}")
+
+        self.shards = self._load_shards()
+        # Per-shard BM25 indexes, rebuilt lazily when the shard changes
+        self.stem_keywords = os.getenv("VECTOR_DB_BM25_STEM", "0") == "1"
+        self.bm25_cache = {}
+        # Storage-efficiency mode is on once a fitted reducer exists (see migrate_storage)
+        self.reducer = EmbeddingReducer.load(self.reducer_path)
+        # Small contract-level index over the summaries, used to pick contracts before chunk search
+        self.contract_index = self.chroma_client.get_or_create_collection(name=CONTRACT_INDEX_NAME)
+        self.top_contracts = int(os.getenv("VECTOR_DB_TOP_CONTRACTS", "10"))
+        self.indexed_contracts = None  # Distinct contracts in the contract-level index, counted lazily
+        self.pool = ThreadPoolExecutor(max_workers=max(4, len(self.shards)), thread_name_prefix="vector-shard")
+        self.solar = solar or Solar()
+        # Concurrent chat sessions share query embedding requests and scoring passes
+        self.embed_batcher = MicroBatcher("embed.query", self.solar.embed_queries)
+        self.semantic_batcher = MicroBatcher("search.semantic", self._semantic_search_batch)
+        self.keyword_batcher = MicroBatcher("search.bm25", self._keyword_search_batch)
+        # With VECTOR_DB_DEDUP=1, near-duplicate chunks (shared boilerplate) are stored once and referenced by the other contracts.
+        # The LSH index over the stored chunks is built on the first save.
+        self.dedup = os.getenv("VECTOR_DB_DEDUP", "0") == "1"
+        self.minhash = NearDuplicateIndex(float(os.getenv("VECTOR_DB_DEDUP_THRESHOLD", "0.9")))
+        self.near_duplicates = None
+        self.near_duplicates_lock = threading.Lock()
         
         if clear_on_init:
             self.clear_collection()
 
-    def semantic_splitter(self, text: str, max_chunk_size: int = 1000, min_chunk_size: int = 100, similarity_threshold: float = 0.7) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _shard_name(index: int) -> str:
+        # Shard 0 keeps the original collection name so existing data stays readable
+        return COLLECTION_NAME if index == 0 else f"{COLLECTION_NAME}_shard_{index}"
+
+    def _load_shards(self) -> List[Any]:
+        # Pick up shards created by earlier runs too, so reads still cover chunks
+        # that live beyond the configured shard count until they are rebalanced
+        existing = [0]
+        for collection in self.chroma_client.list_collections():
+            match = re.fullmatch(rf"{COLLECTION_NAME}_shard_(\d+)", collection.name)
+            if match:
+                existing.append(int(match.group(1)))
+        count = max(self.num_shards, max(existing) + 1)
+        return [self.chroma_client.get_or_create_collection(name=self._shard_name(i)) for i in range(count)]
+
+    def _routing_value(self, contract_id: str, summary_result: Dict[str, Any]) -> str:
+        if self.shard_key == "business_unit":
+            return str(summary_result.get("business_unit") or "unassigned")
+        if self.shard_key == "year":
+            start_date = str((summary_result.get("duration") or {}).get("start_date") or "")
+            return start_date[:4] if re.match(r"\d{4}", start_date) else "unknown"
+        return contract_id
+
+    def _shard_index(self, routing_value: str) -> int:
+        # Stable across processes, unlike the built-in hash()
+        digest = hashlib.md5(routing_value.encode("utf-8")).hexdigest()
+        return int(digest, 16) % self.num_shards
+
+    def _fan_out(self, fn: Callable[[Any], Any]) -> List[Any]:
+        if len(self.shards) == 1:
+            return [fn(self.shards[0])]
+        # Worker threads record their spans in the caller's trace
+        return list(self.pool.map(propagate(fn), self.shards))
+
+    @staticmethod
+    def _merge_top_k(shard_results: List[List[Dict[str, Any]]], n_results: int) -> List[Dict[str, Any]]:
+        # A chunk can briefly sit in two shards while it is being rebalanced
+        unique = {}
+        for results in shard_results:
+            for result in results:
+                if result['id'] not in unique or result['score'] > unique[result['id']]['score']:
+                    unique[result['id']] = result
+        return heapq.nlargest(n_results, unique.values(), key=lambda x: x['score'])
+
+    def _contract_filter(self, contract_ids: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        # A contract's chunks, plus the shared chunks it references but another contract owns
+        if contract_ids is None:
+            return None
+        where = {"contract_id": {"$in": list(contract_ids)}}
+        shared = get_shared_chunk_ids(list(contract_ids))
+        return {"$or": [where, {"chunk_id": {"$in": shared}}]} if shared else where
+
+    def _near_duplicate_index(self) -> NearDuplicateIndex:
+        # Callers hold the lock, so the shards cannot change while they are read
+        with self.near_duplicates_lock:
+            if self.near_duplicates is None:
+                index = NearDuplicateIndex(self.minhash.threshold)
+                with span("dedup.build") as current:
+                    for shard in self.shards:
+                        data = shard.get(include=["documents"])
+                        for chunk_id, document in zip(data["ids"], data["documents"]):
+                            # Copies saved before deduplication would only crowd the buckets
+                            signature = index.signature(document)
+                            if not index.find(signature, document):
+                                index.add(chunk_id, signature, document)
+                    current.set(chunks=len(index))
+                self.near_duplicates = index
+            return self.near_duplicates
+
+    @staticmethod
+    def _group_by_contracts(requests: List[tuple]) -> Dict[Optional[tuple], List[int]]:
+        # Batched requests can only share a scoring pass when they filter on the same contracts
+        groups = {}
+        for position, request in enumerate(requests):
+            contract_ids = request[-1]
+            groups.setdefault(tuple(sorted(contract_ids)) if contract_ids is not None else None, []).append(position)
+        return groups
+
+    def add_shard(self, rebalance: bool = True) -> int:
+        """Add one shard and optionally move chunks to their new home. Reads keep working throughout."""
+        with self.rw_lock.write():
+            index = len(self.shards)
+            self.shards.append(self.chroma_client.get_or_create_collection(name=self._shard_name(index)))
+            self.num_shards = len(self.shards)
+            old_pool, self.pool = self.pool, ThreadPoolExecutor(max_workers=max(4, len(self.shards)), thread_name_prefix="vector-shard")
+        old_pool.shutdown(wait=False)
+        if rebalance:
+            self.rebalance()
+        return index
+
+    def rebalance(self, batch_size: int = 500) -> int:
+        """Move chunks whose routing changed. Chunks are copied before they are deleted, so they are never missing."""
+        moved = 0
+        for source_index, shard in enumerate(list(self.shards)):
+            with self.rw_lock.read():
+                data = shard.get(include=["embeddings", "metadatas", "documents"])
+            moves = {}
+            for i, chunk_id in enumerate(data['ids']):
+                metadata = data['metadatas'][i]
+                target_index = self._shard_index(metadata.get("shard_key", metadata.get("contract_id", "")))
+                if target_index != source_index:
+                    moves.setdefault(target_index, []).append(i)
+
+            for target_index, positions in moves.items():
+                for start in range(0, len(positions), batch_size):
+                    batch = positions[start:start + batch_size]
+                    ids = [data['ids'][i] for i in batch]
+                    # One batch at a time, so searches can run between batches
+                    with self.rw_lock.write():
+                        self.shards[target_index].upsert(
+                            ids=ids,
+                            embeddings=[data['embeddings'][i] for i in batch],
+                            metadatas=[data['metadatas'][i] for i in batch],
+                            documents=[data['documents'][i] for i in batch]
+                        )
+                        shard.delete(ids=ids)
+                    moved += len(ids)
+
+        self.invalidate_keyword_index()
+        print(f"Rebalanced {moved} chunks across {len(self.shards)} shards.")
+        return moved
+
+    def semantic_splitter(self, text: str, max_chunk_size: int = 1000, min_chunk_size: int = 100, similarity_threshold: float = 0.7,
+                          standalone_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        # Paragraphs of at least standalone_size are never merged with their neighbours, so the same
+        # clause becomes the same chunk in every contract and shared boilerplate can be deduplicated
+        standalone_size = standalone_size or max_chunk_size // 3
         # แบ่งเนื้อหาเป็นส่วนๆ โดยใช้หัวข้อและการขึ้นบรรทัดใหม่
         sections = re.split(r'\n(?=[A-Z][a-z])', text)
         
-        chunks = []
+        chunks = []  # (text, standalone)
         for section in sections:
             # แบ่งส่วนย่อยตามย่อหน้าหรือการขึ้นบรรทัดใหม่
             paragraphs = re.split(r'\n\s*\n', section)
@@ -38,139 +225,369 @@ class VectorDB:
                             current_chunk += " " + sentence
                         else:
                             if len(current_chunk) >= min_chunk_size:
-                                chunks.append(current_chunk)
+                                chunks.append((current_chunk, True))
                             current_chunk = sentence
                     if len(current_chunk) >= min_chunk_size:
-                        chunks.append(current_chunk)
+                        chunks.append((current_chunk, True))
                 elif len(paragraph) >= min_chunk_size:
-                    chunks.append(paragraph)
+                    chunks.append((paragraph, len(paragraph) >= standalone_size))
         
         # รวม chunks ที่สั้นเกินไปกับ chunk ถัดไป
         merged_chunks = []
         current_chunk = ""
-        for chunk in chunks:
-            if len(current_chunk) + len(chunk) <= max_chunk_size:
+        for chunk, standalone in chunks:
+            if not standalone and len(current_chunk) + len(chunk) <= max_chunk_size:
                 current_chunk += " " + chunk if current_chunk else chunk
             else:
                 if current_chunk:
-                    merged_chunks.append(current_chunk)
-                current_chunk = chunk
+                    merged_chunks.append((current_chunk, False))
+                current_chunk = ""
+                if standalone:
+                    merged_chunks.append((chunk, True))
+                else:
+                    current_chunk = chunk
         if current_chunk:
-            merged_chunks.append(current_chunk)
+            merged_chunks.append((current_chunk, False))
         
         # ใช้ semantic similarity เพื่อรวม chunks ที่เกี่ยวข้องกัน
-        if len(merged_chunks) > 1:
-            embeddings = np.array([self.solar.embed_document(c) for c in merged_chunks])
+        mergeable = [i for i, (_, standalone) in enumerate(merged_chunks) if not standalone]
+        if len(mergeable) > 1:
+            embeddings = np.array([self.solar.embed_document(merged_chunks[i][0]) for i in mergeable])
             similarity_matrix = cosine_similarity(embeddings)
-            
+            similar = {mergeable[j] for j in range(1, len(mergeable))
+                       if mergeable[j] - 1 == mergeable[j - 1] and similarity_matrix[j][j - 1] >= similarity_threshold}
+
             final_chunks = []
-            current_chunk = merged_chunks[0]
+            current_chunk = merged_chunks[0][0]
             for i in range(1, len(merged_chunks)):
-                if similarity_matrix[i][i-1] >= similarity_threshold and len(current_chunk) + len(merged_chunks[i]) <= max_chunk_size:
-                    current_chunk += " " + merged_chunks[i]
+                if i in similar and len(current_chunk) + len(merged_chunks[i][0]) <= max_chunk_size:
+                    current_chunk += " " + merged_chunks[i][0]
                 else:
                     final_chunks.append(current_chunk)
-                    current_chunk = merged_chunks[i]
+                    current_chunk = merged_chunks[i][0]
             final_chunks.append(current_chunk)
         else:
-            final_chunks = merged_chunks
+            final_chunks = [chunk for chunk, _ in merged_chunks]
 
         return [{"content": chunk.strip()} for chunk in final_chunks]
 
+    @traced("index.save")
+    @deprioritized(BULK)  # Chat requests go first when the API is busy
     def save_to_vector_db(self, summary_result: Dict[str, Any], ocr_result: Dict[str, Any], file_name: str) -> str:
-        contract_id = str(uuid.uuid4())
-        print("Start analysis for chunking...")
-        
+        return self.commit_contract(self.stage_contract(ocr_result), summary_result, file_name)
+
+    @traced("index.stage")
+    @deprioritized(BULK)
+    def stage_contract(self, ocr_result: Dict[str, Any], contract_id: Optional[str] = None,
+                       cancelled: Optional[Callable[[], bool]] = None) -> Optional[Dict[str, Any]]:
+        """Chunk and embed a contract without storing it; None if cancelled on the way.
+
+        Nothing here needs the summary, so it can run while the user is still reviewing it.
+        """
+        contract_id = contract_id or str(uuid.uuid4())
+        chunks = []  # (chunk_id, text, page_number, chunk_index) for every chunk, duplicates included
+        for page in ocr_result.get("pages", []):
+            if cancelled and cancelled():
+                return None
+            page_text = page.get("text", "")
+            with span("index.chunk", page=page['id'], chars=len(page_text)) as current:
+                page_chunks = self.semantic_splitter(page_text)
+                current.set(chunks=len(page_chunks))
+            for i, chunk in enumerate(page_chunks, start=1):
+                chunks.append((f"{contract_id}_page_{page['id']}_chunk_{i:03d}", chunk["content"], page['id'], i))
+
+        # Boilerplate already stored for another contract is referenced instead of embedded again
+        signatures = {chunk[0]: self.minhash.signature(chunk[1]) if self.dedup else None for chunk in chunks}
+        with span("index.dedup", chunks=len(chunks)) as current:
+            duplicates = self._find_duplicates(chunks, list(signatures.values())) if self.dedup else {}
+            current.set(duplicates=len(duplicates))
+
+        embeddings = {}
+        for chunk_id, text, _, _ in chunks:
+            if chunk_id in duplicates:
+                continue
+            if cancelled and cancelled():
+                return None
+            embeddings[chunk_id] = self.solar.embed_document(text)
+        return {"contract_id": contract_id, "chunks": chunks, "signatures": signatures, "embeddings": embeddings}
+
+    @traced("index.commit")
+    @deprioritized(BULK)
+    def commit_contract(self, staged: Dict[str, Any], summary_result: Dict[str, Any], file_name: str) -> str:
+        """Store a staged contract with its summary: chunk metadata, summary index, clauses and parties."""
+        contract_id = staged["contract_id"]
+        parties = summary_result.get("parties", [])
+        parties_str = ", ".join([f"{party['name']} ({party['role']})" for party in parties])
+        routing_value = self._routing_value(contract_id, summary_result)
+        signature_of = staged["signatures"]
+        chunks = [(chunk_id, text, {
+            "contract_id": contract_id,
+            "contract_name": summary_result.get("title", ""),
+            "file_name": file_name,
+            "parties": parties_str,
+            "page_number": page_number,
+            "chunk_index": chunk_index,
+            "shard_key": routing_value,
+            "chunk_id": chunk_id
+        }) for chunk_id, text, page_number, chunk_index in staged["chunks"]]
+
+        # The store may have changed since staging: re-check, and embed chunks whose stored copy is gone
+        with span("index.dedup", chunks=len(chunks)) as current:
+            duplicates = self._find_duplicates(chunks, [signature_of[chunk[0]] for chunk in chunks]) if self.dedup else {}
+            current.set(duplicates=len(duplicates))
+
         ids = []
         embeddings = []
         metadatas = []
         documents = []
-
-        parties = summary_result.get("parties", [])
-        parties_str = ", ".join([f"{party['name']} ({party['role']})" for party in parties])
-
-        for page in ocr_result.get("pages", []):
-            page_text = page.get("text", "")
-            page_chunks = self.semantic_splitter(page_text)
-            
-            for i, chunk in enumerate(page_chunks, start=1):
-                chunk_id = f"{contract_id}_page_{page['id']}_chunk_{i:03d}"
-                print(f"Chunk ID: {chunk_id}, Content: {chunk['content'][:50]}...")  # Print first 50 chars for brevity
-                vector = self.solar.embed_document(chunk["content"])
-                
-                ids.append(chunk_id)
-                embeddings.append(vector)
-                metadatas.append({
-                    "contract_id": contract_id,
-                    "contract_name": summary_result.get("title", ""),
-                    "file_name": file_name,
-                    "parties": parties_str,
-                    "text": chunk["content"],
-                    "page_number": page['id'],
-                    "chunk_index": i
-                })
-                documents.append(chunk["content"])
-
-        print(f"Total chunks created: {len(ids)}")
-
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=documents
-        )
+        for chunk_id, text, metadata in chunks:
+            if chunk_id in duplicates:
+                continue
+            ids.append(chunk_id)
+            embedding = staged["embeddings"].get(chunk_id)
+            embeddings.append(embedding if embedding is not None else self.solar.embed_document(text))
+            metadatas.append(metadata)
+            documents.append(text)
+
+        with span("index.contract_summary"):
+            summary_entries = self._contract_entries(contract_id, summary_result, file_name)
+
+        # Chunks and summary become visible together: a search sees all of the contract or none of it
+        with self.rw_lock.write():
+            if self.dedup:
+                # Another writer may have stored the same boilerplate since the check above
+                index = self._near_duplicate_index()
+                for position in reversed(range(len(ids))):
+                    match = index.find(signature_of[ids[position]], documents[position])
+                    if match:
+                        duplicates[ids[position]] = match
+                        for column in (ids, embeddings, metadatas, documents):
+                            del column[position]
+
+            # Every chunk of a contract shares the routing value, so they land in the same shard
+            shard = self.shards[self._shard_index(routing_value)]
+            if ids:
+                with span("chroma.add", shard=shard.name, chunks=len(ids), chars=sum(len(d) for d in documents)):
+                    shard.add(
+                        ids=ids,
+                        embeddings=self._to_index_space(embeddings),
+                        metadatas=metadatas,
+                        documents=documents
+                    )
+            self.invalidate_keyword_index(shard)
+            if self.dedup:
+                for chunk_id, document in zip(ids, documents):
+                    index.add(chunk_id, signature_of[chunk_id], document)
+                self._save_references(contract_id, chunks, duplicates)
+            if summary_entries:
+                self.contract_index.upsert(**summary_entries)
+                self.indexed_contracts = None
+
+        # Clause records for direct chat lookups; outside the lock, they live in SQLite
+        with span("index.clauses") as current:
+            clauses = index_contract_clauses(contract_id, summary_result.get("title", ""), parties_str, file_name, [
+                {"id": chunk_id, "text": text, "page_number": metadata["page_number"]}
+                for chunk_id, text, metadata in chunks])
+            current.set(clauses=len(clauses))
+
+        # Party names and aliases for portfolio lookups and retrieval pre-filters
+        with span("index.entities") as current:
+            entities = index_contract_entities(contract_id, summary_result, file_name)
+            current.set(aliases=len(entities))
         
         return contract_id
 
-    def query_vector_db(self, query_text: str, n_results: int = 5) -> Dict[str, Any]:
-        query_embedding = self.solar.embed_query(query_text)
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
-        )
-        return results
+    @read_locked
+    def _find_duplicates(self, chunks: List[tuple], signatures: List[Any]) -> Dict[str, tuple]:
+        """chunk_id -> (stored chunk_id, similarity) for chunks that are near-duplicates of a stored one.
+
+        A chunk repeating an earlier chunk of the same contract maps to that chunk.
+        """
+        index = self._near_duplicate_index()
+        own = NearDuplicateIndex(index.threshold)
+        duplicates = {}
+        for chunk, signature in zip(chunks, signatures):
+            chunk_id, text = chunk[0], chunk[1]
+            match = index.find(signature, text) or own.find(signature, text)
+            if match:
+                duplicates[chunk_id] = match
+            else:
+                own.add(chunk_id, signature, text)
+        return duplicates
+
+    def _save_references(self, contract_id: str, chunks: List[tuple], duplicates: Dict[str, tuple]):
+        # Callers hold the write lock. References to the contract's own chunks are not needed.
+        references = [{
+            "chunk_id": duplicates[chunk_id][0],
+            "contract_id": contract_id,
+            "contract_name": metadata["contract_name"],
+            "file_name": metadata["file_name"],
+            "page_number": metadata["page_number"],
+            "similarity": duplicates[chunk_id][1]
+        } for chunk_id, _, metadata in chunks
+            if chunk_id in duplicates and not duplicates[chunk_id][0].startswith(contract_id)]
+        if not references:
+            return
+        # Chunks saved before deduplication have no chunk_id to filter on yet
+        shared_ids = list({reference["chunk_id"] for reference in references})
+        for shard in self.shards:
+            stored = shard.get(ids=shared_ids, include=["metadatas"])
+            missing = [chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]) if "chunk_id" not in metadata]
+            if missing:
+                shard.update(ids=missing, metadatas=[{"chunk_id": chunk_id} for chunk_id in missing])
+        save_chunk_references(references)
+
+    def _annotate_shared(self, results: List[Dict[str, Any]]):
+        # A shared chunk is one hit; its metadata lists the other contracts that contain it
+        references = get_chunk_references(list({result['id'] for result in results}))
+        for result in results:
+            if result['id'] in references:
+                result['metadata'] = {**result['metadata'], "shared_with": ", ".join(
+                    sorted({reference["file_name"] for reference in references[result['id']]}))}
+
+    @staticmethod
+    def _summary_views(summary_result: Dict[str, Any]) -> Dict[str, str]:
+        # One vector per facet of the summary; a contract scores as its best facet
+        title = summary_result.get("title", "")
+        views = {
+            "overview": f"{title}. {summary_result.get('overview', '')}",
+            "parties": ", ".join(f"{party.get('name', '')} ({party.get('role', '')})" for party in summary_result.get("parties", [])),
+            "conditions": " ".join(condition.get("description", "") for condition in summary_result.get("key_conditions", []))
+        }
+        return {view: text for view, text in views.items() if text.strip(" .")}
+
+    def _contract_entries(self, contract_id: str, summary_result: Dict[str, Any], file_name: str) -> Optional[Dict[str, Any]]:
+        # Embedded up front, so the write lock is only held for the upsert
+        views = self._summary_views(summary_result)
+        if not views:
+            return None
+        return {
+            "ids": [f"{contract_id}_{view}" for view in views],
+            "embeddings": [self.solar.embed_document(text) for text in views.values()],
+            "metadatas": [{
+                "contract_id": contract_id,
+                "contract_name": summary_result.get("title", ""),
+                "file_name": file_name,
+                "view": view
+            } for view in views],
+            "documents": list(views.values())
+        }
+
+    def index_contract(self, contract_id: str, summary_result: Dict[str, Any], file_name: str):
+        entries = self._contract_entries(contract_id, summary_result, file_name)
+        if entries:
+            with self.rw_lock.write():
+                self.contract_index.upsert(**entries)
+                self.indexed_contracts = None
+
+    @read_locked
+    def indexed_contract_count(self) -> int:
+        # A contract has up to len(SUMMARY_VIEWS) rows, so the row count overstates it
+        if self.indexed_contracts is None:
+            self.indexed_contracts = len({m["contract_id"] for m in self.contract_index.get(include=["metadatas"])["metadatas"]})
+        return self.indexed_contracts
+
+    @read_locked
+    def select_contracts(self, query_embedding: List[float], top_m: int) -> List[str]:
+        """Coarse stage: the top_m contracts whose summary best matches the query."""
+        count = self.contract_index.count()
+        if count == 0:
+            return []
+        with span("search.coarse", contracts=count // len(SUMMARY_VIEWS), top_m=top_m):
+            results = self.contract_index.query(
+                query_embeddings=[query_embedding],
+                n_results=min(top_m * len(SUMMARY_VIEWS), count),
+                include=["metadatas", "distances"]
+            )
+        best = {}
+        for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
+            contract_id = metadata["contract_id"]
+            best[contract_id] = max(best.get(contract_id, float("-inf")), 1 - distance)
+        return [contract_id for contract_id, _ in heapq.nlargest(top_m, best.items(), key=lambda x: x[1])]
+
+    def _to_index_space(self, vectors: List[List[float]]) -> List[List[float]]:
+        if self.reducer is None or not vectors:
+            return vectors
+        return self.reducer.transform(vectors).tolist()
+
+    def embed_query(self, query_text: str) -> List[float]:
+        return self.embed_batcher.submit(query_text)
 
+    def query_vector_db(self, query_text: str, n_results: int = 5) -> Dict[str, Any]:
+        query_embedding = self.embed_query(query_text)
+        merged = self.semantic_search(query_embedding, n_results)
+        # Keep Chroma's single-query response shape for callers of the raw results
+        return {
+            'ids': [[r['id'] for r in merged]],
+            'documents': [[r['document'] for r in merged]],
+            'metadatas': [[r['metadata'] for r in merged]],
+            'distances': [[1 - r['score'] for r in merged]]
+        }
+
+    @read_locked
     def get_all_documents(self) -> Dict[str, Any]:
-        return self.collection.get(include=['metadatas', 'documents'])
+        all_docs = {'ids': [], 'metadatas': [], 'documents': []}
+        for shard in self.shards:
+            data = shard.get(include=['metadatas', 'documents'])
+            for key in all_docs:
+                all_docs[key].extend(data[key])
+        return all_docs
 
     def search_documents(self, query_text: str, n_results: int = 5) -> Dict[str, Any]:
         return self.query_vector_db(query_text, n_results)
 
-    def semantic_search(self, query_embedding: List[float], n_results: int = 5) -> List[Dict[str, Any]]:
-        print(f"Debug: query_embedding length: {len(query_embedding)}")
-
-        try:
-            semantic_results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
-            print("Debug: Semantic search successful")
-
-            # Process and format the results
-            formatted_results = []
-            if semantic_results['ids'] and semantic_results['ids'][0]:  # Check if results exist
-                for idx in range(len(semantic_results['ids'][0])):
-                    formatted_results.append({
-                        'id': semantic_results['ids'][0][idx],
-                        'document': semantic_results['documents'][0][idx],
-                        'metadata': semantic_results['metadatas'][0][idx],
-                        'score': 1 - semantic_results['distances'][0][idx]  # Convert distance to similarity score
-                    })
-
-                # Sort by score (highest first) and return top n_results
-                formatted_results.sort(key=lambda x: x['score'], reverse=True)
-                return formatted_results[:n_results]
-            else:
-                print("Debug: No results found in semantic search")
-                return []
-
-        except Exception as e:
-            print(f"Debug: Semantic search failed with error: {str(e)}")
-            return []  # Return an empty list if search fails
+    def semantic_search(self, query_embedding: List[float], n_results: int = 5,
+                        contract_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if contract_ids is not None and not contract_ids:
+            return []
+        # Query every shard concurrently and keep the overall top n_results
+        with span("search.semantic", shards=len(self.shards)) as current:
+            try:
+                merged = self.semantic_batcher.submit((query_embedding, n_results, contract_ids))
+            except Exception as e:
+                # Keyword results still answer the search; the failure is recorded on the span
+                current.error = type(e).__name__
+                merged = []
+            current.set(results=len(merged))
+        return merged
+
+    @read_locked
+    def _semantic_search_batch(self, requests: List[tuple]) -> List[List[Dict[str, Any]]]:
+        """Batch handler for semantic_search: one Chroma query per shard for all requests that share a filter."""
+        results = [[] for _ in requests]
+        for key, positions in self._group_by_contracts(requests).items():
+            query_embeddings = self._to_index_space([requests[p][0] for p in positions])
+            n_max = max(requests[p][1] for p in positions)
+            where = self._contract_filter(key)
+
+            def search_shard(shard) -> List[List[Dict[str, Any]]]:
+                count = shard.count()
+                if count == 0:
+                    return [[] for _ in positions]
+                with span("chroma.query", shard=shard.name, queries=len(positions)):
+                    semantic_results = shard.query(
+                        query_embeddings=query_embeddings,
+                        n_results=min(n_max, count),
+                        where=where,
+                        include=["documents", "metadatas", "distances"]
+                    )
+
+                # Process and format the results, one list per query
+                return [[{
+                    'id': semantic_results['ids'][q][idx],
+                    'document': semantic_results['documents'][q][idx],
+                    'metadata': semantic_results['metadatas'][q][idx],
+                    'score': 1 - semantic_results['distances'][q][idx]  # Convert distance to similarity score
+                } for idx in range(len(semantic_results['ids'][q]))] for q in range(len(positions))]
+
+            shard_results = self._fan_out(search_shard)
+            for q, position in enumerate(positions):
+                results[position] = self._merge_top_k([shard[q] for shard in shard_results], requests[position][1])
+        return results
 
-    def hybrid_search(self, analysis: Dict[str, Any], n_results: int = 5) -> List[Dict[str, Any]]:
+    @traced("search.hybrid")
+    def hybrid_search(self, analysis: Dict[str, Any], n_results: int = 5,
+                      contract_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         # Extract relevant information from the analysis
         keywords = analysis.get("keywords", [])
         key_points = analysis.get("key_points", [])
@@ -183,60 +600,133 @@ class VectorDB:
             print("Debug: No valid search terms found in analysis")
             return []
 
+        query_embedding = self.embed_query(combined_text)
+
+        # Coarse stage: with many contracts, only search chunks of the best-matching ones
+        if contract_ids is None and self.indexed_contract_count() > self.top_contracts:
+            contract_ids = self.select_contracts(query_embedding, self.top_contracts)
+            set_attributes(candidate_contracts=len(contract_ids))
+
         # Perform semantic search
-        query_embedding = self.solar.embed_query(combined_text)
-        semantic_results = self.semantic_search(query_embedding, n_results * 2)  # Get more results initially
+        semantic_results = self.semantic_search(query_embedding, n_results * 2, contract_ids)  # Get more results initially
+
+        # Perform keyword search using BM25
+        keyword_results = self.keyword_search(keywords + key_points, n_results * 2, contract_ids)
 
-        # Perform keyword search using TF-IDF
-        keyword_results = self.keyword_search(keywords + key_points, n_results * 2)
+        if self.dedup:
+            self._annotate_shared(semantic_results + keyword_results)
 
         # Combine and rank results
-        combined_results = self.combine_and_rank_results(semantic_results, keyword_results, analysis)
+        with span("search.fusion", semantic=len(semantic_results), keyword=len(keyword_results)):
+            combined_results = self.combine_and_rank_results(semantic_results, keyword_results, analysis)
+            if self.dedup:
+                # Copies stored before deduplication, or below its threshold, still count once
+                combined_results = [combined_results[i] for i in self.minhash.collapse([r['document'] for r in combined_results], n_results)]
 
         return combined_results[:n_results]
 
-    def keyword_search(self, search_terms: List[str], n_results: int) -> List[Dict[str, Any]]:
+    def _bm25_index(self, shard) -> Optional[BM25Index]:
+        # Callers hold the read lock, so the shard cannot change while it is indexed
+        count = shard.count()
+        cached = self.bm25_cache.get(shard.name)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+
+        with span("bm25.build", shard=shard.name, documents=count):
+            all_docs = shard.get(include=['metadatas', 'documents'])
+            if not all_docs['documents']:
+                index = None
+            else:
+                try:
+                    index = BM25Index(all_docs['ids'], all_docs['documents'], all_docs['metadatas'], stem=self.stem_keywords)
+                except ValueError:  # No indexable terms in this shard
+                    index = None
+        self.bm25_cache[shard.name] = (count, index)
+        return index
+
+    def invalidate_keyword_index(self, shard=None):
+        if shard is None:
+            self.bm25_cache.clear()
+        else:
+            self.bm25_cache.pop(shard.name, None)
+
+    @read_locked
+    def keyword_idf(self, words: List[str]) -> Dict[str, float]:
+        """Corpus IDF of each word found in the keyword index (highest over shards)."""
+        idf = {}
+        for shard in self.shards:
+            index = self._bm25_index(shard)
+            if index is None:
+                continue
+            for word in words:
+                column = index.vocabulary.get(light_stem(word) if self.stem_keywords else word)
+                if column is not None:
+                    idf[word] = max(idf.get(word, 0.0), float(index.idf[column]))
+        return idf
+
+    @read_locked
+    def list_contracts(self) -> List[Dict[str, str]]:
+        """Id, title and file name of every contract in the contract-level index."""
+        data = self.contract_index.get(include=["metadatas"])
+        contracts = {}
+        for metadata in data["metadatas"]:
+            contracts.setdefault(metadata["contract_id"], {"contract_id": metadata["contract_id"],
+                                                           "contract_title": metadata.get("contract_name", ""),
+                                                           "file_name": metadata.get("file_name", "")})
+        return list(contracts.values())
+
+    @read_locked
+    def has_contract(self, contract_id: str) -> bool:
+        """Whether the contract is still indexed, by its summary entries or its own chunks."""
+        where = {"contract_id": contract_id}
+        if self.contract_index.get(where=where, limit=1)["ids"]:
+            return True
+        return any(shard.get(where=where, limit=1)["ids"] for shard in self.shards)
+
+    @read_locked
+    def contract_vocabulary(self) -> Dict[str, List[str]]:
+        """Titles and party names of the indexed contracts, read from the contract-level index."""
+        data = self.contract_index.get(include=["metadatas", "documents"])
+        titles, parties = set(), set()
+        for metadata, document in zip(data["metadatas"], data["documents"]):
+            if metadata.get("contract_name"):
+                titles.add(metadata["contract_name"])
+            if metadata.get("view") == "parties":
+                # The parties view reads "Name (Role), Name (Role)"
+                parties.update(name.strip() for name, _ in re.findall(r"([^,(]+)\(([^)]*)\)", document) if name.strip())
+        return {"titles": sorted(titles), "parties": sorted(parties)}
+
+    def keyword_search(self, search_terms: List[str], n_results: int,
+                       contract_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         if not search_terms:
             print("Debug: No search terms provided for keyword search")
             return []
 
-        all_docs = self.get_all_documents()
-        documents = all_docs['documents']
-        metadatas = all_docs['metadatas']
-
-        if not documents:
-            print("Debug: No documents found in the collection")
-            return []
-
-        # Tokenize the documents
-        vectorizer = CountVectorizer(tokenizer=lambda x: x.split())
-        doc_term_matrix = vectorizer.fit_transform(documents)
-
-        # Convert sparse matrix to list of tokenized documents
-        tokenized_corpus = [doc.split() for doc in documents]
-
-        # Create BM25 object
-        bm25 = BM25Okapi(tokenized_corpus)
-
-        # Perform the search
         query = " ".join(search_terms)
-        scores = bm25.get_scores(query.split())
-
-        # Sort documents by BM25 score
-        sorted_indexes = scores.argsort()[::-1]
-
-        # Prepare results
-        keyword_results = []
-        for idx in sorted_indexes[:n_results]:
-            keyword_results.append({
-                'id': all_docs['ids'][idx],
-                'document': documents[idx],
-                'metadata': metadatas[idx],
-                'score': scores[idx]
-            })
-
+        with span("search.bm25", shards=len(self.shards)) as current:
+            keyword_results = self.keyword_batcher.submit((query, n_results, contract_ids))
+            current.set(results=len(keyword_results))
         return keyword_results
 
+    @read_locked
+    def _keyword_search_batch(self, requests: List[tuple]) -> List[List[Dict[str, Any]]]:
+        """Batch handler for keyword_search: each shard scores all queries in one sparse product."""
+        results = [[] for _ in requests]
+        for key, positions in self._group_by_contracts(requests).items():
+            queries = [requests[p][0] for p in positions]
+            limits = [requests[p][1] for p in positions]
+            shared = get_shared_chunk_ids(list(key)) if key is not None else []
+
+            def search_shard(shard) -> List[List[Dict[str, Any]]]:
+                # Each shard keeps its own BM25 statistics, like a shard-local index
+                index = self._bm25_index(shard)
+                return index.top_k_batch(queries, limits, key, shared) if index is not None else [[] for _ in positions]
+
+            shard_results = self._fan_out(search_shard)
+            for q, position in enumerate(positions):
+                results[position] = self._merge_top_k([shard[q] for shard in shard_results], limits[q])
+        return results
+
 
     def combine_and_rank_results(self, semantic_results: List[Dict[str, Any]], 
                                 keyword_results: List[Dict[str, Any]], 
@@ -290,17 +780,137 @@ class VectorDB:
 
         return sorted_results
 
+    def migrate_storage(self, method: Optional[str] = "pca", dim: int = 256, batch_size: int = 500) -> Dict[str, Any]:
+        """Rewrite every shard in storage-efficiency mode.
+
+        Fits a reducer on the stored vectors (with method None the vectors and
+        any existing reducer are kept), strips the duplicated chunk text from
+        metadata and swaps each shard for a rebuilt copy. Returns a report with
+        recall@k of the reduced vectors against the exact neighbours in the
+        full-dimension vectors.
+
+        All copies are built before the reducer and a commit marker are saved,
+        and the shards are swapped only after that, so an interrupted run is
+        finished or rolled back on the next start (see _recover_migration).
+        """
+        # Searches keep running while the copies are built; saves wait
+        with self.rw_lock.read():
+            shard_data = [shard.get(include=["embeddings", "metadatas", "documents"]) for shard in self.shards]
+            stored = [np.asarray(data['embeddings'], dtype=np.float32) for data in shard_data if data['ids']]
+            if not stored:
+                print("Collection is empty, nothing to migrate.")
+                return {"chunks": 0}
+            old_vectors = np.vstack(stored)
+
+            # Vectors already reduced by an earlier migration cannot be reduced again
+            if method and self.reducer is not None:
+                raise ValueError("Collection is already reduced; re-ingest the contracts to change the reducer.")
+
+            reducer = EmbeddingReducer.fit(old_vectors, method, dim) if method else None
+            new_vectors = reducer.transform(old_vectors) if reducer else old_vectors
+            report = {
+                "chunks": len(old_vectors),
+                "dim_before": int(old_vectors.shape[1]),
+                "dim_after": int(new_vectors.shape[1]),
+                "method": method or "none",
+                # Without a reducer the vectors are unchanged and there is nothing to measure
+                "recall_vs_full": recall_at_k(old_vectors, new_vectors) if reducer else None,
+            }
+
+            # Build every replacement next to its live shard
+            existing = [c.name for c in self.chroma_client.list_collections()]
+            copies = []
+            offset = 0
+            for index, data in enumerate(shard_data):
+                count = len(data['ids'])
+                if not count:
+                    continue
+                vectors = new_vectors[offset:offset + count]
+                offset += count
+                staging_name = f"{self._shard_name(index)}{MIGRATING_SUFFIX}"
+                if staging_name in existing:
+                    self.chroma_client.delete_collection(staging_name)  # Left over from an interrupted run
+                staging = self.chroma_client.create_collection(name=staging_name)
+                for start in range(0, count, batch_size):
+                    end = start + batch_size
+                    staging.add(
+                        ids=data['ids'][start:end],
+                        embeddings=vectors[start:end].tolist(),
+                        metadatas=[{k: v for k, v in m.items() if k != "text"} for m in data['metadatas'][start:end]],
+                        documents=data['documents'][start:end]
+                    )
+                copies.append((index, count))
+
+        with self.rw_lock.write():
+            # A save between the build and the swap would be lost with the old shard
+            if any(self.shards[index].count() != count for index, count in copies):
+                for index, _ in copies:
+                    self.chroma_client.delete_collection(f"{self._shard_name(index)}{MIGRATING_SUFFIX}")
+                raise RuntimeError("Contracts were saved during the migration; run it again.")
+            # From the marker on, an interrupted run is finished rather than rolled back
+            if reducer:
+                reducer.save(self.reducer_path)
+                self.reducer = reducer
+            open(self.migration_marker, "w").close()
+            for index, _ in copies:
+                self._swap_in_copy(self._shard_name(index))
+                self.shards[index] = self.chroma_client.get_collection(self._shard_name(index))
+            os.remove(self.migration_marker)
+            self.invalidate_keyword_index()
+        return report
+
+    def _swap_in_copy(self, name: str):
+        if name in [c.name for c in self.chroma_client.list_collections()]:
+            self.chroma_client.delete_collection(name)
+        self.chroma_client.get_collection(f"{name}{MIGRATING_SUFFIX}").modify(name=name)
+
+    def _recover_migration(self):
+        """Finish or roll back a migration that was interrupted before all shards were swapped."""
+        committed = os.path.exists(self.migration_marker)
+        for collection in self.chroma_client.list_collections():
+            if not collection.name.endswith(MIGRATING_SUFFIX):
+                continue
+            name = collection.name[:-len(MIGRATING_SUFFIX)]
+            # Copies are only complete once the marker exists; before that the live shards are untouched
+            if committed:
+                self._swap_in_copy(name)
+                print(f"Finished the interrupted migration of {name}.")
+            else:
+                self.chroma_client.delete_collection(collection.name)
+                print(f"Rolled back the interrupted migration of {name}.")
+        if committed:
+            os.remove(self.migration_marker)
+
+    @write_locked
     def clear_collection(self):
-        """Clear all data in the collection."""
-        # Get all IDs in the collection
-        all_ids = self.collection.get()['ids']
-        
-        if all_ids:
-            # Delete all documents using their IDs
-            self.collection.delete(ids=all_ids)
-            print(f"Deleted {len(all_ids)} documents from the collection.")
+        """Clear all data in every shard, and the SQLite records of the cleared contracts."""
+        total = 0
+        for shard in self.shards:
+            # Get all IDs in the shard
+            all_ids = shard.get()['ids']
+            if all_ids:
+                # Delete all documents using their IDs
+                shard.delete(ids=all_ids)
+                total += len(all_ids)
+
+        contract_ids = self.contract_index.get()['ids']
+        if contract_ids:
+            self.contract_index.delete(ids=contract_ids)
+        self.indexed_contracts = None
+        # Summaries, deadlines, clauses and parties would otherwise point at contracts that are gone
+        delete_contract_records()
+        clear_spooled()
+        self.near_duplicates = None
+
+        self.invalidate_keyword_index()
+        if total:
+            print(f"Deleted {total} documents from {len(self.shards)} shard(s).")
         else:
             print("Collection is already empty.")
 
-# Create an instance of VectorDB
-vector_db = VectorDB(clear_on_init=True)
+def __getattr__(name):
+    # The shared instance now lives in the service registry and is created on first use
+    if name == "vector_db":
+        from src.services.registry import get_vector_db
+        return get_vector_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,42 @@
 import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
 from streamlit_calendar import calendar
-from src.database.sqlite_db import get_all_events
+from src.database.sqlite_db import get_all_events, get_calendar_version
+from src.services.deadlines import deadlines_between, upcoming_deadlines
+
+# Deadline kinds shown under the colours the calendar already uses
+KIND_TYPES = {
+    "renewal": "Renewal",
+    "expiration": "Expiration",
+    "payment": "Payment Due",
+    "review": "Review",
+    "notice": "Notice",
+    "start": "Key Date",
+    "key date": "Key Date",
+}
 
 @st.cache_data
-def fetch_events():
-    return get_all_events()
+def fetch_events(today, version):
+    # Cached per day and per version of the deadline and event tables, so a new day or a
+    # newly saved contract is picked up on the next visit.
+    # Contracts saved before the deadline index keep their old events, minus the
+    # "non-specific" ones that were parked on the day they were saved
+    events = [event for event in get_all_events() if event['type'] != 'Non-specific']
+    for deadline in deadlines_between(today - timedelta(days=365), today + timedelta(days=730)):
+        events.append({
+            'title': f"{deadline['contract_title']}: {deadline['title']}",
+            'start': deadline['due_date'],
+            'end': deadline['due_date'],
+            'type': KIND_TYPES.get(deadline['kind'], "Key Date")
+        })
+    return events
 
 def render():
     st.title("📅 Contract Calendar")
 
     # Fetch events from SQLite using cached function
-    db_events = fetch_events()
+    db_events = fetch_events(date.today(), get_calendar_version())
 
     # Convert events to the format expected by the calendar
     calendar_events = [
@@ -23,7 +49,8 @@ def render():
                 "Renewal": "#4CAF50",
                 "Expiration": "#F44336",
                 "Payment Due": "#2196F3",
-                "Review": "#FFC107"
+                "Review": "#FFC107",
+                "Notice": "#9C27B0"
             }.get(event['type'], "#9E9E9E")
         }
         for event in db_events
@@ -72,6 +99,24 @@ def render():
     elif cal.get("eventClick") is not None:
         st.write("Event clicked:", cal["eventClick"]["event"]["title"])
 
+    # Upcoming deadlines across all contracts, straight from the deadline index
+    st.markdown("### ⏰ Upcoming Deadlines")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        days = st.number_input("Next N days", min_value=1, max_value=3650, value=45, step=1)
+    with col2:
+        kinds = st.multiselect("Types", list(KIND_TYPES), default=["renewal", "notice", "expiration"])
+    upcoming = upcoming_deadlines(int(days), kinds or None)
+    if upcoming:
+        st.dataframe(pd.DataFrame([{
+            "Due": deadline['due_date'],
+            "Type": deadline['kind'].capitalize(),
+            "Contract": deadline['contract_title'],
+            "Deadline": deadline['title']
+        } for deadline in upcoming]), hide_index=True, use_container_width=True)
+    else:
+        st.info(f"No deadlines in the next {int(days)} days.")
+
 
 if __name__ == "__main__":
     render()
\ No newline at end of file
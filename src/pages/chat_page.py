@@ -1,120 +1,201 @@
 import streamlit as st
-from src.services.chat import Solar
-from src.database.vector_db import vector_db
-import json
-
-solar = Solar()
+import os
+import uuid
+from src.services.registry import get_solar, get_vector_db, get_query_analyzer
+from src.services.deadlines import answer_deadline_question
+from src.services.clauses import answer_clause_question
+from src.services.entities import answer_entity_question, find_entities, contract_ids_for
+from src.services.comparison import is_comparison_question, select_comparison_contracts, iter_findings, synthesize
+from src.services.memory import ConversationMemory, response_contract_ids, is_follow_up
+from src.utils.tracing import trace, span
+from src.utils.timing_panel import display_timing
+
+HISTORY_PAGE = 20
 
 def render():
     st.title("Contract Chatbot")
 
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-
-    for message in st.session_state.messages:
+    solar = get_solar()
+    vector_db = get_vector_db()
+    # The local analyzer saves an LLM round-trip per question; QUERY_ANALYZER=llm restores the old path
+    analyze_query = solar.analyze_user_query if os.getenv("QUERY_ANALYZER", "local") == "llm" else get_query_analyzer().analyze
+
+    # The conversation lives in SQLite; its id in the URL lets a reload pick it up again
+    session_id = st.query_params.get("chat")
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        st.query_params["chat"] = session_id
+    memory = ConversationMemory(session_id, solar)
+
+    # Only the latest messages are rendered; older ones are loaded a page at a time
+    shown = st.session_state.setdefault("history_shown", HISTORY_PAGE)
+    messages = memory.page(shown + 1)
+    if len(messages) > shown:
+        messages = messages[1:]
+        if st.button("Show earlier messages"):
+            st.session_state.history_shown += HISTORY_PAGE
+            st.rerun()
+    for message in messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
     if prompt := st.chat_input("What would you like to know about the contracts?"):
-        st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                # Analyze the query
-                analysis = solar.analyze_user_query(prompt)
-
-                # Convert the analysis to text
-                analysis_text = json.dumps(analysis, indent=2)
-                print("Analysis:", analysis_text)
-
-                if not analysis["is_contract_related"]:
-                    response = {
-                        "answer": solar.talk_general(prompt),
-                        "references": []
-                    }
-                else:
-
-                    # Embed the overview query
-                    # overview_query_embedding = solar.embed_query(analysis_text)
-
-                    # Perform sementic search
-                    # search_results = vector_db.semantic_search(
-                    #     query_embedding=overview_query_embedding,
-                    #     n_results=5
-                    # )
-
-                    # Perform hybrid search
-                    search_results = vector_db.hybrid_search(
-                        analysis=analysis,
-                        n_results=5
-                    )
-
-                    print("\n\n 🧍🏻Search Results:", search_results)
-
-                    # Generate response
-                    response = solar.generate_response(prompt, search_results)
-                    print("✨ Response:", response)
-
-                    # Evaluate the response
-                    evaluation = solar.self_evaluate(prompt, response, search_results)
-                    print("Evaluation:", evaluation)
-
-                    if evaluation['evaluation_score'] < 0.7:
-                        # improve with semantic search
-                        # improved_results = vector_db.semantic_search(
+            with trace("chat", prompt_chars=len(prompt)) as chat_trace:
+                with st.spinner("Thinking..."):
+                    # Recent turns, the rolling summary and the last answer's contracts, within a token budget
+                    with span("memory.context") as current:
+                        history = memory.context()
+                        memory.add("user", prompt)
+                        current.set(tokens=history["tokens"], messages=len(history["messages"]))
+                    search_results = []
+
+                    # Portfolio date questions ("renewals in Q3") are answered from the deadline index, without the LLM
+                    with span("deadlines.lookup"):
+                        deadline_response = answer_deadline_question(prompt)
+
+                    # "Which contracts do we have with Flotek?" is answered from the party index
+                    entity_response = None
+                    if not deadline_response:
+                        with span("entities.lookup"):
+                            entity_response = answer_entity_question(prompt)
+
+                    # Analyze the query
+                    analysis = {"is_contract_related": False} if deadline_response or entity_response else analyze_query(prompt)
+
+                    # "What is the governing law of the Acme lease?" is answered from the stored clause
+                    clause_response = None
+                    if analysis["is_contract_related"]:
+                        with span("clauses.lookup"):
+                            clause_response = answer_clause_question(prompt, analysis)
+
+                    # "Compare the payment terms across our supply agreements" fans out over the target contracts
+                    comparison = None
+                    if analysis["is_contract_related"] and not clause_response and is_comparison_question(prompt):
+                        with span("compare.select") as current:
+                            comparison = select_comparison_contracts(prompt, vector_db)
+                            current.set(contracts=len(comparison["contracts"]), matched=comparison["matched"])
+                        if not comparison["contracts"]:
+                            comparison = None
+
+                    if deadline_response:
+                        response = deadline_response
+                    elif entity_response:
+                        response = entity_response
+                    elif clause_response:
+                        response = clause_response
+                        evaluation = {"evaluation_score": 1.0, "feedback": "Quoted from the stored clause record.",
+                                      "suggestions_for_improvement": []}
+                    elif comparison:
+                        # Each contract's finding is shown as soon as it is ready, then one call compares them
+                        total = len(comparison["contracts"])
+                        with st.status(f"Comparing {total} contracts...", expanded=True) as status:
+                            findings = []
+                            for finding in iter_findings(prompt, analysis, comparison["contracts"], solar, vector_db):
+                                findings.append(finding)
+                                st.markdown(f"**{finding['contract_title']}** ({finding['file_name']}): {finding['finding']}")
+                                status.update(label=f"Compared {len(findings)} of {total} contracts...")
+                            with span("compare.synthesize"):
+                                response = synthesize(prompt, findings, solar, comparison["matched"])
+                            status.update(label=f"Compared {total} contracts", state="complete", expanded=False)
+                        evaluation = {"evaluation_score": response["confidence"],
+                                      "feedback": f"Compared from the findings of {total} contracts, each searched separately.",
+                                      "suggestions_for_improvement": []}
+                    elif not analysis["is_contract_related"]:
+                        response = {
+                            "answer": solar.talk_general(prompt, ConversationMemory.format(history)),
+                            "references": []
+                        }
+                    else:
+                        # Questions naming a party only search that party's contracts
+                        with span("entities.resolve") as current:
+                            entity_contract_ids = contract_ids_for(find_entities(prompt)) or None
+                            # "What about its renewal?" stays with the contracts of the previous answer
+                            if entity_contract_ids is None and history["contract_ids"] and is_follow_up(prompt):
+                                entity_contract_ids = history["contract_ids"]
+                            current.set(contracts=len(entity_contract_ids or []))
+
+                        # Embed the overview query
+                        # overview_query_embedding = solar.embed_query(analysis_text)
+
+                        # Perform sementic search
+                        # search_results = vector_db.semantic_search(
                         #     query_embedding=overview_query_embedding,
-                        #     n_results=10
+                        #     n_results=5
                         # )
 
-                        # improve with hybrid search
-                        improved_results = vector_db.hybrid_search(
+                        # Perform hybrid search
+                        search_results = vector_db.hybrid_search(
                             analysis=analysis,
-                            n_results=10
+                            n_results=5,
+                            contract_ids=entity_contract_ids
                         )
-                        improved_response = solar.generate_response(prompt, improved_results)
-                        improved_evaluation = solar.self_evaluate(prompt, improved_response, improved_results)
+
+                        # Generate response
+                        response = solar.generate_response(prompt, search_results, ConversationMemory.format(history))
+
+                        # Evaluate the response
+                        evaluation = solar.self_evaluate(prompt, response, search_results)
+
+                        if evaluation['evaluation_score'] < 0.7:
+                            # improve with semantic search
+                            # improved_results = vector_db.semantic_search(
+                            #     query_embedding=overview_query_embedding,
+                            #     n_results=10
+                            # )
+
+                            # improve with hybrid search
+                            improved_results = vector_db.hybrid_search(
+                                analysis=analysis,
+                                n_results=10,
+                                contract_ids=entity_contract_ids
+                            )
+                            improved_response = solar.generate_response(prompt, improved_results, ConversationMemory.format(history))
+                            improved_evaluation = solar.self_evaluate(prompt, improved_response, improved_results)
                         
-                        if improved_evaluation['evaluation_score'] > evaluation['evaluation_score']:
-                            response = improved_response
-                            evaluation = improved_evaluation
-
-            # Write the answer
-            st.write(response["answer"])
-
-            if analysis["is_contract_related"]:
-                # Write the references
-                if response["references"]:
-                    with st.expander("📎 References"):
-                        references_by_file = {}
-                        for ref in response["references"]:
-                            if ref['file_name'] not in references_by_file:
-                                references_by_file[ref['file_name']] = []
-                            references_by_file[ref['file_name']].append(ref)
+                            if improved_evaluation['evaluation_score'] > evaluation['evaluation_score']:
+                                response = improved_response
+                                evaluation = improved_evaluation
+                                search_results = improved_results
+
+                # Write the answer
+                with span("render"):
+                    st.write(response["answer"])
+
+                    if analysis["is_contract_related"]:
+                        # Write the references
+                        if response["references"]:
+                            with st.expander("📎 References"):
+                                references_by_file = {}
+                                for ref in response["references"]:
+                                    if ref['file_name'] not in references_by_file:
+                                        references_by_file[ref['file_name']] = []
+                                    references_by_file[ref['file_name']].append(ref)
                         
-                        for file_name, refs in references_by_file.items():
-                            st.markdown(f"**File: {file_name}**")
-                            for ref in refs:
-                                st.markdown(f"* Page: {ref['page']}, Relevance: {ref['relevance']}")
+                                for file_name, refs in references_by_file.items():
+                                    st.markdown(f"**File: {file_name}**")
+                                    for ref in refs:
+                                        st.markdown(f"* Page: {ref['page']}, Relevance: {ref['relevance']}")
                 
-                # Write the evaluation details
-                with st.expander("Evaluation Details"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("Confidence", f"{response.get('confidence', 0.0):.2f}")
-                    with col2:
-                        st.metric("Evaluation Score", f"{evaluation['evaluation_score']:.2f}")
+                        # Write the evaluation details
+                        with st.expander("Evaluation Details"):
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                st.metric("Confidence", f"{response.get('confidence', 0.0):.2f}")
+                            with col2:
+                                st.metric("Evaluation Score", f"{evaluation['evaluation_score']:.2f}")
                     
-                    st.write("Feedback:", evaluation['feedback'])
-                    st.write("Suggestions for improvement:")
-                    for suggestion in evaluation['suggestions_for_improvement']:
-                        st.markdown(f"- {suggestion}")
-
+                            st.write("Feedback:", evaluation['feedback'])
+                            st.write("Suggestions for improvement:")
+                            for suggestion in evaluation['suggestions_for_improvement']:
+                                st.markdown(f"- {suggestion}")
 
-            
+            display_timing(chat_trace.timing_rows())
 
-        st.session_state.messages.append({"role": "assistant", "content": response["answer"]})
+        memory.add("assistant", response["answer"], response_contract_ids(response, search_results))
 
 if __name__ == "__main__":
     render()
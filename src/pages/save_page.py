@@ -1,9 +1,12 @@
 import streamlit as st
 import json
-from src.database.google_drive_db import save_to_google_drive
-from src.database.sqlite_db import save_events
-from src.utils.json_parser import extract_events_from_summary
-from src.database.vector_db import vector_db
+from src.database.sqlite_db import save_summary
+from src.database.pdf_handler import load_ocr_result, get_ocr_result_path, delete_spooled
+import os
+from src.services.deadlines import index_contract_deadlines
+from src.services.registry import get_vector_db
+from src.services.staging import take_staged, staging_status
+from src.utils.tracing import trace, span
 import time
 import random
 import string
@@ -11,20 +14,20 @@ import string
 def render():
     st.title("💾 Save the contract")
 
-    # get the uploaded file and OCR result from session state
-    uploaded_file = st.session_state.uploaded_file
-    ocr_result = st.session_state.get('ocr_result', '')
+    # get the spooled file record from session state; the OCR result stays on disk until saving
+    contract_file = st.session_state.get('contract_file')
+    doc_hash = st.session_state.get('document_hash')
 
 
-    if uploaded_file is not None and ocr_result:
+    if contract_file is not None and doc_hash and os.path.exists(get_ocr_result_path(doc_hash)):
         summary_result = json.loads(st.session_state.summary_result)
         
         st.markdown(f"""
         <div style="border: 1px solid #E5E7EB; border-radius: 0.375rem; padding: 1rem; margin-bottom: 2rem;">
         <h3 style="margin-top: 0;">📋 {summary_result["title"]} {"Contract" if "contract" not in summary_result["title"].lower() else ""}</h3>
-        <p style="margin-bottom: 0.5rem;"><strong>File Name:</strong> {uploaded_file.name}</p>
-        <p style="margin-bottom: 0.5rem;"><strong>File Type:</strong> {uploaded_file.type}</p>
-        <p style="margin-bottom: 0;"><strong>File Size:</strong> {uploaded_file.size / 1024:.2f} KB</p>
+        <p style="margin-bottom: 0.5rem;"><strong>File Name:</strong> {contract_file['name']}</p>
+        <p style="margin-bottom: 0.5rem;"><strong>File Type:</strong> {contract_file['type']}</p>
+        <p style="margin-bottom: 0;"><strong>File Size:</strong> {contract_file['size'] / 1024:.2f} KB</p>
         </div>
         """, unsafe_allow_html=True)
 
@@ -57,34 +60,53 @@ def render():
                 status_text = st.empty()
 
                 try:
-                    # Step 1: Save to Google Drive
-                    # status_text.text("Saving to Google Drive...")
-                    # file_id = save_to_google_drive(uploaded_file)
-                    status_text.text("Saving the contract ...")
-                    file_id = ''.join(random.choices(string.ascii_letters + string.digits, k=20))
-                    progress_bar.progress(20)
-
-                    # Step 2: Extract events from summary
-                    status_text.text("Extracting events from summary...")
-                    events = extract_events_from_summary(summary_result)
-                    progress_bar.progress(40)
-
-                    # Step 3: Save events to Global Calendar
-                    status_text.text("Saving events to Global Calendar...")
-                    save_events(events, file_id)
-                    progress_bar.progress(60)
-
-                    # Step 4: Save to Chroma Vector DB
-                    status_text.text("Saving to Chroma Vector DB...")
-                    vector_db_id = vector_db.save_to_vector_db(summary_result, ocr_result, uploaded_file.name)
-                    progress_bar.progress(80)
-
-                    # Step 5: Reset session state
+                    with trace("ingest.save", file_bytes=contract_file['size']):
+                        # Step 1: Save to Google Drive
+                        # status_text.text("Saving to Google Drive...")
+                        # from src.database.google_drive_db import save_spooled_to_google_drive
+                        # file_id = save_spooled_to_google_drive(contract_file)
+                        status_text.text("Saving the contract ...")
+                        file_id = ''.join(random.choices(string.ascii_letters + string.digits, k=20))
+                        progress_bar.progress(20)
+
+                        # Step 2: Save to Chroma Vector DB. Chunks and embeddings were staged in the background
+                        # after OCR, so usually only the commit is left
+                        vector_db = get_vector_db()
+                        status_text.text({
+                            "done": "Saving to Chroma Vector DB...",
+                            "running": "Finishing background indexing...",
+                        }.get(staging_status(st.session_state.session_id, doc_hash), "Indexing the contract in Chroma Vector DB..."))
+                        with span("save.wait_staged"):
+                            staged = take_staged(st.session_state.session_id, doc_hash)
+                        if staged is not None:
+                            vector_db_id = vector_db.commit_contract(staged, summary_result, contract_file['name'])
+                        else:
+                            with span("save.load_ocr"):
+                                ocr_result = load_ocr_result(doc_hash)
+                            vector_db_id = vector_db.save_to_vector_db(summary_result, ocr_result, contract_file['name'])
+                        progress_bar.progress(50)
+
+                        # Step 3: Resolve dates, renewals and notice periods into the deadline index (Global Calendar)
+                        status_text.text("Saving deadlines to Global Calendar...")
+                        with span("save.deadlines") as current:
+                            rules = index_contract_deadlines(vector_db_id, summary_result)
+                            current.set(rules=len(rules))
+                        progress_bar.progress(80)
+
+                        # Step 4: Keep the full summary so the contract can be re-opened without OCR or the LLM
+                        status_text.text("Saving the summary...")
+                        with span("save.summary"):
+                            save_summary(vector_db_id, doc_hash, file_id, contract_file['name'],
+                                         summary_result.get("title", ""), st.session_state.summary_result)
+                        progress_bar.progress(90)
+
+                    # Step 5: The contract is stored, so the spooled PDF and OCR result can go; reset session state
+                    delete_spooled(doc_hash)
                     status_text.text("Resetting session state...")
                     st.session_state.page = 'upload'
-                    st.session_state.ocr_result = None
                     st.session_state.summary_result = None
-                    st.session_state.uploaded_file = None
+                    st.session_state.contract_file = None
+                    st.session_state.document_hash = None
                     progress_bar.progress(100)
 
                     status_text.text("Process completed successfully!")
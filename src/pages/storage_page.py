@@ -1,38 +1,55 @@
 import streamlit as st
 import pandas as pd
 import os
-from src.database.google_drive_db import get_files_from_drive, download_file
+import math
+from src.database.google_drive_db import get_files_from_drive
+from src.services.entities import resolve_entity
 from src.utils.config import load_environment_variables
 
 load_environment_variables()
 
 FOLDER_ID = os.getenv('DRIVE_FOLDER_ID')
+PAGE_SIZES = [25, 50, 100]
+
+def reset_page():
+    # A new search, sort or page size starts from the first page
+    st.session_state.storage_page = 1
 
 def render():
     st.title("📁 Contract Storage")
 
-    # Fetch files from Google Drive
-    files = get_files_from_drive()
-
     # Search functionality
-    search_term = st.text_input("🔍 Search contracts", "")
+    search_term = st.text_input("🔍 Search contracts", "", on_change=reset_page)
 
     # Sorting options
-    sort_option = st.selectbox("Sort by:", ["Name", "Size", "Last Modified"])
-
-    # Filter and sort items
-    items = [file for file in files if search_term.lower() in file['name'].lower()]
-
-    if sort_option == "Name":
-        items.sort(key=lambda x: x["name"])
-    elif sort_option == "Size":
-        items.sort(key=lambda x: float(x["size"].split()[0]) if x["size"] != 'N/A' else 0, reverse=True)
-    else:  # Last Modified
-        items.sort(key=lambda x: x["modified"], reverse=True)
-
-    # Display as a table
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        sort_option = st.selectbox("Sort by:", ["Name", "Size", "Last Modified"], on_change=reset_page)
+    with col2:
+        page_size = st.selectbox("Rows per page:", PAGE_SIZES, on_change=reset_page)
+
+    # A party name (or a misspelling of one) also finds the files of that party's contracts
+    parties = resolve_entity(search_term) if search_term else []
+    party_files = list(dict.fromkeys(c['file_name'] for party in parties for c in party['contracts'] if c['file_name']))
+    if parties:
+        st.caption("Including contracts with: " + ", ".join(dict.fromkeys(name for party in parties for name in party['names'])))
+
+    # Filtering, sorting and paging run in SQL against the local mirror of the Drive folder
+    page = st.session_state.get('storage_page', 1)
+    items, total = get_files_from_drive(search_term, sort_option, page=page, page_size=page_size, also_names=party_files)
+    pages = max(1, math.ceil(total / page_size))
+    if page > pages:
+        # Files were removed since the page was picked
+        page = pages
+        items, total = get_files_from_drive(search_term, sort_option, page=page, page_size=page_size, also_names=party_files)
+    st.session_state.storage_page = page
+    with col3:
+        st.number_input("Page:", min_value=1, max_value=pages, step=1, key="storage_page")
+
+    # Display only the visible page as a table
     df = pd.DataFrame(items)
     st.dataframe(df, use_container_width=True, hide_index=True)
+    st.caption(f"Page {page} of {pages} · {total} contracts")
 
     # Add download functionality
     if st.button("🔗 Go to Drive Folder"):
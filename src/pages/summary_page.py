@@ -1,5 +1,8 @@
 import streamlit as st
 from src.utils.json_parser import display_summary
+from src.utils.timing_panel import display_timing
+from src.services.staging import discard_staged
+from src.database.pdf_handler import delete_spooled
 
 def render():
     # Custom CSS
@@ -22,6 +25,7 @@ def render():
 
     if st.session_state.summary_result:
         display_summary(st.session_state.summary_result)
+        display_timing(st.session_state.get('upload_timing'), "⏱ Processing time")
 
         # # Showing OCR details
         # with st.expander("OCR Details"):
@@ -50,12 +54,23 @@ def render():
     # Place "Back to Upload" button in the first column
     with col1:
         if st.button("Back to Upload"):
+            discard_staged(st.session_state.session_id, st.session_state.get('document_hash'))
+            delete_spooled(st.session_state.get('document_hash'))
             st.session_state.page = 'upload'
-            st.session_state.ocr_result = None
+            st.session_state.contract_file = None
+            st.session_state.document_hash = None
             st.session_state.summary_result = None
+            st.session_state.stored_contract_id = None
+            st.session_state.upload_timing = None
             st.rerun()
     
     
+    # Contracts opened from storage are already saved
+    if st.session_state.get('stored_contract_id'):
+        with col4:
+            st.caption("✅ Loaded from saved contracts")
+        return
+
     # Place "Save" button in the third column with custom styling
     with col4:
         save_button = st.button("💾 Save", key="save_button")
@@ -1,33 +1,83 @@
 import streamlit as st
-from src.services.ocr import OCR
-from src.services.chat import Solar
+from src.services.text_extraction import extract_document
+from src.services.registry import get_ocr, get_solar, get_vector_db
+from src.services.staging import start_staging, discard_staged
+from src.database.pdf_handler import spool_upload, save_ocr_result, delete_spooled
+from src.database.sqlite_db import get_summary, get_summary_by_hash, list_summaries, delete_contract_records
+from src.utils.tracing import trace
+
+def open_stored_summary(contract_id, summary):
+    st.session_state.stored_contract_id = contract_id
+    st.session_state.summary_result = summary
+    st.session_state.upload_timing = None
+    st.session_state.page = 'summary'
+    st.rerun()
 
 def render():
     # Set page title
     st.title("Contract Summarization with Upstage")
 
+    # Re-open a saved contract straight from the stored summary
+    saved = list_summaries()
+    if saved:
+        with st.expander("📂 Open a saved contract"):
+            choice = st.selectbox(
+                "Saved contracts",
+                saved,
+                format_func=lambda s: f"{s['title']} ({s['file_name']}, {s['created_at'][:10]})"
+            )
+            if st.button("Open summary"):
+                if get_vector_db().has_contract(choice['contract_id']):
+                    open_stored_summary(choice['contract_id'], get_summary(choice['contract_id']))
+                # Same as a re-upload of a contract whose vectors are gone: its records go too
+                delete_contract_records(choice['contract_id'])
+                st.warning(f"{choice['title']} is no longer in the vector store. Upload {choice['file_name']} again to index it.")
+
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
     if uploaded_file is not None:
         if st.button("✨ Process and Summarize Document"):
 
-            st.session_state.uploaded_file = uploaded_file
+            # Spool the upload to data/contracts once; session state keeps only the path and hash
+            contract_file = spool_upload(uploaded_file)
+            if st.session_state.get('document_hash') != contract_file['hash']:
+                discard_staged(st.session_state.session_id, st.session_state.get('document_hash'))
+                delete_spooled(st.session_state.get('document_hash'))
+            st.session_state.contract_file = contract_file
+            st.session_state.document_hash = contract_file['hash']
+
+            # The same document was saved before, so skip OCR and the LLM
+            stored = get_summary_by_hash(st.session_state.document_hash)
+            if stored is not None:
+                if get_vector_db().has_contract(stored['contract_id']):
+                    open_stored_summary(stored['contract_id'], stored['summary'])
+                # Its vectors are gone (e.g. the store was cleared), so process and save it again
+                delete_contract_records(stored['contract_id'])
+
+            st.session_state.stored_contract_id = None
 
-            with st.spinner("Processing..."):
-                ocr_service = OCR()
-                solar_service = Solar()
+            summary = None
+            with trace("ingest.upload", file_bytes=contract_file['size']) as upload_trace, st.spinner("Processing..."):
+                ocr_service = get_ocr()
+                solar_service = get_solar()
+
+                # Read the PDF's own text layer; only image-only pages go to the Upstage OCR API
+                with open(contract_file['path'], 'rb') as pdf:
+                    ocr_result = extract_document(pdf, ocr_service)
 
-                # Call Upstage OCR API
-                ocr_result = ocr_service.process_document(uploaded_file)
-                print("=== OCR Result ===")
-                print(ocr_result["text"])
-                print("==================")
-                
                 if "text" in ocr_result:
+                    # The OCR result is read back from disk when the contract is saved
+                    save_ocr_result(contract_file['hash'], ocr_result)
+
+                    # Chunk and embed in the background while the summary is written and reviewed
+                    start_staging(st.session_state.session_id, contract_file['hash'], ocr_result, get_vector_db())
+
                     # Call Solar LLM for summarization
                     summary = solar_service.summarize_text(ocr_result["text"])
-                    st.session_state.ocr_result = ocr_result
-                    st.session_state.summary_result = summary
-                    st.session_state.page = 'summary'
-                    st.rerun()
-                else:
-                    st.error("Failed to extract text from the document.")
\ No newline at end of file
+
+            if summary is not None:
+                st.session_state.summary_result = summary
+                st.session_state.upload_timing = upload_trace.timing_rows()
+                st.session_state.page = 'summary'
+                st.rerun()
+            else:
+                st.error("Failed to extract text from the document.")
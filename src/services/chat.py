@@ -1,33 +1,160 @@
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Optional
+from openai import OpenAI, APIStatusError, APIConnectionError
 import json
-import re
+import threading
+import time
+from collections import deque
+from src.utils import json_repair
+from src.utils.json_repair import JSONRepairError
+from src.utils.tracing import span
+from src.services.scheduler import get_scheduler, RetryableError, RETRYABLE_STATUS, parse_retry_after
+
+# JSON schemas for the structured LLM responses. Defaults fill fields the model left out.
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "duration": {"type": "object", "default": {"start_date": "None", "end_date": "None", "initial_term": "None"}},
+        "parties": {"type": "array", "default": []},
+        "overview": {"type": "string", "default": ""},
+        "key_conditions": {"type": "array", "default": []},
+        "important_dates": {"type": "array", "default": []},
+        "others": {"type": "array", "default": []}
+    },
+    "required": ["title"]
+}
+
+QUERY_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_contract_related": {"type": "boolean"},
+        "key_points": {"type": "array", "items": {"type": "string"}, "default": []},
+        "contract_types": {"type": "array", "items": {"type": "string"}, "default": []},
+        "keywords": {"type": "array", "items": {"type": "string"}, "default": []}
+    },
+    "required": ["is_contract_related"]
+}
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "answer": {"type": "string"},
+        "references": {"type": "array", "items": {"type": "object"}, "default": []},
+        "confidence": {"type": "number", "default": 0.0}
+    },
+    "required": ["answer"]
+}
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "evaluation_score": {"type": "number"},
+        "feedback": {"type": "string", "default": ""},
+        "suggestions_for_improvement": {"type": "array", "items": {"type": "string"}, "default": []}
+    },
+    "required": ["evaluation_score"]
+}
+
+FINDING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "finding": {"type": "string"},
+        "found": {"type": "boolean", "default": True}
+    },
+    "required": ["finding"]
+}
+
+CHUNKS_SCHEMA = {
+    "type": "array",
+    "items": {"type": "object", "properties": {"content": {"type": "string"}}, "required": ["content"]}
+}
+
+def _retryable(call):
+    """Run an OpenAI client call, turning throttling, 5xx and network errors into RetryableError."""
+    try:
+        return call()
+    except APIStatusError as e:
+        if e.status_code in RETRYABLE_STATUS:
+            raise RetryableError(f"HTTP {e.status_code}", parse_retry_after(e.response.headers.get("retry-after")),
+                                 status=e.status_code) from e
+        raise
+    except APIConnectionError as e:  # Includes timeouts
+        raise RetryableError(str(e)) from e
+
+# Asking the LLM to fix its own JSON costs a whole extra call, so it is only a
+# fallback after local repair fails, and capped per hour
+REMOTE_JSON_REPAIRS_PER_HOUR = int(os.getenv("REMOTE_JSON_REPAIRS_PER_HOUR", "20"))
 
 class Solar:
     def __init__(self):
         self.api_key = os.getenv("UPSTAGE_API_KEY")
         if not self.api_key:
             raise ValueError("UPSTAGE_API_KEY is not set in environment variables")
+        # Retries and rate limiting are done by the request scheduler, not the client
         self.client = OpenAI(
             api_key=self.api_key,
-            base_url="https://api.upstage.ai/v1/solar"
+            base_url=f"{os.getenv('UPSTAGE_API_BASE', 'https://api.upstage.ai')}/v1/solar",
+            timeout=float(os.getenv("UPSTAGE_TIMEOUT_S", "60")),
+            max_retries=0
         )
+        self.json_repair_stats = {"parsed": 0, "remote": 0, "skipped": 0, "failed": 0}
+        self.remote_repair_times = deque()
+        self.repair_lock = threading.Lock()
 
+    def _allow_remote_repair(self) -> bool:
+        with self.repair_lock:
+            now = time.monotonic()
+            while self.remote_repair_times and now - self.remote_repair_times[0] > 3600:
+                self.remote_repair_times.popleft()
+            if len(self.remote_repair_times) >= REMOTE_JSON_REPAIRS_PER_HOUR:
+                return False
+            self.remote_repair_times.append(now)
+            return True
 
-    def call_api(self, messages: List[Dict[str, str]], model: str = "solar-1-mini-chat") -> Dict[str, Any]:
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=messages
-        )
-        return response.dict()
+    def parse_json(self, content: Optional[str], schema: Dict[str, Any], remote_repair: bool = True) -> Optional[Any]:
+        """Parse structured LLM output, repairing it locally; the LLM repair call is a metered last resort."""
+        try:
+            result = json_repair.loads(content, schema)
+            self.json_repair_stats["parsed"] += 1
+            return result
+        except JSONRepairError as e:
+            error = e
+        print(f"Local JSON repair failed: {error}")
 
-    def talk_general(self, text: str) -> str:
+        if not remote_repair or content is None or not self._allow_remote_repair():
+            self.json_repair_stats["skipped"] += 1
+            return None
+
+        self.json_repair_stats["remote"] += 1
+        completed = self.Complete_JSON(content, str(error), schema)
+        try:
+            return json_repair.loads(completed["choices"][0]["message"]["content"], schema)
+        except (JSONRepairError, KeyError, IndexError) as e:
+            print(f"Remote JSON repair failed: {e}")
+            self.json_repair_stats["failed"] += 1
+            return None
+
+
+    def call_api(self, messages: List[Dict[str, str]], model: str = "solar-1-mini-chat", purpose: str = "chat") -> Dict[str, Any]:
+        with span(f"llm.{purpose}", model=model,
+                  request_chars=sum(len(m["content"]) for m in messages)) as current:
+            response = get_scheduler("chat").execute(lambda: _retryable(lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages
+            )))
+            result = response.dict()
+            usage = result.get("usage") or {}
+            current.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                        response_chars=sum(len(c["message"]["content"] or "") for c in result.get("choices", [])))
+            return result
+
+    def talk_general(self, text: str, history: str = "") -> str:
         messages = [
             {"role": "system", "content": "You are an AI assistant specialized in contract-related queries."},
-            {"role": "user", "content": text}
+            {"role": "user", "content": f"Conversation so far:\n{history}\n\nUser: {text}" if history else text}
         ]
-        result = self.call_api(messages)
+        result = self.call_api(messages, purpose="general")
         if "choices" in result and len(result["choices"]) > 0:
             return result["choices"][0]["message"]["content"]
         return ""
@@ -89,24 +216,38 @@ class Solar:
             """
             }
         ]
-        result = self.call_api(messages)
+        result = self.call_api(messages, purpose="summarize")
         if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
+            content = result["choices"][0]["message"]["content"]
+            # Return clean JSON text; if it can't be recovered, the raw content is shown as an error
+            summary = self.parse_json(content, SUMMARY_SCHEMA)
+            return json.dumps(summary, ensure_ascii=False) if summary is not None else content
         return ""
     
     def embed_query(self, text: str) -> List[float]:
-        response = self.client.embeddings.create(
-            model="solar-embedding-1-large-passage",
-            input=text
-        )
-        return response.data[0].embedding
+        with span("embed.query", chars=len(text)):
+            response = get_scheduler("embeddings").execute(lambda: _retryable(lambda: self.client.embeddings.create(
+                model="solar-embedding-1-large-passage",
+                input=text
+            )))
+            return response.data[0].embedding
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries with one request; used by the shared query batcher."""
+        with span("embed.query", chars=sum(len(t) for t in texts), batch=len(texts)):
+            response = get_scheduler("embeddings").execute(lambda: _retryable(lambda: self.client.embeddings.create(
+                model="solar-embedding-1-large-passage",
+                input=texts
+            )))
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
     def embed_document(self, text: str) -> List[float]:
-        response = self.client.embeddings.create(
-            model="solar-embedding-1-large-passage",
-            input=text
-        )
-        return response.data[0].embedding
+        with span("embed.document", chars=len(text)):
+            response = get_scheduler("embeddings").execute(lambda: _retryable(lambda: self.client.embeddings.create(
+                model="solar-embedding-1-large-passage",
+                input=text
+            )))
+            return response.data[0].embedding
 
     def chunk_text(self, text: str) -> List[Dict[str, str]]:
         messages = [
@@ -138,13 +279,12 @@ class Solar:
             3. The chunk is roughly equal in length and do not more than 30 words.
             """}
         ]
-        result = self.call_api(messages)
+        result = self.call_api(messages, purpose="chunk")
         if "choices" in result and result["choices"]:
-            try:
-                chunks = json.loads(result["choices"][0]["message"]["content"])
+            chunks = self.parse_json(result["choices"][0]["message"]["content"], CHUNKS_SCHEMA, remote_repair=False)
+            if chunks is not None:
                 return chunks
-            except json.JSONDecodeError:
-                print("Error: Invalid JSON format in API response")
+            print("Error: Invalid JSON format in API response")
         return [{"content": text, "title": "Full Document"}]
         
     def analyze_user_query(self, query: str) -> Dict[str, Any]:
@@ -180,44 +320,41 @@ class Solar:
              """
             }
         ]
-        result = self.call_api(messages)
+        result = self.call_api(messages, purpose="analyze_query")
         if "choices" in result and len(result["choices"]) > 0:
-            return json.loads(result["choices"][0]["message"]["content"])
+            analysis = self.parse_json(result["choices"][0]["message"]["content"], QUERY_ANALYSIS_SCHEMA)
+            if analysis is not None:
+                return analysis
         return {"is_contract_related": False}
 
     def augment_context(self, query: str, search_results: List[Dict[str, Any]]) -> str:
         relevant_info = "\n".join([f"Document {i+1}: {result['document']}" for i, result in enumerate(search_results)])
         return f"Query: {query}\n\nRelevant Information:\n{relevant_info}"
     
-    def Complete_JSON(self, text: str, err_txt: str) -> Dict[str, Any]:
+    def Complete_JSON(self, text: str, err_txt: str, schema: Dict[str, Any] = RESPONSE_SCHEMA) -> Dict[str, Any]:
         messages = [
             {"role": "system", "content": "You are an AI assistant specialized in completing JSON objects."},
             {"role": "user", "content": f"""
                 Message to complete: {text}
                 Error message: {err_txt}
 
-                Complete the JSON object to ensure it is valid and contains all necessary fields.
-                Respond in the following JSON format:
-                {{
-                    "answer": "Your detailed answer here",
-                    "references": [
-                        {{"file_name": "metadata['file_name']", "page": "metadata['page_number']", "relevance": "Explanation of relevance"}}
-                    ],
-                    "confidence": 0.0 
-                }}
+                Complete the JSON so it is valid and matches this JSON schema:
+                {json.dumps(schema, indent=2)}
                 
                 Rules:
-                1. Your entire response must be a valid JSON object.
+                1. Your entire response must be a valid JSON value.
                 2. Ensure all JSON syntax is correct, including quotes around strings and proper use of commas.
-                3. Do not include any text outside of the JSON object in your response.
+                3. Do not include any text outside of the JSON in your response.
             """
             }
         ]
-        result = self.call_api(messages)
+        result = self.call_api(messages, purpose="repair_json")
         return result
 
-    def generate_response(self, query: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def generate_response(self, query: str, search_results: List[Dict[str, Any]], history: str = "") -> Dict[str, Any]:
         context = "\n".join([f"Document {i+1}: {result['document']}" for i, result in enumerate(search_results)])
+        # Earlier turns, so follow-up questions ("and its renewal?") can be answered
+        conversation = f"Conversation so far:\n{history}\n\n" if history else ""
         
         messages = [
             {"role": "system", "content": "You are an AI assistant specialized in answering questions about contracts based on search results. Always respond in a valid JSON format."},
@@ -225,7 +362,7 @@ class Solar:
             f"""Based on the user query and search results, provide a detailed answer.
                 Include references to the source documents.
 
-                Context: {context}
+                {conversation}Context: {context}
                 User query: {query}
 
                 Search results:
@@ -251,59 +388,109 @@ class Solar:
             }
         ]
         
+        error_response = {
+            "answer": "I'm sorry, but an error occurred while generating the response. Please try again later.",
+            "references": [],
+            "confidence": 0.0
+        }
         try:
-            result = self.call_api(messages)
+            result = self.call_api(messages, purpose="response")
             if "choices" in result and len(result["choices"]) > 0:
-                content = result["choices"][0]["message"]["content"]
-                print("response content:", content)
-                # Try to parse the content as JSON
-                try:
-                    return json.loads(content)
-                except json.JSONDecodeError as json_error:
-                    print(f"JSON Decode Error: {json_error}")
-                    print("Raw result received:")
-                    print(result)
-
-                    # If JSON parsing fails, try to complete the JSON object
-                    print("Attempting to complete JSON object...")
-                    completed_result = self.Complete_JSON(str(result), str(json_error))
-                    completed_content = result["choices"][0]["message"]["content"]
-                    try:
-                        return json.loads(completed_content)
-                    except json.JSONDecodeError as json_error:
-                        print(f"JSON Decode Error: {json_error}")
-                        print("Raw content received:")
-                        print(completed_result)
-                        return {
-                            "answer": "I'm sorry, but an error occurred while generating the response. Please try again later.",
-                            "references": [],
-                            "confidence": 0.0
-                        }
-            
-            # If we couldn't parse JSON or extract valid JSON, return a default response
-            else:
-                completed_result = self.Complete_JSON(str(result), "No choices in the response")
-                completed_content = result["choices"][0]["message"]["content"]
-                try:
-                    return json.loads(completed_content)
-                except json.JSONDecodeError as json_error:
-                    print(f"JSON Decode Error: {json_error}")
-                    print("Raw content received:")
-                    print(completed_result)
-                    return {
-                        "answer": "I'm sorry, but an error occurred while generating the response. Please try again later.",
-                        "references": [],
-                        "confidence": 0.0
-                    }
-                
+                response = self.parse_json(result["choices"][0]["message"]["content"], RESPONSE_SCHEMA)
+                if response is not None:
+                    return response
+            return error_response
+
         except Exception as e:
             print(f"Error in generate_response: {str(e)}")
-            return {
-                "answer": "I'm sorry, but an error occurred while generating the response. Please try again later.",
-                "references": [],
-                "confidence": 0.0
-            }
+            return error_response
     
+    def summarize_conversation(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """Fold the messages into the running summary of a chat; only the new messages are sent."""
+        transcript = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in messages)
+        messages = [
+            {"role": "system", "content": "You are an AI assistant that keeps a running summary of a conversation about contracts."},
+            {"role": "user", "content":
+            f"""Update the summary of the conversation with the new messages. Keep the contracts, parties,
+                clauses and figures that were discussed and the conclusions reached; drop small talk.
+                Answer with the updated summary only, in at most 150 words.
+
+                Current summary: {summary or "(none)"}
+
+                New messages:
+                {transcript}
+            """
+            }
+        ]
+        result = self.call_api(messages, purpose="memory")
+        if "choices" in result and len(result["choices"]) > 0:
+            return (result["choices"][0]["message"]["content"] or summary).strip()
+        return summary
+
+    def extract_finding(self, query: str, contract_title: str, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """What one contract says about the query; the map step of a comparison."""
+        context = "\n".join([f"Document {i+1} (page {result['metadata'].get('page_number')}): {result['document']}"
+                             for i, result in enumerate(search_results)])
+        messages = [
+            {"role": "system", "content": "You are an AI assistant that extracts facts from one contract. Always respond in a valid JSON format."},
+            {"role": "user", "content":
+            f"""The user is comparing several contracts. From the excerpts of the contract "{contract_title}" below,
+                extract only what this contract says about the user's question, in one to three sentences.
+                Quote amounts, periods and dates exactly.
+
+                User query: {query}
+
+                Excerpts:
+                {context}
+
+                Respond in the following JSON format:
+                {{
+                    "finding": "What this contract says",
+                    "found": true
+                }}
+                Set "found" to false if the excerpts do not address the question.
+                Do not include any text outside of the JSON object in your response.
+            """
+            }
+        ]
+        result = self.call_api(messages, purpose="extract")
+        if "choices" in result and len(result["choices"]) > 0:
+            finding = self.parse_json(result["choices"][0]["message"]["content"], FINDING_SCHEMA, remote_repair=False)
+            if finding is not None:
+                return finding
+        return {"finding": "The answer could not be extracted from this contract.", "found": False}
+
+    def synthesize_comparison(self, query: str, findings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One answer from the per-contract findings; the reduce step of a comparison."""
+        context = "\n".join([f"- {f['contract_title']} ({f['file_name']}): {f['finding']}" for f in findings])
+        messages = [
+            {"role": "system", "content": "You are an AI assistant specialized in comparing contracts. Always respond in a valid JSON format."},
+            {"role": "user", "content":
+            f"""Answer the user's comparison question from the findings extracted from each contract.
+                Name the contracts, point out where they differ and where they agree, and say which contracts
+                do not address the question.
+
+                User query: {query}
+
+                Findings:
+                {context}
+
+                Respond in the following JSON format:
+                {{
+                    "answer": "Your comparison here",
+                    "confidence": 0.0
+                }}
+                Do not include any text outside of the JSON object in your response.
+            """
+            }
+        ]
+        result = self.call_api(messages, purpose="synthesize")
+        if "choices" in result and len(result["choices"]) > 0:
+            response = self.parse_json(result["choices"][0]["message"]["content"], RESPONSE_SCHEMA)
+            if response is not None:
+                return response
+        return {"answer": "", "references": [], "confidence": 0.0}
+
     def self_evaluate(self, query: str, response: Dict[str, Any], search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         context = "\n".join([f"Document {i+1}: {result['document']}" for i, result in enumerate(search_results)])
         
@@ -330,24 +517,12 @@ class Solar:
              """
             }
         ]
-        result = self.call_api(messages)
+        result = self.call_api(messages, purpose="evaluate")
         if "choices" in result and len(result["choices"]) > 0:
-            content = result["choices"][0]["message"]["content"]
-            
-            # Try to extract JSON from the content
-            try:
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    return json.loads(json_str)
-                else:
-                    raise ValueError("No JSON object found in the response")
-            except json.JSONDecodeError as e:
-                print(f"JSON Decode Error: {e}")
-                print(f"Problematic content: {content}")
-            except ValueError as e:
-                print(f"Value Error: {e}")
-                print(f"Problematic content: {content}")
+            # An evaluation is not worth an extra LLM call, so only local repair is used
+            evaluation = self.parse_json(result["choices"][0]["message"]["content"], EVALUATION_SCHEMA, remote_repair=False)
+            if evaluation is not None:
+                return evaluation
             
             # If JSON parsing fails, return a default structure
             return {
@@ -0,0 +1,223 @@
+import json
+import re
+import threading
+from typing import List, Dict, Any, Optional
+from src.database.sqlite_db import replace_clauses, get_clauses, list_clause_contracts
+from src.services.deadlines import NOTICE, NUMBER, UNIT, NUMBER_WORDS
+from src.services.entities import find_entities, contract_ids_for
+
+# Clause extraction. Every chunk saved to the vector store is split into sentences and
+# matched against a fixed clause taxonomy; the matching sentences of each clause type,
+# plus a few facts pulled out of them (notice period, jurisdiction, liability cap, ...),
+# are stored per contract in SQLite. A chat question that asks for one clause of a named
+# contract is then answered from the stored record, without search or the LLM.
+
+CLAUSE_TYPES = ("termination", "renewal", "payment_terms", "governing_law", "liability_cap", "notice_period")
+CLAUSE_LABELS = {
+    "termination": "Termination",
+    "renewal": "Renewal",
+    "payment_terms": "Payment terms",
+    "governing_law": "Governing law",
+    "liability_cap": "Liability cap",
+    "notice_period": "Notice period",
+}
+# A heading at the start of a chunk, and the sentence-level evidence for each type
+CLAUSE_PATTERNS = {
+    "termination": (r"terminat", r"\bterminat\w*|for convenience|material breach|early exit"),
+    "renewal": (r"renewal|term and renewal", r"(?<!non-)(?<!non )\brenew\w*|successive (?:\w+[\s-]+){0,3}(?:terms?|periods?)|automatically extend"),
+    "payment_terms": (r"payment|fees|invoic|compensation",
+                      r"\bpayments?\b|\bpayable\b|\binvoice[sd]?\b|\bfees?\b|\bnet \d+\b|late (?:payment|charge|fee)"),
+    "governing_law": (r"governing law|jurisdiction|applicable law",
+                      r"governed by|governing law|laws of|jurisdiction of|exclusive jurisdiction|\bvenue\b"),
+    "liability_cap": (r"limitation of liability|liabilit",
+                      r"limitation of liability|(?:aggregate|total|maximum) liability|liability[^.;]{0,80}(?:exceed|limited to|capped)"
+                      r"|consequential damages"),
+    "notice_period": (r"notice", NOTICE.pattern),
+}
+COMPILED = {clause_type: (re.compile(heading, re.I), re.compile(evidence, re.I))
+            for clause_type, (heading, evidence) in CLAUSE_PATTERNS.items()}
+SENTENCE = re.compile(r"(?<=[.!?;])\s+")
+MAX_SENTENCES = 3
+MIN_WORDS = 4
+MAX_TEXT = 800
+
+JURISDICTION = re.compile(r"laws\s+of\s+(?:the\s+)?((?:State|Commonwealth|Province|Republic|Kingdom)\s+of\s+)?"
+                          r"([A-Z][\w.]*(?:\s+[A-Z][\w.]*)*)")
+CAP = re.compile(r"(?:shall\s+not\s+exceed|not\s+to\s+exceed|limited\s+to|capped\s+at|in\s+excess\s+of)\s+([^.;]{3,120})", re.I)
+PAYMENT_DAYS = re.compile(r"(?:within|net)\s+(\d+)(?:\s+days)?", re.I)
+LATE_INTEREST = re.compile(r"(\d+(?:\.\d+)?\s*%)\s*(?:per\s+(?:month|annum|year)|monthly|annually)?", re.I)
+RENEWAL_TERM = re.compile(r"successive\s+(?:(?:additional|renewal|further)\s+)?" + NUMBER + r"[\s-]*" + UNIT, re.I)
+
+# Question side: which clause a question asks about, most specific first
+QUESTION_TYPES = (
+    ("governing_law", r"governing law|\bgovern(?:s|ed)?\b|jurisdiction|which (?:law|state|country|courts?)|\bvenue\b"),
+    ("liability_cap", r"liabilit|\bcap(?:ped)?\b|consequential damages"),
+    ("notice_period", r"\bnotice\b"),
+    ("renewal", r"\brenew\w*|\bextension\b|\bextend\b"),
+    ("termination", r"terminat|\bcancel\w*|get out of|\bexit\b"),
+    ("payment_terms", r"payment|\bpay\b|\bpaid\b|invoice|\bfees?\b|late charge"),
+)
+LOOKUP = r"^\s*(what|what's|whats|which|when|where|how (?:long|much|many)|is there|are there|does|do|show|tell me|quote|give me|find)\b"
+ANALYTICAL = (r"\b(compare|comparison|differ\w*|versus|vs\.?|summari[sz]e|explain|why|should|reasonable|fair|risks?|"
+              r"negotiat\w*|recommend\w*|better|worse|all contracts|every contract|across)\b")
+MAX_CONTRACTS = 3
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def _number(text: str) -> Optional[int]:
+    text = text.lower()
+    return int(text) if text.isdigit() else NUMBER_WORDS.get(text)
+
+
+def _period(n: str, unit: str) -> str:
+    count = _number(n)
+    unit = unit.lower().rstrip("'")
+    return f"{count if count is not None else n} {unit}{'s' if count != 1 else ''}"
+
+
+def extract_facts(clause_type: str, text: str) -> Dict[str, str]:
+    facts = {}
+    notice = NOTICE.search(text)
+    if notice and clause_type in ("termination", "renewal", "notice_period"):
+        n, unit = (notice.group(1), notice.group(2)) if notice.group(1) else (notice.group(3), notice.group(4))
+        facts["notice"] = _period(n, unit)
+    if clause_type == "governing_law":
+        match = JURISDICTION.search(text)
+        if match:
+            facts["jurisdiction"] = ((match.group(1) or "") + match.group(2)).strip()
+    elif clause_type == "liability_cap":
+        match = CAP.search(text)
+        if match:
+            facts["cap"] = match.group(1).strip()
+    elif clause_type == "payment_terms":
+        match = PAYMENT_DAYS.search(text)
+        if match:
+            facts["payment_due"] = f"{match.group(1)} days"
+        match = LATE_INTEREST.search(text)
+        if match:
+            facts["late_interest"] = match.group(0).strip()
+    elif clause_type == "renewal":
+        match = RENEWAL_TERM.search(text)
+        if match:
+            facts["renewal_term"] = _period(match.group(1), match.group(2))
+    return facts
+
+
+def classify_chunk(text: str) -> List[Dict[str, Any]]:
+    """Clause records found in one chunk: type, matching sentences, facts and a score."""
+    # Bare headings ("Payment Terms.") are not worth quoting; they only count through the heading bonus
+    sentences = [s.strip() for s in SENTENCE.split(text) if len(s.split()) >= MIN_WORDS]
+    head = text[:80]
+    records = []
+    for clause_type, (heading, evidence) in COMPILED.items():
+        matched = [s for s in sentences if evidence.search(s)]
+        if not matched:
+            continue
+        # A heading naming the clause outweighs passing mentions elsewhere
+        score = len(matched) + (2.0 if heading.search(head) else 0.0)
+        records.append({"clause_type": clause_type, "text": " ".join(matched[:MAX_SENTENCES])[:MAX_TEXT],
+                        "score": score, "facts": extract_facts(clause_type, " ".join(matched))})
+    return records
+
+
+def index_contract_clauses(contract_id: str, contract_title: str, parties: str, file_name: str,
+                           chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Classify a contract's chunks ({"id", "text", "page_number"}) and store the clause records."""
+    global _directory
+    clauses = []
+    for chunk in chunks:
+        for record in classify_chunk(chunk["text"]):
+            clauses.append({
+                "contract_id": contract_id,
+                "contract_title": contract_title,
+                "parties": parties,
+                "file_name": file_name,
+                "clause_type": record["clause_type"],
+                "page_number": chunk["page_number"],
+                "chunk_id": chunk["id"],
+                "text": record["text"],
+                "facts": json.dumps(record["facts"]),
+                "score": record["score"],
+            })
+    replace_clauses(contract_id, clauses)
+    with _directory_lock:
+        _directory = None
+    return clauses
+
+
+def _contract_directory() -> List[Dict[str, Any]]:
+    # Titles of the contracts with clause records, re-read after each ingest; parties are
+    # matched through the entity index, which is written in the same save
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = [{**contract, "names": [contract["contract_title"]] if len(contract["contract_title"] or "") > 2 else []}
+                          for contract in list_clause_contracts()]
+        return _directory
+
+
+def mentioned_clause_type(text: str) -> Optional[str]:
+    folded = text.lower()
+    for clause_type, pattern in QUESTION_TYPES:
+        if re.search(pattern, folded):
+            return clause_type
+    return None
+
+
+def question_clause_type(text: str) -> Optional[str]:
+    folded = text.lower()
+    if not re.search(LOOKUP, folded) or re.search(ANALYTICAL, folded):
+        return None
+    return mentioned_clause_type(folded)
+
+
+def match_contracts(text: str, analysis: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Contracts named in the question (by title or party), or the only contract if there is just one."""
+    directory = _contract_directory()
+    analysis = analysis or {}
+    names = {name.casefold() for name in analysis.get("key_points", []) + analysis.get("contract_types", [])}
+    folded = text.casefold()
+    party_contracts = set(contract_ids_for(find_entities(text)))
+    matched = [contract for contract in directory
+               if contract["contract_id"] in party_contracts
+               or any(re.search(r"\b" + re.escape(name.casefold()) + r"\b", folded) or name.casefold() in names
+                      for name in contract["names"])]
+    if not matched and len(directory) == 1:
+        matched = directory
+    return matched
+
+
+def answer_clause_question(text: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """A chat response quoting the stored clause, or None if the question is not a direct clause lookup."""
+    clause_type = question_clause_type(text)
+    if clause_type is None:
+        return None
+    contracts = match_contracts(text, analysis)
+    if not contracts or len(contracts) > MAX_CONTRACTS:
+        return None
+    records = get_clauses([contract["contract_id"] for contract in contracts], clause_type)
+    if not records:
+        return None
+
+    label = CLAUSE_LABELS[clause_type]
+    sections = []
+    for contract in contracts:
+        found = [r for r in records if r["contract_id"] == contract["contract_id"]]
+        title = contract["contract_title"] or contract["contract_id"]
+        if not found:
+            sections.append(f"**{label}** · {title}: no {label.lower()} clause was found in this contract.")
+            continue
+        facts = json.loads(found[0]["facts"])
+        lines = [f"**{label}** · {title} ({found[0]['file_name']}, page {found[0]['page_number']})"]
+        lines += [f"- {key.replace('_', ' ').capitalize()}: {value}" for key, value in facts.items()]
+        lines += [f"> {record['text']}" for record in found]
+        sections.append("\n\n".join(lines))
+    return {
+        "answer": "\n\n".join(sections),
+        "references": [{"file_name": r["file_name"], "page": r["page_number"], "relevance": f"{label} clause"}
+                       for r in records],
+        "confidence": 1.0,
+        "clauses": records
+    }
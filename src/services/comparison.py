@@ -0,0 +1,148 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Iterator
+from src.database.sqlite_db import get_clauses
+from src.services.clauses import CLAUSE_LABELS, mentioned_clause_type
+from src.services.entities import find_entities, contract_ids_for
+from src.utils.tracing import span, propagate
+
+# Comparison mode. "Compare the payment terms across our supply agreements" needs every
+# target contract in the answer, which one hybrid_search over the whole store cannot give.
+# The target contracts are selected first (named parties or titles, a contract type, or
+# all of them), then each one gets its own retrieval and extraction on a bounded pool
+# (map), and one LLM call writes the comparison from the findings (reduce). Findings are
+# yielded as they complete so the chat can show them while the rest are still running.
+# A clause type with stored clause records is read from SQLite instead of searched.
+
+MAX_CONTRACTS = int(os.getenv("COMPARISON_MAX_CONTRACTS", "8"))
+WORKERS = int(os.getenv("COMPARISON_WORKERS", "4"))
+CHUNKS_PER_CONTRACT = 3
+
+CONTRACT_NOUNS = r"contracts|agreements|leases|licen[cs]es|ndas|msas|sows|policies|deals"
+COMPARISON = (r"\b(compare|comparison|compared|contrast|differ\w*|versus|vs\.?|side by side|across)\b"
+              r"|\b(?:each|every) (?:contract|agreement|lease)\b"
+              r"|\ball (?:of )?(?:our |the |my |these )?(?:[\w-]+ ){0,3}(?:" + CONTRACT_NOUNS + r")\b")
+# "all our supply agreements", "across the office leases": the words naming the contract type
+CONTRACT_TYPE = re.compile(r"\b(?:all|each|every|across)\s+(?:of\s+)?(?:our\s+|the\s+|my\s+|these\s+)?"
+                           r"((?:[\w-]+\s+){0,3}?)(" + CONTRACT_NOUNS + r"|contract|agreement|lease)\b", re.I)
+GENERIC_TYPE_WORDS = {"contract", "contracts", "agreement", "agreements", "deal", "deals", "our", "the", "my", "these",
+                      "of", "all", "each", "every", "signed", "current", "active", "existing", "other"}
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="compare")
+
+
+def is_comparison_question(text: str) -> bool:
+    return re.search(COMPARISON, text, re.I) is not None
+
+
+def _stem(word: str) -> str:
+    word = word.lower()
+    return word[:-1] if word.endswith("s") and not word.endswith("ss") and len(word) > 3 else word
+
+
+def _type_words(text: str, party_words: set) -> List[str]:
+    match = CONTRACT_TYPE.search(text)
+    if not match:
+        return []
+    # In "all our Acme supply agreements" the party is already a filter of its own
+    words = match.group(1).split() + [match.group(2)]
+    return [_stem(word) for word in words if word.lower() not in GENERIC_TYPE_WORDS and word.lower() not in party_words]
+
+
+def _title_matches(title: str, type_words: List[str]) -> bool:
+    title_words = [_stem(word) for word in re.findall(r"[\w-]+", title or "")]
+    return all(any(word.startswith(type_word) for word in title_words) for type_word in type_words)
+
+
+def select_comparison_contracts(text: str, vector_db) -> Dict[str, Any]:
+    """{"contracts", "matched"}: the contracts a comparison question is about, at most MAX_CONTRACTS."""
+    contracts = vector_db.list_contracts()
+    folded = text.casefold()
+    parties = find_entities(text)
+    party_contracts = set(contract_ids_for(parties))
+    named = [c for c in contracts if c["contract_id"] in party_contracts
+             or (len(c["contract_title"] or "") > 2 and re.search(r"\b" + re.escape(c["contract_title"].casefold()) + r"\b", folded))]
+    type_words = _type_words(text, {word for party in parties for word in party["alias"].split()})
+    if type_words:
+        selected = [c for c in named or contracts if _title_matches(c["contract_title"], type_words)]
+    elif named:
+        selected = named
+    else:
+        selected = contracts
+    matched = len(selected)
+    if matched > MAX_CONTRACTS:
+        # Too many to compare: keep the ones whose summary is closest to the question
+        ranking = vector_db.select_contracts(vector_db.embed_query(text), len(contracts))
+        rank = {contract_id: position for position, contract_id in enumerate(ranking)}
+        selected = sorted(selected, key=lambda c: rank.get(c["contract_id"], len(rank)))[:MAX_CONTRACTS]
+    return {"contracts": selected if len(selected) >= 2 else [], "matched": matched}
+
+
+def _clause_finding(contract: Dict[str, str], clause_type: str) -> Optional[Dict[str, Any]]:
+    records = get_clauses([contract["contract_id"]], clause_type, limit=1)
+    if not records:
+        return None
+    record = records[0]
+    facts = json.loads(record["facts"])
+    summary = "; ".join(f"{key.replace('_', ' ')}: {value}" for key, value in facts.items())
+    return {
+        "finding": (summary + ". " if summary else "") + f'"{record["text"]}"',
+        "found": True,
+        "source": "clause record",
+        "references": [{"file_name": record["file_name"], "page": record["page_number"],
+                        "relevance": f"{CLAUSE_LABELS[clause_type]} clause"}],
+    }
+
+
+def contract_finding(query: str, analysis: Dict[str, Any], contract: Dict[str, str], solar, vector_db) -> Dict[str, Any]:
+    """What one contract says about the query, from its clause record or its own retrieval."""
+    title = contract["contract_title"] or contract["contract_id"]
+    with span("compare.contract", contract_id=contract["contract_id"]) as current:
+        try:
+            clause_type = mentioned_clause_type(query)
+            finding = _clause_finding(contract, clause_type) if clause_type else None
+            if finding is None:
+                results = vector_db.hybrid_search(analysis, n_results=CHUNKS_PER_CONTRACT, contract_ids=[contract["contract_id"]])
+                extracted = solar.extract_finding(query, title, results)
+                finding = {
+                    "finding": extracted["finding"],
+                    "found": extracted.get("found", True),
+                    "source": "search",
+                    "references": [{"file_name": r["metadata"].get("file_name", contract["file_name"]),
+                                    "page": r["metadata"].get("page_number"), "relevance": f"Excerpt from {title}"}
+                                   for r in results],
+                }
+        except Exception as e:
+            print(f"Error comparing {title}: {str(e)}")
+            finding = {"finding": "This contract could not be read.", "found": False, "source": "error", "references": []}
+        current.set(source=finding["source"])
+    return {**contract, "contract_title": title, **finding}
+
+
+def iter_findings(query: str, analysis: Dict[str, Any], contracts: List[Dict[str, str]], solar, vector_db) -> Iterator[Dict[str, Any]]:
+    """Per-contract findings, in the order they complete."""
+    futures = [_pool.submit(propagate(contract_finding), query, analysis, contract, solar, vector_db) for contract in contracts]
+    for future in as_completed(futures):
+        yield future.result()
+
+
+def synthesize(query: str, findings: List[Dict[str, Any]], solar, matched: Optional[int] = None) -> Dict[str, Any]:
+    """The chat response comparing the findings; falls back to listing them."""
+    # Completion order is arbitrary; the synthesis and the fallback read better in a stable order
+    findings = sorted(findings, key=lambda f: f["contract_title"].casefold())
+    try:
+        response = solar.synthesize_comparison(query, findings)
+    except Exception as e:
+        print(f"Error in synthesize: {str(e)}")
+        response = {"answer": "", "confidence": 0.0}
+    answer = response.get("answer") or "\n".join(f"- **{f['contract_title']}**: {f['finding']}" for f in findings)
+    if matched and matched > len(findings):
+        answer += f"\n\nCompared the {len(findings)} most relevant of {matched} matching contracts."
+    return {
+        "answer": answer,
+        "references": [reference for f in findings for reference in f["references"]],
+        "confidence": response.get("confidence", 0.0),
+        "findings": findings
+    }
@@ -0,0 +1,385 @@
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta
+from src.database.sqlite_db import (replace_deadline_rules, get_rules_materialized_before,
+                                    save_deadline_occurrences, query_deadlines)
+from src.services.entities import find_entities, contract_ids_for
+
+# Deadline engine. Each summary is turned into rules: a first date plus an optional
+# recurrence ("every 1 years") and end. Relative terms ("30 days after the Effective
+# Date") are resolved against duration.start_date / end_date, recurring ones
+# ("annually") repeat from the start date. Occurrences are written to the indexed
+# deadlines table only up to a horizon and extended when a query looks further
+# ahead, so an evergreen contract never produces unbounded rows.
+
+HORIZON = timedelta(days=730)
+FULLY_MATERIALIZED = "9999-12-31"
+KINDS = ("renewal", "notice", "expiration", "payment", "review", "start", "key date")
+KIND_KEYWORDS = (
+    ("notice", ("notice",)),
+    ("renewal", ("renew",)),
+    ("expiration", ("expir", "end date", "terminat", "ends")),
+    ("payment", ("payment", "pay ", "invoice", "fee", "due")),
+    ("review", ("review", "audit", "report", "inspection")),
+)
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+                "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30, "forty-five": 45,
+                "forty": 40, "sixty": 60, "ninety": 90, "hundred twenty": 120, "one hundred twenty": 120}
+NUMBER = r"(\d+|" + "|".join(sorted(map(re.escape, NUMBER_WORDS), key=len, reverse=True)) + r")(?:\s*\(\d+\))?"
+UNIT = r"(business\s+day|day|week|month|year)s?'?"
+RELATIVE = re.compile(NUMBER + r"[\s-]*" + UNIT + r"\s+(?:\w+\s+){0,2}?(after|following|from|of|before|prior\s+to|preceding)\s+(?:the\s+)?(.*)", re.I)
+EVERY_N = re.compile(r"every\s+" + NUMBER + r"\s+" + UNIT, re.I)
+DAY_OF_MONTH = re.compile(r"(\d{1,2})(?:st|nd|rd|th)?\s+(?:day\s+)?of\s+(?:each|every|the)\s+(?:calendar\s+)?month", re.I)
+RECURRENCES = (
+    (re.compile(r"semi-?annual|twice a year|every six months", re.I), (6, "months")),
+    (re.compile(r"quarterly|each quarter|every quarter|per quarter", re.I), (3, "months")),
+    (re.compile(r"annual|yearly|each year|every year|per year|anniversary", re.I), (1, "years")),
+    (re.compile(r"monthly|each month|every month|per month", re.I), (1, "months")),
+    (re.compile(r"weekly|each week|every week", re.I), (1, "weeks")),
+)
+START_ANCHORS = ("effective", "start", "commencement", "execution", "signing", "agreement date", "this agreement", "contract date")
+END_ANCHORS = ("expir", "end", "terminat", "term")
+NOTICE = re.compile(NUMBER + r"[\s-]*" + UNIT + r"\s*(?:prior\s+|advance\s+)?(?:written\s+)?notice"
+                    r"|notice\s+(?:\w+\s+){0,4}?(?:at\s+least|no\s+less\s+than|not\s+less\s+than|of)\s+" + NUMBER + r"\s+" + UNIT, re.I)
+TERM_LENGTH = re.compile(NUMBER + r"[\s-]*" + UNIT, re.I)
+
+_extend_lock = threading.Lock()
+
+
+def _number(text: str) -> int:
+    return int(text) if text.isdigit() else NUMBER_WORDS[text.lower()]
+
+
+def _delta(n: int, unit: str) -> relativedelta:
+    unit = unit.lower().replace("business ", "")
+    if unit.startswith("day"):
+        return relativedelta(days=n)
+    if unit.startswith("week"):
+        return relativedelta(weeks=n)
+    if unit.startswith("month"):
+        return relativedelta(months=n)
+    return relativedelta(years=n)
+
+
+def parse_date(text: Any) -> Optional[date]:
+    """A calendar date written in the text, or None. Only dates with a year count."""
+    if not isinstance(text, str):
+        return None
+    match = re.search(r"\d{4}-\d{2}-\d{2}", text)
+    if match:
+        try:
+            return date.fromisoformat(match.group(0))
+        except ValueError:
+            return None
+    if not re.search(r"\b(19|20)\d{2}\b", text):
+        return None
+    try:
+        return date_parser.parse(text, fuzzy=True, default=datetime(2000, 1, 1)).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+def classify(text: str) -> str:
+    folded = text.lower()
+    for kind, keywords in KIND_KEYWORDS:
+        if any(keyword in folded for keyword in keywords):
+            return kind
+    return "key date"
+
+
+def _recurrence(text: str) -> Optional[Tuple[int, str]]:
+    match = EVERY_N.search(text)
+    if match:
+        return _number(match.group(1)), match.group(2).lower().replace("business ", "") + "s"
+    if DAY_OF_MONTH.search(text):
+        return 1, "months"
+    for pattern, every in RECURRENCES:
+        if pattern.search(text):
+            return every
+    return None
+
+
+def _rule(title: str, kind: str, first: Optional[date], source: str, every: Optional[Tuple[int, str]] = None,
+          until: Optional[date] = None) -> Dict[str, Any]:
+    return {
+        "title": title,
+        "kind": kind,
+        "first_date": first.isoformat() if first else None,
+        "every_n": every[0] if every else None,
+        "every_unit": every[1] if every else None,
+        "until": until.isoformat() if until else None,
+        "source": source,
+    }
+
+
+def resolve_date_term(term: str, start: Optional[date], end: Optional[date]) -> Optional[Tuple[date, Optional[Tuple[int, str]]]]:
+    """Resolve one date term to (first date, recurrence), or None if it cannot be placed."""
+    absolute = parse_date(term)
+    if absolute:
+        return absolute, _recurrence(term)
+
+    relative = RELATIVE.search(term)
+    if relative:
+        n, unit, direction, anchor_text = relative.groups()
+        anchor_text = anchor_text.lower()
+        anchor = parse_date(anchor_text)
+        if anchor is None:
+            if any(word in anchor_text for word in START_ANCHORS):
+                anchor = start
+            elif any(word in anchor_text for word in END_ANCHORS):
+                anchor = end
+        if anchor is not None:
+            offset = _delta(_number(n), unit)
+            before = direction.lower() in ("before", "preceding") or direction.lower().startswith("prior")
+            return (anchor - offset if before else anchor + offset), None
+
+    every = _recurrence(term)
+    if every and start:
+        day_of_month = DAY_OF_MONTH.search(term)
+        if day_of_month:
+            # First such day on or after the start date
+            day = int(day_of_month.group(1))
+            first = start + relativedelta(day=day)
+            if first < start:
+                first = start + relativedelta(months=1, day=day)
+            return first, every
+        # Recurring terms fall on the anniversaries of the start date
+        return start + _delta(*every), every
+    return None
+
+
+def _term_end(duration: Dict[str, Any], start: Optional[date], end: Optional[date]) -> Optional[date]:
+    # The end date, or the start plus the initial term ("3 years")
+    if end is not None or start is None:
+        return end
+    term_length = TERM_LENGTH.search(str(duration.get("initial_term") or ""))
+    return start + _delta(_number(term_length.group(1)), term_length.group(2)) if term_length else None
+
+
+def _renewal_rules(summary: Dict[str, Any], start: Optional[date], end: Optional[date]) -> List[Dict[str, Any]]:
+    duration = summary.get("duration") or {}
+    initial_term = str(duration.get("initial_term") or "")
+    texts = [initial_term] + [str(c.get("description", "")) for c in summary.get("key_conditions", [])] \
+        + [str(o.get("details", "")) for o in summary.get("others", [])]
+    # "Non-renewal requires notice" alone doesn't make a contract renew
+    renewal_text = next((t for t in texts if re.search(r"(?<!non-)(?<!non )\brenew", t, re.I)), None)
+
+    # The first renewal, or the expiry
+    first = _term_end(duration, start, end)
+
+    rules = []
+    if renewal_text and not re.search(r"\bno(t)?\s+(automatic(ally)?\s+)?renew", renewal_text, re.I):
+        period = _recurrence(renewal_text)
+        if period is None:
+            term_length = re.search(NUMBER + r"[\s-]*" + UNIT + r"\s+(?:renewal\s+)?(?:term|period)", renewal_text, re.I)
+            period = (_number(term_length.group(1)), term_length.group(2).lower() + "s") if term_length else (1, "years")
+        if first is not None:
+            rules.append(_rule("Renewal", "renewal", first, renewal_text, period))
+    elif first is not None:
+        rules.append(_rule("Contract ends", "expiration", first, str(duration.get("end_date") or initial_term)))
+
+    # Notice periods count back from each renewal or from the expiry
+    for text in texts:
+        if not re.search(r"renew|expir|end of the (initial )?term|terminat", text, re.I):
+            continue
+        notice = NOTICE.search(text)
+        if notice and rules:
+            groups = [g for g in notice.groups() if g]
+            offset = _delta(_number(groups[0]), groups[1])
+            anchor = rules[0]
+            first_notice = date.fromisoformat(anchor["first_date"]) - offset
+            every = (anchor["every_n"], anchor["every_unit"]) if anchor["every_n"] else None
+            rules.append(_rule(f"Notice deadline ({groups[0]} {groups[1].lower()}s before {anchor['kind']})", "notice",
+                               first_notice, text, every))
+            break
+    return rules
+
+
+def extract_deadline_rules(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Deadline rules for one contract summary. Terms that cannot be placed keep first_date None."""
+    duration = summary.get("duration") or {}
+    start = parse_date(duration.get("start_date"))
+    end = parse_date(duration.get("end_date"))
+    ongoing = end is None
+    term_end = _term_end(duration, start, end)
+
+    rules = []
+    if start:
+        rules.append(_rule("Contract starts", "start", start, str(duration.get("start_date"))))
+    rules.extend(_renewal_rules(summary, start, end))
+
+    for event in summary.get("important_dates", []):
+        term = str(event.get("date", ""))
+        description = str(event.get("description", ""))
+        kind = classify(f"{description} {term}")
+        resolved = resolve_date_term(term, start, term_end) or resolve_date_term(f"{term} {description}", start, term_end)
+        if resolved is None:
+            rules.append(_rule(description or term, kind, None, term))
+            continue
+        first, every = resolved
+        title = description if parse_date(term) else f"{description} ({term})"
+        # Recurring dates stop with the contract, unless it runs until terminated
+        rules.append(_rule(title, kind, first, term, every, None if ongoing or every is None else end))
+    return rules
+
+
+def _occurrences(rule: Dict[str, Any], after: Optional[date], upto: date) -> List[date]:
+    first = date.fromisoformat(rule["first_date"])
+    if not rule["every_n"]:
+        return [first] if (after is None or first > after) and first <= upto else []
+    until = date.fromisoformat(rule["until"]) if rule["until"] else None
+    step = _delta(rule["every_n"], rule["every_unit"])
+    dates = []
+    k = 0
+    while True:
+        # Always step from the first date, so month ends don't drift (Jan 31 -> Feb 29 -> Mar 31)
+        current = first + step * k if k else first
+        if current > upto or (until and current > until):
+            break
+        if after is None or current > after:
+            dates.append(current)
+        k += 1
+    return dates
+
+
+def materialize(upto: date):
+    """Write occurrences of every rule up to `upto`; rules already written that far are skipped."""
+    with _extend_lock:
+        for rule in get_rules_materialized_before(upto.isoformat()):
+            after = date.fromisoformat(rule["materialized_until"]) if rule["materialized_until"] else None
+            due_dates = [d.isoformat() for d in _occurrences(rule, after, upto)]
+            # Rules with a last occurrence are finished once it is written; only open-ended ones are extended again
+            last = rule["first_date"] if not rule["every_n"] else rule["until"]
+            done = last is not None and last <= upto.isoformat()
+            save_deadline_occurrences(rule, due_dates, FULLY_MATERIALIZED if done else upto.isoformat())
+
+
+def index_contract_deadlines(contract_id: str, summary: Dict[str, Any], today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Resolve and store a contract's deadlines, materialized up to the default horizon."""
+    rules = replace_deadline_rules(contract_id, summary.get("title", ""), extract_deadline_rules(summary))
+    materialize((today or date.today()) + HORIZON)
+    return rules
+
+
+def deadlines_between(start: date, end: date, kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Deadlines due from start to end (inclusive), in date order; an index range scan."""
+    materialize(end)
+    return query_deadlines(start.isoformat(), end.isoformat(), kinds)
+
+
+def upcoming_deadlines(days: int, kinds: Optional[List[str]] = None, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    today = today or date.today()
+    return deadlines_between(today, today + timedelta(days=days), kinds)
+
+
+# Portfolio questions answered straight from the deadline table
+
+QUERY_KINDS = (
+    ("notice", r"notice"),
+    ("renewal", r"renew"),
+    ("expiration", r"expir|ending|\bend\b|terminat"),
+    ("payment", r"payment|\bpay\b|invoice"),
+    ("review", r"review|audit"),
+)
+ALL_DEADLINES = r"deadline|important date|key date|upcoming date|calendar"
+# Only questions about the portfolio ("which contracts ...", "renewals in Q3") are answered from the
+# table; "can we terminate within 30 days?" is about a clause and goes to the normal chat path
+PORTFOLIO = r"\b(contracts|agreements|leases|renewals|deadlines|notices|notice periods|expirations|payments|dates|expiring|renewing|upcoming|which|list|show)\b"
+CLAUSE_QUESTION = r"^\s*(can|could|may|should|must|how|why|what happens|is it|are we|do we|does)\b"
+MONTHS = ("january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december")
+
+
+def _mentioned_month(folded: str) -> Optional[int]:
+    for match in re.finditer(r"\b(" + "|".join(MONTHS) + r")\b", folded):
+        # "may" is only the month after a preposition or before a day or year ("may expire" is the verb)
+        if match.group(1) == "may" and not (re.search(r"\b(in|during|by|before|until|through|of|for)\s+$", folded[:match.start()])
+                                            or re.match(r"\s+\d", folded[match.end():])):
+            continue
+        return MONTHS.index(match.group(1)) + 1
+    return None
+
+
+def parse_deadline_window(text: str, today: date) -> Optional[Tuple[date, date]]:
+    folded = text.lower()
+    match = re.search(r"(?:next|coming|within|in)\s+(?:the\s+)?(?:next\s+)?" + NUMBER + r"\s+" + UNIT, folded)
+    if match:
+        return today, today + _delta(_number(match.group(1)), match.group(2))
+    quarter_start = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+    for phrase, start, end in (
+            ("this week", today, today + timedelta(days=6 - today.weekday())),
+            ("next week", today + timedelta(days=7 - today.weekday()), today + timedelta(days=13 - today.weekday())),
+            ("this month", today, today + relativedelta(day=31)),
+            ("next month", today + relativedelta(months=1, day=1), today + relativedelta(months=1, day=31)),
+            ("this quarter", today, quarter_start + relativedelta(months=3, days=-1)),
+            ("next quarter", quarter_start + relativedelta(months=3), quarter_start + relativedelta(months=6, days=-1))):
+        if phrase in folded:
+            return start, end
+    year = re.search(r"\b(20\d{2})\b", folded)
+    if year:
+        year = int(year.group(1))
+    elif "next year" in folded:
+        year = today.year + 1
+    elif "this year" in folded:
+        year = today.year
+    match = re.search(r"\bq([1-4])\b", folded)
+    if match:
+        quarter = int(match.group(1))
+        # Without a year, "Q3" is the next Q3 that has not ended yet
+        first = date(year or today.year + (3 * quarter < today.month), 3 * quarter - 2, 1)
+        return first, first + relativedelta(months=3, days=-1)
+    month = _mentioned_month(folded)
+    if month:
+        first = date(year or today.year + (month < today.month), month, 1)
+        return first, first + relativedelta(months=1, days=-1)
+    if "this year" in folded:
+        return today, date(today.year, 12, 31)
+    if "next year" in folded:
+        return date(today.year + 1, 1, 1), date(today.year + 1, 12, 31)
+    if year and re.search(r"\b(in|during|for)\s+" + str(year), folded):
+        return date(year, 1, 1), date(year, 12, 31)
+    return None
+
+
+def parse_deadline_query(text: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """{"kinds", "start", "end"} for portfolio date questions, or None for anything else."""
+    today = today or date.today()
+    folded = text.lower()
+    if not re.search(PORTFOLIO, folded) or re.search(CLAUSE_QUESTION, folded):
+        return None
+    kinds = [kind for kind, pattern in QUERY_KINDS if re.search(pattern, folded)]
+    if "notice" in kinds:
+        kinds = ["notice"]  # "notice periods ending ..." asks for the notice deadlines
+    if not kinds and not re.search(ALL_DEADLINES, folded):
+        return None
+    window = parse_deadline_window(folded, today)
+    if window is None:
+        return None
+    return {"kinds": kinds or None, "start": window[0], "end": window[1]}
+
+
+def answer_deadline_question(text: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """A chat response listing the matching deadlines, or None if this isn't a deadline question."""
+    query = parse_deadline_query(text, today)
+    if query is None:
+        return None
+    rows = deadlines_between(query["start"], query["end"], query["kinds"])
+    # "renewals with Acme next quarter" only lists that party's contracts
+    parties = find_entities(text)
+    if parties:
+        contract_ids = set(contract_ids_for(parties))
+        rows = [row for row in rows if row["contract_id"] in contract_ids]
+    label = " or ".join(query["kinds"]) + " date" if query["kinds"] else "deadline"
+    period = f"from {query['start'].isoformat()} to {query['end'].isoformat()}"
+    if parties:
+        period += " with " + ", ".join(party["names"][0] for party in parties)
+    if not rows:
+        answer = f"No {label}s {period}."
+    else:
+        lines = [f"- **{row['due_date']}** · {row['kind'].capitalize()} · {row['contract_title'] or row['contract_id']}: {row['title']}"
+                 for row in rows]
+        answer = f"Found {len(rows)} {label}{'s' if len(rows) > 1 else ''} {period}:\n\n" + "\n".join(lines)
+    return {"answer": answer, "references": [], "confidence": 1.0, "deadlines": rows}
@@ -0,0 +1,252 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Optional, Set
+from src.database.sqlite_db import replace_entities, list_entities, get_entities_version
+
+# Party/entity index. At save time every party in summary_result["parties"] is stored
+# under a normalized key (case, punctuation, accents and legal suffixes removed) plus
+# its aliases: defined terms ("the Supplier"), d/b/a and formerly-known-as names, the
+# initials of long names and the distinctive first word. Lookups go through an
+# in-memory index over those keys: exact key, then the same words in any order, then
+# trigram similarity for misspellings. Chat and storage search use the resolved
+# contract ids to answer "which contracts with X" directly and to pre-filter retrieval.
+
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "llc", "ltd", "limited", "plc", "lp", "llp",
+    "pllc", "gmbh", "ag", "kg", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "ab", "as", "oy", "pte", "pty",
+    "kk", "pvt", "pbc",
+}
+# First words too common to stand for the whole name ("Global Logistics" is not "Global")
+GENERIC_WORDS = {
+    "the", "a", "an", "and", "of", "global", "international", "national", "american", "united", "general", "first",
+    "new", "north", "south", "east", "west", "central", "royal", "city", "state", "county", "department", "bank",
+    "group", "holdings", "services", "solutions", "systems", "partners", "capital", "industries", "technologies",
+}
+# Defined terms that name a role rather than the party; every contract has a "Supplier"
+ROLE_WORDS = {
+    "supplier", "customer", "vendor", "buyer", "seller", "client", "company", "licensor", "licensee", "lessor", "lessee",
+    "landlord", "tenant", "contractor", "consultant", "distributor", "purchaser", "employer", "employee", "provider",
+    "recipient", "discloser", "party", "partner", "agent", "manufacturer", "reseller", "borrower", "lender", "owner",
+}
+# Words that never start or end a party name in a question
+QUESTION_WORDS = ROLE_WORDS | {
+    "contract", "contracts", "agreement", "agreements", "deal", "deals", "document", "documents", "parties",
+    "companies", "with", "from", "between", "and", "or", "of", "in", "for", "which", "what", "show", "list", "have",
+    "does", "many", "terms", "clause", "payment", "renewal", "termination",
+}
+ALIAS_PATTERNS = (
+    ("defined term", re.compile(r"\(\s*(?:the\s+)?[\"“”'‘’]([^\"“”'‘’)]{2,60})[\"“”'‘’]\s*\)", re.I)),
+    ("defined term", re.compile(r"(?:hereinafter|referred to as)\s+(?:the\s+)?[\"“”'‘’]?([^\"“”'‘’),;]{2,60})", re.I)),
+    ("dba", re.compile(r"\b(?:d/?b/?a|doing business as|trading as|t/a)\s+[\"“”'‘’]?([^\"“”'‘’),;]{2,60})", re.I)),
+    ("former name", re.compile(r"\b(?:f/?k/?a|formerly(?: known as)?)\s+[\"“”'‘’]?([^\"“”'‘’),;]{2,60})", re.I)),
+    ("aka", re.compile(r"\b(?:a/?k/?a|also known as)\s+[\"“”'‘’]?([^\"“”'‘’),;]{2,60})", re.I)),
+)
+# Everything after the first alias marker is not part of the legal name
+ALIAS_MARKER = re.compile(r"\s*(?:\(|,?\s*\b(?:d/?b/?a|doing business as|trading as|t/a|f/?k/?a|formerly|a/?k/?a|also known as|"
+                          r"hereinafter|referred to as)\b)", re.I)
+# Score of each kind of match; fuzzy matches score their trigram similarity below these
+KIND_SCORES = {"name": 1.0, "dba": 1.0, "former name": 1.0, "aka": 1.0, "defined term": 0.95, "acronym": 0.9,
+               "first word": 0.85}
+FUZZY_KINDS = ("name", "dba", "former name", "aka")
+FUZZY_MIN_LENGTH = 5
+FUZZY_THRESHOLD = 0.6       # for a search term that is meant to be a name
+TEXT_FUZZY_THRESHOLD = 0.8  # for spans of a free-text question
+MAX_SPAN_WORDS = 6
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def normalize(name: str) -> str:
+    """Comparison key of a party name: "The Acme Corp., Inc." -> "acme"."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.replace("&", " and ").replace("'s ", "s ")
+    text = re.sub(r"(?<=\b\w)\.(?=\w\b)", "", text)  # S.A. -> SA, U.S. -> US
+    words = re.sub(r"[^\w]+", " ", text).split()
+    if len(words) > 1 and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words = words[:-1]
+    return " ".join(words)
+
+
+def sorted_key(key: str) -> str:
+    return " ".join(sorted(key.split()))
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def aliases(name: str, extra: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """Normalized keys a party may be referred to by, each with its kind."""
+    found = []
+    legal_name = ALIAS_MARKER.split(name, maxsplit=1)[0]
+    key = normalize(legal_name)
+    if key:
+        found.append({"alias": key, "kind": "name"})
+    for kind, pattern in ALIAS_PATTERNS:
+        found += [{"alias": normalize(match), "kind": kind} for match in pattern.findall(name)
+                  if not (kind == "defined term" and normalize(match) in ROLE_WORDS)]
+    found += [{"alias": normalize(alias), "kind": "aka"} for alias in extra or []]
+    words = key.split()
+    # "International Business Machines" -> "ibm"; two-letter initials are too ambiguous
+    if len(words) >= 3:
+        found.append({"alias": "".join(word[0] for word in words if word not in ("and", "of")), "kind": "acronym"})
+    if len(words) >= 2 and words[0] not in GENERIC_WORDS and len(words[0]) >= 4:
+        found.append({"alias": words[0], "kind": "first word"})
+    unique = {}
+    for alias in found:
+        if len(alias["alias"]) >= 2 and alias["alias"] not in unique:
+            unique[alias["alias"]] = alias
+    return list(unique.values())
+
+
+def index_contract_entities(contract_id: str, summary: Dict[str, Any], file_name: str = "") -> List[Dict[str, Any]]:
+    """Store the normalized names and aliases of a contract's parties."""
+    global _index
+    rows = []
+    for party in summary.get("parties", []) or []:
+        if isinstance(party, str):
+            party = {"name": party}
+        name = (party.get("name") or "").strip()
+        if not name:
+            continue
+        legal_name = ALIAS_MARKER.split(name, maxsplit=1)[0].strip() or name
+        for alias in aliases(name, party.get("aliases")):
+            rows.append({
+                "contract_id": contract_id,
+                "contract_title": summary.get("title", ""),
+                "file_name": file_name,
+                "party_name": legal_name,
+                "role": party.get("role", ""),
+                "alias": alias["alias"],
+                "kind": alias["kind"],
+            })
+    replace_entities(contract_id, rows)
+    with _index_lock:
+        _index = None
+    return rows
+
+
+class EntityIndex:
+    """Alias keys of every stored party, with exact, word-order and trigram lookup."""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.entries = {}
+        for row in rows:
+            entry = self.entries.setdefault(row["alias"], {"alias": row["alias"], "kind": row["kind"], "names": {}, "contracts": {}})
+            # An alias shared by a full name and a nickname counts as the full name
+            if KIND_SCORES[row["kind"]] > KIND_SCORES[entry["kind"]]:
+                entry["kind"] = row["kind"]
+            entry["names"][row["party_name"]] = None
+            entry["contracts"][row["contract_id"]] = {
+                "contract_id": row["contract_id"], "contract_title": row["contract_title"],
+                "file_name": row["file_name"], "party_name": row["party_name"], "role": row["role"]}
+        self.by_sorted_key = {}
+        self.by_trigram = {}
+        self.trigram_counts = {}
+        for alias, entry in self.entries.items():
+            if entry["kind"] not in FUZZY_KINDS:
+                continue
+            self.by_sorted_key.setdefault(sorted_key(alias), []).append(alias)
+            if len(alias) >= FUZZY_MIN_LENGTH:
+                grams = trigrams(alias)
+                self.trigram_counts[alias] = len(grams)
+                for gram in grams:
+                    self.by_trigram.setdefault(gram, []).append(alias)
+        self.max_words = max((len(alias.split()) for alias in self.entries), default=0)
+
+    def _match(self, alias: str, score: float) -> Dict[str, Any]:
+        entry = self.entries[alias]
+        return {"alias": alias, "kind": entry["kind"], "names": list(entry["names"]), "score": score,
+                "contracts": list(entry["contracts"].values())}
+
+    def lookup(self, key: str, threshold: float = FUZZY_THRESHOLD) -> List[Dict[str, Any]]:
+        """Matches for one normalized name, best first."""
+        if not key:
+            return []
+        if key in self.entries:
+            return [self._match(key, KIND_SCORES[self.entries[key]["kind"]])]
+        same_words = self.by_sorted_key.get(sorted_key(key))
+        if same_words:
+            return [self._match(alias, 0.95) for alias in same_words]
+        if len(key) < FUZZY_MIN_LENGTH:
+            return []
+        grams = trigrams(key)
+        overlaps = Counter(alias for gram in grams for alias in self.by_trigram.get(gram, ()))
+        scored = sorted(((2 * shared / (len(grams) + self.trigram_counts[alias]), alias)
+                         for alias, shared in overlaps.items()), reverse=True)
+        return [self._match(alias, round(score, 3)) for score, alias in scored if score >= threshold]
+
+    def find_in_text(self, text: str, threshold: float = TEXT_FUZZY_THRESHOLD) -> List[Dict[str, Any]]:
+        """Parties mentioned anywhere in a question, longest span first."""
+        words = normalize(text).split()
+        matches, used = [], set()
+        for size in range(min(self.max_words, MAX_SPAN_WORDS), 0, -1):
+            for start in range(len(words) - size + 1):
+                positions = set(range(start, start + size))
+                span_words = words[start:start + size]
+                if positions & used or span_words[0] in QUESTION_WORDS or span_words[-1] in QUESTION_WORDS:
+                    continue
+                found = self.lookup(normalize(" ".join(span_words)), threshold)
+                if found:
+                    matches.append(found[0])
+                    used |= positions
+        return matches
+
+
+def _entity_index() -> EntityIndex:
+    # Rebuilt when the entities table changed, including from another process (e.g. a backfill)
+    global _index
+    version = get_entities_version()
+    with _index_lock:
+        if _index is None or _index[0] != version:
+            _index = (version, EntityIndex(list_entities()))
+        return _index[1]
+
+
+def resolve_entity(name: str, threshold: float = FUZZY_THRESHOLD) -> List[Dict[str, Any]]:
+    """Parties matching a name typed by the user, best first, each with its contracts."""
+    return _entity_index().lookup(normalize(name), threshold)
+
+
+def find_entities(text: str) -> List[Dict[str, Any]]:
+    """Parties named in a free-text question."""
+    return _entity_index().find_in_text(text)
+
+
+def contract_ids_for(matches: List[Dict[str, Any]]) -> List[str]:
+    return list(dict.fromkeys(contract["contract_id"] for match in matches for contract in match["contracts"]))
+
+
+# "Which contracts do we have with Flotek?" is a listing question answered from the index
+LIST_QUESTION = (r"^\s*(?:please\s+)?(?:(?:list|show|find|get|give)(?:\s+me)?|which|what|how many)\s+(?:all\s+|of\s+|any\s+)?"
+                 r"(?:the\s+|our\s+|my\s+)?(?:contracts?|agreements?|deals?|documents?)\b"
+                 r"|^\s*(?:do|does)\s+(?:we|i|the company)\s+have\s+(?:any\s+)?(?:contracts?|agreements?|deals?)\b")
+
+
+def answer_entity_question(text: str) -> Optional[Dict[str, Any]]:
+    """A chat response listing the contracts of the named parties, or None if this isn't such a question."""
+    if not re.search(LIST_QUESTION, text, re.I):
+        return None
+    matches = find_entities(text)
+    if not matches:
+        return None
+    sections = []
+    for match in matches:
+        name = match["names"][0]
+        lines = [f"- {c['contract_title'] or c['contract_id']} ({c['file_name']}) · {c['party_name']}"
+                 f"{' as ' + c['role'] if c['role'] else ''}" for c in match["contracts"]]
+        count = len(match["contracts"])
+        sections.append(f"**{name}** · {count} contract{'s' if count != 1 else ''}:\n\n" + "\n".join(lines))
+    return {
+        "answer": "\n\n".join(sections),
+        "references": [],
+        "confidence": 1.0 if all(match["score"] >= 0.85 for match in matches) else max(match["score"] for match in matches),
+        "entities": matches
+    }
@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from src.database.sqlite_db import (append_message, get_recent_messages, get_messages_between,
+                                    get_conversation_memory, save_conversation_memory)
+from src.services.scheduler import deprioritized, BACKGROUND
+
+# Conversation memory. Every chat message is stored in SQLite. The prompt gets the last
+# few turns verbatim plus a rolling summary of everything older, and the contracts the
+# last answer came from, all within a token budget. The summary is updated in the
+# background after each answer by folding only the messages that just left the verbatim
+# window into the previous summary, so its cost does not grow with the conversation.
+
+RECENT_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "3"))
+TOKEN_BUDGET = int(os.getenv("CHAT_MEMORY_TOKENS", "1200"))
+SUMMARY_SHARE = 0.4  # at most this much of the budget goes to the summary
+CHARS_PER_TOKEN = 4
+# "What about its renewal?" refers back to the contracts of the previous answer: the question
+# opens with a pronoun or "what/how about", or has a bare "it"/"its" as its subject
+FOLLOW_UP = (r"^\W*(?:and\s+|so\s+)?(?:(?:it|its|that|those|these|they|them|their|the same)\b|(?:what|how) about\b)"
+             r"|\b(?:is|are|was|does|do|did|can|could|will|would|should|shall|has|have|may|might|must)\s+(?:it|its)\b")
+# ...unless it also names other contracts, all of them, or a file
+ELSEWHERE = (r"\b(?:other|another|different|all|any|every|each|across|portfolio)\b"
+             r"|\b(?:contracts|agreements)\b|\.pdf\b")
+
+_summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:max(0, limit - 3)] + "..."
+
+
+def response_contract_ids(response: Dict[str, Any], search_results: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """The contracts an answer was drawn from, whichever path produced it."""
+    ids = [r["metadata"].get("contract_id") for r in search_results or []]
+    ids += [row["contract_id"] for key in ("clauses", "deadlines", "findings") for row in response.get(key, [])]
+    ids += [c["contract_id"] for entity in response.get("entities", []) for c in entity["contracts"]]
+    return list(dict.fromkeys(contract_id for contract_id in ids if contract_id))
+
+
+class ConversationMemory:
+    def __init__(self, session_id: str, solar):
+        self.session_id = session_id
+        self.solar = solar
+
+    def add(self, role: str, content: str, contract_ids: Optional[List[str]] = None) -> int:
+        message_id = append_message(self.session_id, role, content, contract_ids)
+        if role == "assistant":
+            self._schedule_summary()
+        return message_id
+
+    def page(self, limit: int) -> List[Dict[str, Any]]:
+        """The last `limit` messages, oldest first, for rendering."""
+        return get_recent_messages(self.session_id, limit)
+
+    def _schedule_summary(self):
+        with _pending_lock:
+            if self.session_id in _pending:
+                return  # the running fold picks up the new messages too
+            _pending.add(self.session_id)
+        _summarizer.submit(self._fold)
+
+    @deprioritized(BACKGROUND)
+    def _fold(self):
+        try:
+            while True:
+                window = get_recent_messages(self.session_id, RECENT_TURNS * 2)
+                memory = get_conversation_memory(self.session_id)
+                upto = window[0]["id"] - 1 if window else 0
+                folded = get_messages_between(self.session_id, memory["summarized_upto"], upto)
+                if not folded:
+                    return
+                summary = self.solar.summarize_conversation(memory["summary"], folded)
+                save_conversation_memory(self.session_id, summary, folded[-1]["id"])
+        except Exception as e:
+            print(f"Error updating the conversation summary: {str(e)}")
+        finally:
+            with _pending_lock:
+                _pending.discard(self.session_id)
+
+    def context(self, budget: int = TOKEN_BUDGET) -> Dict[str, Any]:
+        """Summary, recent messages and last contracts of the conversation, within `budget` tokens."""
+        memory = get_conversation_memory(self.session_id)
+        # Messages past the window that the background summary has not folded in yet stay verbatim
+        recent = [m for m in get_recent_messages(self.session_id, RECENT_TURNS * 4) if m["id"] > memory["summarized_upto"]]
+        summary = _clip(memory["summary"] or "", int(budget * SUMMARY_SHARE))
+        remaining = budget - (estimate_tokens(summary) if summary else 0)
+        kept = []
+        for message in reversed(recent):
+            if remaining <= 0:
+                break
+            content = _clip(message["content"], remaining)
+            remaining -= estimate_tokens(content)
+            kept.append({**message, "content": content})
+        kept.reverse()
+        contract_ids = next((m["contract_ids"] for m in reversed(recent) if m["contract_ids"]), [])
+        return {"summary": summary, "messages": kept, "contract_ids": contract_ids, "tokens": budget - remaining}
+
+    @staticmethod
+    def format(context: Dict[str, Any]) -> str:
+        parts = []
+        if context["summary"]:
+            parts.append(f"Summary of the earlier conversation: {context['summary']}")
+        parts += [f"{message['role'].capitalize()}: {message['content']}" for message in context["messages"]]
+        return "\n".join(parts)
+
+
+def is_follow_up(text: str) -> bool:
+    return re.search(FOLLOW_UP, text, re.I) is not None and re.search(ELSEWHERE, text, re.I) is None
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Any, Optional
+from src.services.scheduler import current_priority, request_priority
+from src.utils.tracing import span
+
+# Shared by every Streamlit session: concurrent calls are collected for a few
+# milliseconds and handed to the handler as one list, so 50 analysts asking at
+# once cost one embedding request and one scoring pass instead of 50.
+
+
+class MicroBatcher:
+    """Runs concurrent submit() calls through handler(items) -> results as one batch.
+
+    There is no worker thread: the first caller of a batch is its leader and
+    runs the handler for everyone. The leader only waits for more callers
+    while another batch is still running, so a single user pays no window.
+    """
+
+    def __init__(self, name: str, handler: Callable[[List[Any]], List[Any]],
+                 window_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        self.name = name
+        self.handler = handler
+        self.window = (window_ms if window_ms is not None else float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "5"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("RETRIEVAL_BATCH_MAX", "32"))
+        self.condition = threading.Condition()
+        self.pending = []  # (item, future, priority) waiting for a leader
+        self.collecting = False
+        self.running = 0
+        self.stats = {"batches": 0, "items": 0, "largest": 0}
+
+    def submit(self, item: Any) -> Any:
+        if self.window <= 0:
+            return self.handler([item])[0]
+        with self.condition:
+            # Fast path: nobody else around, so run the call directly
+            solo = not self.collecting and not self.running
+            if solo:
+                self.running += 1
+                self._count(1)
+        if solo:
+            try:
+                return self.handler([item])[0]
+            finally:
+                with self.condition:
+                    self.running -= 1
+
+        future = Future()
+        with self.condition:
+            self.pending.append((item, future, current_priority()))
+            leader = not self.collecting
+            if leader:
+                self.collecting = True
+            elif len(self.pending) >= self.max_batch:
+                self.condition.notify_all()
+        if leader:
+            self._lead()
+        return future.result()
+
+    def _lead(self):
+        with self.condition:
+            # Other callers are in flight, so more are likely to arrive within the window
+            if self.running:
+                deadline = time.monotonic() + self.window
+                while len(self.pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            # Callers left over elect the next leader among themselves
+            self.collecting = False
+            if self.pending:
+                self._promote()
+            self.running += 1
+            self._count(len(batch))
+        try:
+            with span(f"batch.{self.name}", size=len(batch)), \
+                    request_priority(min(priority for _, _, priority in batch)):
+                results = self.handler([item for item, _, _ in batch])
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self.condition:
+                self.running -= 1
+
+    def _count(self, size: int):
+        self.stats["batches"] += 1
+        self.stats["items"] += size
+        self.stats["largest"] = max(self.stats["largest"], size)
+
+    def _promote(self):
+        # Runs under the lock; batches beyond max_batch get a leader thread of their own
+        self.collecting = True
+        threading.Thread(target=self._lead, daemon=True, name=f"batch-{self.name}").start()
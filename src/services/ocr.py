@@ -1,18 +1,60 @@
+import io
 import requests
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Callable
+from src.utils.tracing import span
+from src.services.scheduler import get_scheduler, RetryableError, CircuitOpenError, RateLimitTimeout, RETRYABLE_STATUS, parse_retry_after
+
+def _upload_opener(file) -> Callable[[], tuple]:
+    """A function giving each OCR attempt its own (file name, stream) for the document.
+
+    Retries and hedged attempts may run at the same time, so they never share a stream.
+    A spooled file is opened again from disk for every attempt; an in-memory one (the
+    image-only pages of a PDF) is read once and each attempt gets a stream over the bytes.
+    """
+    name, stream = (file[0], file[1]) if isinstance(file, tuple) else (getattr(file, "name", None), file)
+    name = os.path.basename(name or "document.pdf")
+    path = getattr(stream, "name", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return lambda: (name, open(path, "rb"))
+    if isinstance(stream, (bytes, bytearray)):
+        content = bytes(stream)
+    else:
+        stream.seek(0)
+        content = stream.read()
+    return lambda: (name, io.BytesIO(content))
 
 class OCR:
     def __init__(self):
-        self.api_endpoint = "https://api.upstage.ai/v1/document-ai/ocr"
+        self.api_endpoint = f"{os.getenv('UPSTAGE_API_BASE', 'https://api.upstage.ai')}/v1/document-ai/ocr"
         self.api_key = os.getenv("UPSTAGE_API_KEY")
+        self.timeout = (10, float(os.getenv("UPSTAGE_OCR_TIMEOUT_S", "120")))
+
+    def _post(self, headers, open_upload) -> requests.Response:
+        name, stream = open_upload()
+        try:
+            with stream:
+                response = requests.post(self.api_endpoint, headers=headers, files={"document": (name, stream)}, timeout=self.timeout)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+        if response.status_code in RETRYABLE_STATUS:
+            raise RetryableError(f"HTTP {response.status_code}", parse_retry_after(response.headers.get("Retry-After")),
+                                 status=response.status_code)
+        return response
 
     def process_document(self, file) -> Dict[str, Any]:
         headers = {
             "Authorization": f"Bearer {self.api_key}"
         }
-        files = {
-            "document": file
-        }
-        response = requests.post(self.api_endpoint, headers=headers, files=files)
-        return response.json()
\ No newline at end of file
+        open_upload = _upload_opener(file)
+        with span("ocr") as current:
+            try:
+                response = get_scheduler("ocr").execute(lambda: self._post(headers, open_upload))
+            except (RetryableError, CircuitOpenError, RateLimitTimeout) as e:
+                # Callers check for "text"/"pages", so an error result surfaces as a failed extraction
+                print(f"OCR request failed: {e}")
+                return {"error": str(e)}
+            result = response.json()
+            current.set(status=response.status_code, request_bytes=len(response.request.body or b""),
+                        pages=result.get("numBilledPages"))
+            return result
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import re
+import threading
+from typing import List, Dict, Any, Optional
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline, make_union
+from src.services.query_examples import CONTRACT_QUERIES, GENERAL_QUERIES
+from src.utils.tracing import span
+
+# Contract types and the words that point to them
+CONTRACT_TYPE_TERMS = {
+    "lease agreement": ("lease", "rent", "tenant", "landlord", "premises", "deposit"),
+    "employment agreement": ("employment", "employee", "employer", "salary", "compete"),
+    "non-disclosure agreement": ("nda", "confidential", "confidentiality", "disclosure"),
+    "supply agreement": ("supply", "supplier", "goods", "delivery"),
+    "service agreement": ("service", "services", "sla", "levels"),
+    "distribution agreement": ("distribution", "distributor", "territory", "exclusivity"),
+    "license agreement": ("license", "licence", "licensee", "royalty", "intellectual"),
+    "purchase agreement": ("purchase", "buyer", "seller", "price"),
+    "loan agreement": ("loan", "lender", "borrower", "repayment"),
+    "consulting agreement": ("consulting", "consultant"),
+}
+# Question words and chat filler that never make useful search terms
+EXTRA_STOP_WORDS = {"does", "did", "tell", "know", "want", "need", "like", "list", "show", "give", "explain",
+                    "please", "thanks", "thank", "hello", "hi", "ok", "s", "t", "don", "doesn", "isn", "aren"}
+STOP_WORDS = ENGLISH_STOP_WORDS | EXTRA_STOP_WORDS
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+MAX_KEYWORDS = 8
+MAX_KEY_POINTS = 3
+
+
+class QueryAnalyzer:
+    """Local replacement for Solar.analyze_user_query.
+
+    A small TF-IDF + logistic regression classifier decides whether a question
+    is about contracts, helped by the titles and party names of the indexed
+    contracts. Keywords and key points are extracted RAKE-style and ranked by
+    their IDF in the keyword index. Only low-confidence questions go to the LLM.
+    """
+
+    def __init__(self, solar=None, vector_db=None, min_confidence: Optional[float] = None):
+        self.solar = solar
+        self.vector_db = vector_db
+        self.min_confidence = min_confidence if min_confidence is not None else float(os.getenv("QUERY_ANALYZER_MIN_CONFIDENCE", "0.7"))
+        self.classifier = self._train()
+        self.vocabulary = {"titles": [], "parties": []}
+        self.vocabulary_size = None
+        self.lock = threading.Lock()
+        self.stats = {"local": 0, "llm": 0}
+
+    @staticmethod
+    def _train():
+        features = make_union(
+            TfidfVectorizer(analyzer="word", ngram_range=(1, 2), sublinear_tf=True),
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True)
+        )
+        classifier = make_pipeline(features, LogisticRegression(C=10.0, max_iter=1000))
+        examples = CONTRACT_QUERIES + GENERAL_QUERIES
+        labels = [1] * len(CONTRACT_QUERIES) + [0] * len(GENERAL_QUERIES)
+        return classifier.fit(examples, labels)
+
+    def _refresh_vocabulary(self):
+        # Re-mined only when the contract index changes
+        if self.vector_db is None:
+            return
+        size = self.vector_db.contract_index.count()
+        if size != self.vocabulary_size:
+            with self.lock:
+                self.vocabulary = self.vector_db.contract_vocabulary()
+                self.vocabulary_size = size
+
+    def _corpus_matches(self, query: str) -> Dict[str, List[str]]:
+        folded = query.casefold()
+        words = set(WORD_PATTERN.findall(folded))
+        return {
+            "parties": [p for p in self.vocabulary["parties"] if len(p) > 2 and p.casefold() in folded],
+            "titles": [t for t in self.vocabulary["titles"] if len(t) > 2 and t.casefold() in folded],
+            "types": [t for t, terms in CONTRACT_TYPE_TERMS.items() if words & set(terms)],
+        }
+
+    @staticmethod
+    def _candidate_phrases(query: str) -> List[List[str]]:
+        # RAKE: stop words and punctuation split the question into candidate phrases
+        phrases, current = [], []
+        for token in re.findall(r"\w+|[^\w\s]", query.casefold()):
+            if token in STOP_WORDS or not token[0].isalnum() or (len(token) < 3 and not token.isdigit()):
+                if current:
+                    phrases.append(current)
+                current = []
+            else:
+                current.append(token)
+        if current:
+            phrases.append(current)
+        return phrases
+
+    def _keywords(self, phrases: List[List[str]]) -> Dict[str, List[str]]:
+        words = list(dict.fromkeys(word for phrase in phrases for word in phrase))
+        idf = self.vector_db.keyword_idf(words) if self.vector_db is not None else {}
+        fallback = (max(idf.values()) if idf else 1.0) * 0.5
+
+        # Words in the corpus rank by rarity; unseen words still count, at half the top weight
+        def word_score(word):
+            return idf.get(word, fallback) * (1 + 0.5 * sum(len(phrase) - 1 for phrase in phrases if word in phrase))
+
+        keywords = sorted(words, key=word_score, reverse=True)[:MAX_KEYWORDS]
+        scored = sorted(phrases, key=lambda phrase: sum(word_score(w) for w in phrase), reverse=True)
+        key_points = [" ".join(phrase) for phrase in scored][:MAX_KEY_POINTS]
+        return {"keywords": keywords, "key_points": key_points}
+
+    def analyze_locally(self, query: str) -> Dict[str, Any]:
+        self._refresh_vocabulary()
+        probability = float(self.classifier.predict_proba([query])[0][1])
+        matches = self._corpus_matches(query)
+        # Naming an indexed contract or party settles it
+        if matches["parties"] or matches["titles"]:
+            probability = max(probability, 0.95)
+        elif matches["types"]:
+            probability = max(probability, 0.8)
+
+        related = probability >= 0.5
+        confidence = probability if related else 1 - probability
+        if not related:
+            return {"is_contract_related": False, "confidence": confidence}
+
+        extracted = self._keywords(self._candidate_phrases(query))
+        if not extracted["keywords"]:
+            confidence = 0.0  # Nothing to search for; let the LLM try
+        # Matched names are key points as written; their words are already among the keywords
+        names = matches["parties"] + matches["titles"]
+        folded_names = {name.casefold() for name in names}
+        return {
+            "is_contract_related": True,
+            "key_points": names + [p for p in extracted["key_points"] if p not in folded_names],
+            "contract_types": matches["types"] + matches["titles"],
+            "keywords": extracted["keywords"],
+            "confidence": confidence
+        }
+
+    def analyze(self, query: str) -> Dict[str, Any]:
+        """Same result shape as Solar.analyze_user_query, plus "confidence" and "source"."""
+        with span("query.analyze") as current:
+            analysis = self.analyze_locally(query)
+            source = "local"
+            if analysis["confidence"] < self.min_confidence and self.solar is not None:
+                local_confidence = analysis["confidence"]
+                analysis = self.solar.analyze_user_query(query)
+                analysis["confidence"] = local_confidence
+                source = "llm"
+            analysis["source"] = source
+            self.stats[source] += 1
+            current.set(source=source, confidence=round(analysis["confidence"], 2))
+            return analysis
@@ -0,0 +1,92 @@
+# Labelled example questions for the local query analyzer's relevance classifier.
+# Keep both lists roughly balanced; add real questions from the chat log as they come up.
+
+CONTRACT_QUERIES = [
+    "When does the lease expire?",
+    "What is the termination notice period?",
+    "Can we terminate the agreement early?",
+    "What are the payment terms in the supply agreement?",
+    "Who are the parties to the distribution contract?",
+    "Is there an automatic renewal clause?",
+    "How many days do we have to pay an invoice?",
+    "What happens if the supplier breaches the contract?",
+    "Which contracts expire this year?",
+    "What is the governing law of the NDA?",
+    "How long does the confidentiality obligation last?",
+    "What is the liability cap?",
+    "Does the contract include an indemnification clause?",
+    "What are the penalties for late delivery?",
+    "When is the rent due each month?",
+    "What is the initial term of the service agreement?",
+    "Are there any exclusivity provisions?",
+    "What warranties does the vendor give?",
+    "Who is responsible for insurance under the lease?",
+    "What are our obligations under the license agreement?",
+    "How much is the monthly fee?",
+    "What is the late payment interest rate?",
+    "List all contracts with Acme",
+    "Summarize the key conditions of the employment contract",
+    "What are the important dates in the agreement?",
+    "Do we need written consent to assign the contract?",
+    "What is the notice period for non-renewal?",
+    "Which agreements have a non-compete clause?",
+    "How are disputes resolved under this contract?",
+    "Is arbitration required?",
+    "What is the security deposit?",
+    "What are the delivery obligations of the distributor?",
+    "When does the warranty period end?",
+    "What royalty rate applies?",
+    "Can the landlord increase the rent?",
+    "What is the start date of the consulting agreement?",
+    "Are there any force majeure provisions?",
+    "What service levels are guaranteed?",
+    "Who owns the intellectual property created under the contract?",
+    "What are the conditions for contract extension?",
+    "How do we give notice of termination?",
+    "What are the repayment terms of the loan agreement?",
+]
+
+GENERAL_QUERIES = [
+    "Hello",
+    "Hi there, how are you?",
+    "What can you do?",
+    "Thank you!",
+    "Thanks, that helps",
+    "Good morning",
+    "Tell me a joke",
+    "What is the weather like today?",
+    "Who won the football game last night?",
+    "Write a poem about the sea",
+    "What time is it?",
+    "How do I cook pasta?",
+    "Translate hello into French",
+    "What is the capital of Japan?",
+    "Recommend a good movie",
+    "What is 15 times 23?",
+    "Who are you?",
+    "Can you help me with my homework?",
+    "How tall is Mount Everest?",
+    "What is the meaning of life?",
+    "Explain quantum computing simply",
+    "What's your name?",
+    "Goodbye",
+    "How do I reset my password?",
+    "What is the best programming language?",
+    "Tell me about the history of Rome",
+    "How many calories are in an apple?",
+    "Play some music",
+    "What is machine learning?",
+    "Give me a recipe for chocolate cake",
+    "How far is the moon?",
+    "What are some tips for sleeping better?",
+    "ok",
+    "cool",
+    "What day is it tomorrow?",
+    "Who painted the Mona Lisa?",
+    "How do plants grow?",
+    "Suggest a name for my dog",
+    "What is the population of Thailand?",
+    "How do I learn to swim?",
+    "Are you a robot?",
+    "Nice to meet you",
+]
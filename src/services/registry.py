@@ -0,0 +1,44 @@
+import os
+import threading
+
+# Process-wide services, created on first use and shared by every Streamlit session.
+# Heavy modules (openai, chromadb, sklearn) are imported inside the factories, so
+# nothing is loaded until a page actually needs it.
+_services = {}
+_lock = threading.RLock()
+
+def _get_or_create(name, factory):
+    service = _services.get(name)
+    if service is None:
+        with _lock:
+            service = _services.get(name)
+            if service is None:
+                service = factory()
+                _services[name] = service
+    return service
+
+def get_solar():
+    def create():
+        from src.services.chat import Solar
+        return Solar()
+    return _get_or_create("solar", create)
+
+def get_ocr():
+    def create():
+        from src.services.ocr import OCR
+        return OCR()
+    return _get_or_create("ocr", create)
+
+def get_vector_db():
+    def create():
+        from src.database.vector_db import VectorDB
+        # Saved contracts stay indexed across restarts, so their stored summaries can be re-opened
+        clear_on_start = os.getenv("VECTOR_DB_CLEAR_ON_START", "0") == "1"
+        return VectorDB(clear_on_init=clear_on_start, solar=get_solar())
+    return _get_or_create("vector_db", create)
+
+def get_query_analyzer():
+    def create():
+        from src.services.query_analyzer import QueryAnalyzer
+        return QueryAnalyzer(solar=get_solar(), vector_db=get_vector_db())
+    return _get_or_create("query_analyzer", create)
@@ -0,0 +1,295 @@
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional, TypeVar
+from src.utils.tracing import set_attributes, propagate
+
+# Central scheduler for outbound Upstage calls. Each endpoint gets a token
+# bucket (requests per second), a cap on requests in flight, retries with
+# exponential backoff and jitter, an optional hedged second request for slow
+# responses and a circuit breaker. Waiting callers are served by priority, so
+# an interactive chat turn is not stuck behind a bulk ingestion job.
+
+INTERACTIVE = 0
+BULK = 1
+BACKGROUND = 2
+
+ENDPOINT_DEFAULTS = {
+    # rate (req/s), burst, max in flight, hedge delay (s, 0 = off)
+    "chat": {"rate": 5.0, "burst": 10, "max_in_flight": 4, "hedge_after": 0.0},
+    "embeddings": {"rate": 20.0, "burst": 40, "max_in_flight": 8, "hedge_after": 0.0},
+    "ocr": {"rate": 1.0, "burst": 2, "max_in_flight": 2, "hedge_after": 0.0},
+}
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+T = TypeVar("T")
+
+
+class RetryableError(Exception):
+    """A failed call that is worth retrying, optionally with the server's Retry-After."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, status: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Run the calls made inside this block (and in propagated threads) at the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def deprioritized(priority: int):
+    """Decorator: run the function at this priority, or the caller's if that is already lower."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with request_priority(max(priority, current_priority())):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestScheduler:
+    def __init__(self, name: str, rate: float, burst: int, max_in_flight: int, hedge_after: float = 0.0,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 failure_threshold: int = 5, cooldown: float = 30.0, acquire_timeout: float = 120.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.acquire_timeout = acquire_timeout
+
+        self.condition = threading.Condition()
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.waiters = []  # heap of (priority, sequence)
+        self.sequence = itertools.count()
+
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.half_open_trial = False
+
+        self.hedge_pool = ThreadPoolExecutor(max_workers=max(2, max_in_flight), thread_name_prefix=f"hedge-{name}")
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "hedged": 0, "hedge_wins": 0,
+                      "failures": 0, "circuit_opened": 0, "rejected": 0}
+
+    # Token bucket and priority queue
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def acquire(self, priority: int, timeout: Optional[float] = None, blocking: bool = True) -> bool:
+        """Take one token and one in-flight slot, highest priority (lowest number) first."""
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        entry = (priority, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self.waiters[0] == entry and self.tokens >= 1 and self.in_flight < self.max_in_flight:
+                        heapq.heappop(self.waiters)
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        self.condition.notify_all()  # The next waiter may now be at the head
+                        return True
+                    remaining = deadline - time.monotonic()
+                    if not blocking or remaining <= 0:
+                        self.waiters.remove(entry)
+                        heapq.heapify(self.waiters)
+                        self.condition.notify_all()
+                        return False
+                    # Wake up when the next token is due, or earlier if a slot is released
+                    next_token = max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else remaining
+                    self.condition.wait(min(remaining, max(next_token, 0.001)))
+            except BaseException:
+                if entry in self.waiters:
+                    self.waiters.remove(entry)
+                    heapq.heapify(self.waiters)
+                raise
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    # Circuit breaker
+
+    def _check_circuit(self):
+        with self.condition:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self.half_open_trial:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"{self.name}: too many consecutive failures, retrying after {self.cooldown:.0f}s")
+            # Half-open: let a single trial request through
+            self.half_open_trial = True
+
+    def _record(self, success: bool):
+        with self.condition:
+            if success:
+                self.consecutive_failures = 0
+                self.opened_at = None
+            else:
+                self.consecutive_failures += 1
+                if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                    if self.opened_at is None:
+                        self.stats["circuit_opened"] += 1
+                    self.opened_at = time.monotonic()
+            self.half_open_trial = False
+
+    def _end_trial(self):
+        # A non-retryable error says nothing about the endpoint's health
+        with self.condition:
+            self.half_open_trial = False
+
+    # Execution
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # Full jitter keeps retrying clients from synchronizing; Retry-After is a floor
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def _run_acquired(self, fn: Callable[[], T]) -> T:
+        try:
+            return fn()
+        finally:
+            self.release()
+
+    def _attempt(self, fn: Callable[[], T], priority: int) -> T:
+        if not self.acquire(priority):
+            raise RateLimitTimeout(f"{self.name}: no request slot within {self.acquire_timeout:.0f}s")
+        return self._run_acquired(fn)
+
+    def _hedged_attempt(self, fn: Callable[[], T], priority: int) -> T:
+        primary = self.hedge_pool.submit(propagate(self._attempt), fn, priority)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        # Hedge only with spare capacity; under rate pressure a duplicate request just adds load
+        if not self.acquire(priority, blocking=False):
+            return primary.result()
+        self.stats["hedged"] += 1
+        hedge = self.hedge_pool.submit(propagate(self._run_acquired), fn)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.stats["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def execute(self, fn: Callable[[], T], priority: Optional[int] = None, idempotent: bool = True) -> T:
+        """Call fn under the rate limit, retrying RetryableError with backoff.
+
+        Only idempotent calls are hedged; all Upstage calls made here are reads
+        (completions, embeddings, OCR), so that is the default.
+        """
+        priority = current_priority() if priority is None else priority
+        self.stats["calls"] += 1
+        attempt = 0
+        while True:
+            self._check_circuit()
+            try:
+                if idempotent and self.hedge_after > 0:
+                    result = self._hedged_attempt(fn, priority)
+                else:
+                    result = self._attempt(fn, priority)
+                self._record(True)
+                if attempt:
+                    set_attributes(retries=attempt)
+                return result
+            except RetryableError as e:
+                self._record(False)
+                if e.status == 429:
+                    self.stats["throttled"] += 1
+                if attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                print(f"{self.name}: {e}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self.stats["retries"] += 1
+                attempt += 1
+                time.sleep(delay)
+            except Exception:
+                self._end_trial()
+                raise
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_lock = threading.Lock()
+
+
+def _endpoint_config(endpoint: str) -> Dict[str, Any]:
+    defaults = ENDPOINT_DEFAULTS[endpoint]
+    prefix = f"UPSTAGE_{endpoint.upper()}"
+    return {
+        "rate": float(os.getenv(f"{prefix}_RPS", defaults["rate"])),
+        "burst": int(os.getenv(f"{prefix}_BURST", defaults["burst"])),
+        "max_in_flight": int(os.getenv(f"{prefix}_MAX_IN_FLIGHT", defaults["max_in_flight"])),
+        "hedge_after": float(os.getenv(f"{prefix}_HEDGE_MS", defaults["hedge_after"] * 1000)) / 1000,
+        "max_retries": int(os.getenv("UPSTAGE_MAX_RETRIES", "4")),
+        "failure_threshold": int(os.getenv("UPSTAGE_CIRCUIT_FAILURES", "5")),
+        "cooldown": float(os.getenv("UPSTAGE_CIRCUIT_COOLDOWN_S", "30")),
+    }
+
+
+def get_scheduler(endpoint: str) -> RequestScheduler:
+    """The process-wide scheduler for "chat", "embeddings" or "ocr"."""
+    with _lock:
+        if endpoint not in _schedulers:
+            _schedulers[endpoint] = RequestScheduler(endpoint, **_endpoint_config(endpoint))
+        return _schedulers[endpoint]
+
+
+def reset_schedulers():
+    """Drop the schedulers so the next call re-reads the configuration."""
+    with _lock:
+        _schedulers.clear()
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional
+
+# Speculative indexing. Chunking and embedding a contract only need the OCR text, so they
+# start in the background as soon as OCR returns, while the summary is written and
+# reviewed. The result is staged in memory under the session and document hash; "Save"
+# commits it (waiting for it if it is still running) and "Back to Upload" cancels and
+# drops it. Keying by session keeps one session from dropping another's work on the same
+# document. Staged work nobody saved is dropped after STAGING_TTL_S.
+
+WORKERS = int(os.getenv("STAGING_WORKERS", "2"))
+TTL_SECONDS = float(os.getenv("STAGING_TTL_S", "3600"))
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="staging")
+_staged = {}  # (session id, document hash) -> {"future", "cancel", "started"}
+_lock = threading.Lock()
+
+
+def _expire(now: float):
+    # Callers hold _lock. Every lookup expires first, so an expired result is never handed out.
+    for key, entry in list(_staged.items()):
+        if now - entry["started"] > TTL_SECONDS:
+            entry["cancel"].set()
+            entry["future"].cancel()
+            del _staged[key]
+
+
+def start_staging(session_id: str, document_hash: str, ocr_result: Dict[str, Any], vector_db) -> Future:
+    """Begin chunking and embedding a document in the background, once per session and document."""
+    with _lock:
+        now = time.monotonic()
+        _expire(now)
+        entry = _staged.get((session_id, document_hash))
+        if entry is None:
+            cancel = threading.Event()
+            future = _executor.submit(vector_db.stage_contract, ocr_result, cancelled=cancel.is_set)
+            entry = _staged[(session_id, document_hash)] = {"future": future, "cancel": cancel, "started": now}
+        return entry["future"]
+
+
+def take_staged(session_id: str, document_hash: str) -> Optional[Dict[str, Any]]:
+    """The staged contract for a document, waiting for it if needed; None if there is none or it failed."""
+    with _lock:
+        _expire(time.monotonic())
+        entry = _staged.pop((session_id, document_hash), None)
+    if entry is None:
+        return None
+    try:
+        return entry["future"].result()
+    except Exception as e:
+        print(f"Staged indexing failed, indexing again: {str(e)}")
+        return None
+
+
+def discard_staged(session_id: str, document_hash: Optional[str]):
+    with _lock:
+        _expire(time.monotonic())
+        entry = _staged.pop((session_id, document_hash), None)
+    if entry is not None:
+        entry["cancel"].set()
+        entry["future"].cancel()
+
+
+def staging_status(session_id: str, document_hash: str) -> Optional[str]:
+    """"running" or "done" for staged work of this session and document, None if there is none."""
+    with _lock:
+        _expire(time.monotonic())
+        entry = _staged.get((session_id, document_hash))
+    if entry is None:
+        return None
+    return "done" if entry["future"].done() else "running"
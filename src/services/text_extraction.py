@@ -0,0 +1,83 @@
+import io
+from typing import Dict, Any, Iterator, Tuple, Optional
+from pypdf import PdfReader, PdfWriter
+from src.services.ocr import OCR
+from src.utils.tracing import span
+
+# A page needs this much readable text before its text layer is trusted
+MIN_PAGE_CHARS = 50
+MIN_READABLE_RATIO = 0.6
+
+
+def is_usable_text(text: str) -> bool:
+    stripped = text.strip()
+    if len(stripped) < MIN_PAGE_CHARS:
+        return False
+    # Broken font encodings come out as control characters or "(cid:NN)" runs
+    readable = sum(ch.isalnum() or ch.isspace() or ch in ".,;:()[]$%&'\"-/“”’" for ch in stripped)
+    return readable / len(stripped) >= MIN_READABLE_RATIO and "(cid:" not in stripped
+
+
+def iter_text_layer(file) -> Iterator[Tuple[int, Optional[str]]]:
+    """Yield (page number, text) per page, with None for pages that need OCR."""
+    file.seek(0)
+    reader = PdfReader(file)
+    for page_number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"Text layer extraction failed on page {page_number}: {e}")
+            text = ""
+        yield page_number, text if is_usable_text(text) else None
+
+
+def _pages_as_pdf(file, page_numbers) -> io.BytesIO:
+    file.seek(0)
+    reader = PdfReader(file)
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def extract_document(file, ocr_service: Optional[OCR] = None) -> Dict[str, Any]:
+    """Text of a PDF in the OCR result shape ({text, pages}).
+
+    Born-digital pages are read from the PDF's text layer locally. Only
+    image-only pages are sent to the OCR API, bundled into one smaller PDF.
+    """
+    pages = {}
+    ocr_pages = []
+    try:
+        with span("extract.text_layer") as current:
+            for page_number, text in iter_text_layer(file):
+                if text is None:
+                    ocr_pages.append(page_number)
+                else:
+                    pages[page_number] = text
+            current.set(local_pages=len(pages), ocr_pages=len(ocr_pages))
+    except Exception as e:
+        # Not a PDF pypdf can read; let OCR handle the whole document
+        print(f"Local text extraction failed, using OCR: {e}")
+        file.seek(0)
+        return (ocr_service or OCR()).process_document(file)
+
+    result = {"numBilledPages": 0}
+    if ocr_pages:
+        ocr_result = (ocr_service or OCR()).process_document(("pages.pdf", _pages_as_pdf(file, ocr_pages)))
+        if "pages" not in ocr_result:
+            return ocr_result  # Surface the API error as before
+        # OCR numbers pages within the smaller PDF; map them back to the original page numbers
+        for ocr_page in ocr_result["pages"]:
+            pages[ocr_pages[ocr_page["id"] - 1]] = ocr_page.get("text", "")
+        result["numBilledPages"] = ocr_result.get("numBilledPages", len(ocr_pages))
+        result["modelVersion"] = ocr_result.get("modelVersion")
+
+    ordered = [{"id": page_number, "text": pages[page_number]} for page_number in sorted(pages)]
+    result["pages"] = ordered
+    result["text"] = "\n".join(page["text"] for page in ordered)
+    result["localPages"] = len(ordered) - len(ocr_pages)
+    return result
@@ -1,7 +1,5 @@
 import streamlit as st
 import json
-import re
-from datetime import datetime
 
 def display_summary(summary):
     def priority_color(priority):
@@ -121,25 +119,3 @@ def display_summary(summary):
     except json.JSONDecodeError:
         st.error("Error: Invalid JSON format in the summary.")
         st.text(summary)
-
-def extract_events_from_summary(data):
-    events = []
-    if 'important_dates' in data:
-        for event in data['important_dates']:
-            date = event['date']
-            if re.match(r'\d{4}-\d{2}-\d{2}', date):
-                events.append({
-                    'title': event['description'],
-                    'start': date,
-                    'end': date,
-                    'type': event['priority'].capitalize()
-                })
-            else:
-                # Handle non-specific dates
-                events.append({
-                    'title': f"{date}: {event['description']}",
-                    'start': datetime.now().strftime('%Y-%m-%d'),  # Use current date as placeholder
-                    'end': datetime.now().strftime('%Y-%m-%d'),
-                    'type': 'Non-specific'
-                })
-    return events
\ No newline at end of file
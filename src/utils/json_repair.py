@@ -0,0 +1,181 @@
+import copy
+import json
+import re
+from typing import Any, Dict, Optional
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
+
+# Local, dependency-light recovery of JSON from LLM output: code fences, prose
+# around the object, // comments, trailing commas, single quotes, Python
+# literals, unescaped inner quotes, raw control characters in strings and
+# objects cut off mid-way.
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null", "true": "true", "false": "false", "null": "null"}
+VALUE_END = ",:}]"
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def _strip_fences(text: str) -> str:
+    match = FENCE_PATTERN.search(text)
+    return match.group(1) if match else text
+
+
+def _next_significant(text: str, i: int) -> str:
+    # Skips whitespace and comments, so a value followed by "// note" still ends there
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end < 0 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i)
+            i = len(text) if end < 0 else end + 2
+        else:
+            return text[i]
+    return ""
+
+
+def repair_json(text: str) -> str:
+    """Rewrite almost-JSON into JSON. Does not validate the result."""
+    text = _strip_fences(text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise JSONRepairError("No JSON object or array found")
+    text = text[min(starts):]
+
+    out = []
+    stack = []
+    quote = None
+    escape = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escape:
+                if ch == "'":
+                    out[-1] = "'"  # \' is not a JSON escape, just the quote
+                else:
+                    out.append(ch)
+                escape = False
+            elif ch == "\\":
+                out.append(ch)
+                escape = True
+            elif ch == quote and _next_significant(text, i + 1) in VALUE_END:
+                # Only a quote followed by a delimiter ends the string; others are stray inner quotes
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch < " ":
+                out.append(json.dumps(ch)[1:-1])  # Raw newlines, tabs and other control characters
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end < 0 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i)
+            i = len(text) if end < 0 else end + 2
+            continue
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack and stack[-1] == ch:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # Ignore any prose after the closing bracket
+        elif ch.isdigit() or ch == "-":
+            j = i + 1
+            while j < len(text) and (text[j].isdigit() or text[j] in ".eE+-"):
+                j += 1
+            out.append(text[i:j])
+            i = j
+            continue
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < len(text) and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if _next_significant(text, j) == ":":
+                out.append(json.dumps(word))  # Unquoted key
+            else:
+                out.append(LITERALS.get(word, json.dumps(word)))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Close whatever a truncated response left open
+    if quote:
+        if escape:
+            out.pop()
+        out.append('"')
+    result = "".join(out).rstrip()
+    if stack:
+        if result.endswith(","):
+            result = result[:-1]
+        if result.endswith(":"):
+            result += " null"
+        elif stack[-1] == "}" and re.search(r'[{,]\s*"(?:[^"\\]|\\.)*"$', result):
+            result += ": null"  # A key whose value never arrived
+        result += "".join(reversed(stack))
+    return result
+
+
+def _drop_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _apply_defaults(data: Any, schema: Dict[str, Any]) -> Any:
+    if isinstance(data, dict) and schema.get("type") == "object":
+        for key, prop in schema.get("properties", {}).items():
+            if key not in data and "default" in prop:
+                data[key] = copy.deepcopy(prop["default"])
+            elif key in data:
+                data[key] = _apply_defaults(data[key], prop)
+    elif isinstance(data, list) and isinstance(schema.get("items"), dict):
+        data = [_apply_defaults(item, schema["items"]) for item in data]
+    return data
+
+
+def loads(text: str, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """Parse LLM output as JSON, repairing it locally if needed.
+
+    Missing properties that have a schema default are filled in before the
+    result is validated. Raises JSONRepairError if nothing valid can be recovered.
+    """
+    if text is None:
+        raise JSONRepairError("No content to parse")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            data = json.loads(repair_json(text))
+        except json.JSONDecodeError as e:
+            raise JSONRepairError(f"Could not repair JSON: {e}") from e
+
+    if schema is not None:
+        data = _apply_defaults(data, schema)
+        error = best_match(Draft7Validator(schema).iter_errors(data))
+        if error is not None:
+            raise JSONRepairError(f"JSON does not match schema: {error.message}")
+    return data
@@ -0,0 +1,104 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Many readers or one writer.
+
+    A waiting writer holds back new readers, so a steady stream of searches
+    cannot starve ingestion. Both sides are re-entrant per thread, and a
+    writer may also read, so locked methods can call each other.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = None  # ident of the thread holding the write lock
+        self.write_depth = 0
+        self.waiting_writers = 0
+        self.local = threading.local()
+        self.stats = {"reads": 0, "writes": 0, "read_wait_s": 0.0, "write_wait_s": 0.0}
+
+    def _read_depth(self) -> int:
+        return getattr(self.local, "depth", 0)
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        if self.writer == me or self._read_depth():
+            self.local.depth = self._read_depth() + 1
+            try:
+                yield
+            finally:
+                self.local.depth -= 1
+            return
+
+        start = time.perf_counter()
+        with self.condition:
+            while self.writer is not None or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+            self.stats["reads"] += 1
+            self.stats["read_wait_s"] += time.perf_counter() - start
+        self.local.depth = 1
+        try:
+            yield
+        finally:
+            self.local.depth = 0
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self.writer == me:
+            self.write_depth += 1
+            try:
+                yield
+            finally:
+                self.write_depth -= 1
+            return
+        if self._read_depth():
+            raise RuntimeError("Cannot upgrade a read lock to a write lock")
+
+        start = time.perf_counter()
+        with self.condition:
+            self.waiting_writers += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+            finally:
+                self.waiting_writers -= 1
+            self.writer = me
+            self.write_depth = 1
+            self.stats["writes"] += 1
+            self.stats["write_wait_s"] += time.perf_counter() - start
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = None
+                self.write_depth = 0
+                self.condition.notify_all()
+
+
+def read_locked(method):
+    """Method decorator: hold self.rw_lock for reading."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.rw_lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def write_locked(method):
+    """Method decorator: hold self.rw_lock for writing."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.rw_lock.write():
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,9 @@
+import streamlit as st
+
+def display_timing(rows, title="⏱ Timing"):
+    """Per-stage timings of one request, as produced by Trace.timing_rows()."""
+    if not rows:
+        return
+    total = rows[0]["ms"]
+    with st.expander(f"{title} ({total / 1000:.2f} s)"):
+        st.dataframe(rows, hide_index=True, use_container_width=True)
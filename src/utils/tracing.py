@@ -0,0 +1,251 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+# Lightweight span tracing. A trace groups the spans of one user request
+# (an upload, a save, a chat turn); span durations are aggregated for a
+# Prometheus text endpoint, and finished traces can be appended to a JSONL
+# file (TRACE_LOG_PATH), which is rotated once it reaches TRACE_LOG_MAX_MB.
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+@functools.lru_cache(maxsize=1)
+def tracing_enabled() -> bool:
+    # Read on first use rather than import, so values from .env are picked up
+    return os.getenv("TRACING_ENABLED", "1") == "1"
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attrs": self.attrs
+        }
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {"trace_id": self.trace_id, "name": self.name, "spans": [s.to_dict() for s in spans]}
+
+    def timing_rows(self) -> List[Dict[str, Any]]:
+        """Spans in start order with their nesting depth, for the timing panel."""
+        spans = self.to_dict()["spans"]
+        depth = {}
+        rows = []
+        for span in spans:
+            depth[span["span_id"]] = depth.get(span["parent_id"], -1) + 1
+            rows.append({
+                "stage": "· " * depth[span["span_id"]] + span["name"],
+                "ms": round(span["duration_ms"] or 0.0, 1),
+                "details": ", ".join(f"{k}={v}" for k, v in span["attrs"].items())
+            })
+        return rows
+
+
+class Metrics:
+    """Per-span-name latency histograms and counters in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.tokens = {}
+        self.errors = {}
+
+    def observe(self, span: Span):
+        seconds = span.duration_ms / 1000
+        with self.lock:
+            hist = self.histograms.setdefault(span.name, {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+            hist["count"] += 1
+            hist["sum"] += seconds
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if isinstance(span.attrs.get(kind), int):
+                    key = (span.name, kind.split("_")[0])
+                    self.tokens[key] = self.tokens.get(key, 0) + span.attrs[kind]
+            if span.error:
+                self.errors[span.name] = self.errors.get(span.name, 0) + 1
+
+    def prometheus_text(self) -> str:
+        lines = ["# HELP contract_span_duration_seconds Duration of traced stages.",
+                 "# TYPE contract_span_duration_seconds histogram"]
+        with self.lock:
+            for name, hist in sorted(self.histograms.items()):
+                for bound, count in zip(BUCKETS, hist["buckets"]):
+                    lines.append(f'contract_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'contract_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'contract_span_duration_seconds_sum{{span="{name}"}} {hist["sum"]:.6f}')
+                lines.append(f'contract_span_duration_seconds_count{{span="{name}"}} {hist["count"]}')
+            lines += ["# HELP contract_llm_tokens_total Tokens used by LLM calls.",
+                      "# TYPE contract_llm_tokens_total counter"]
+            for (name, kind), count in sorted(self.tokens.items()):
+                lines.append(f'contract_llm_tokens_total{{span="{name}",kind="{kind}"}} {count}')
+            lines += ["# HELP contract_span_errors_total Traced stages that raised.",
+                      "# TYPE contract_span_errors_total counter"]
+            for name, count in sorted(self.errors.items()):
+                lines.append(f'contract_span_errors_total{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_export_lock = threading.Lock()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span. Yields the Span so callers can add attributes."""
+    current = Span(name, _current_span.get().span_id if _current_span.get() else None, attrs)
+    if not tracing_enabled():
+        yield current
+        return
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        # Streamlit's rerun/stop signals are BaseExceptions and don't count as errors
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        _current_span.reset(token)
+        trace_ = _current_trace.get()
+        if trace_ is not None:
+            trace_.add(current)
+        metrics.observe(current)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Start a trace with a root span; the finished trace is appended to the trace log, if one is set."""
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        with span(name, **attrs):
+            yield current
+    finally:
+        _current_trace.reset(token)
+        if tracing_enabled():
+            export(current)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_attributes(**attrs):
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def propagate(fn):
+    """Run fn in the caller's trace context, e.g. from a thread pool."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets a copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def export(trace_: Trace, path: Optional[str] = None):
+    path = path or os.getenv("TRACE_LOG_PATH")
+    if not path:
+        return
+    max_bytes = float(os.getenv("TRACE_LOG_MAX_MB", "50")) * 1024 * 1024
+    line = json.dumps(trace_.to_dict(), ensure_ascii=False, default=str)
+    try:
+        with _export_lock:
+            # Keep one previous file, so the log never takes more than twice the cap
+            if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        print(f"Could not write trace: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None):
+    """Serve /metrics on a background thread. A no-op when no port is configured or already serving."""
+    global _server
+    port = port if port is not None else int(os.getenv("TRACE_METRICS_PORT", "0"))
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+            print(f"Serving trace metrics on http://127.0.0.1:{port}/metrics")
+    return _server
@@ -0,0 +1,14 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.bm25_index import light_stem
+
+
+def test_singular_and_plural_stem_to_the_same_token():
+    for singular, plural in [("license", "licenses"), ("service", "services"), ("clause", "clauses"),
+                             ("lease", "leases"), ("box", "boxes"), ("business", "businesses"),
+                             ("process", "processes"), ("branch", "branches"), ("party", "parties"),
+                             ("renewal", "renewals"), ("agreement", "agreements")]:
+        assert light_stem(singular) == light_stem(plural), (singular, plural)
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.json_repair import loads
+
+
+def test_single_quoted_string_with_escaped_quote():
+    assert loads("{'answer': 'It\\'s fine'}") == {"answer": "It's fine"}
+
+
+def test_escaped_single_quote_in_double_quoted_string():
+    assert loads('{"answer": "It\\\'s fine"}') == {"answer": "It's fine"}
+
+
+def test_fenced_truncated_object():
+    assert loads('```json\n{"answer": "yes", "confidence": 0.9, "references": [') == \
+        {"answer": "yes", "confidence": 0.9, "references": []}
+
+
+def test_comment_after_closing_quote():
+    assert loads('{"a": "x" // note\n, "b": 1}') == {"a": "x", "b": 1}
+    assert loads('{"a": "x" /* note */, "b": 1}') == {"a": "x", "b": 1}
+
+
+def test_raw_control_characters_in_strings():
+    assert loads('{"a": "tab\there", "b": "line\r\nbreak"}') == {"a": "tab\there", "b": "line\r\nbreak"}
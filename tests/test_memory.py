@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.memory import is_follow_up
+
+
+def test_follow_up_questions():
+    assert is_follow_up("What about its renewal?")
+    assert is_follow_up("Does it renew automatically?")
+    assert is_follow_up("Their payment terms?")
+
+
+def test_questions_pointing_elsewhere_are_not_follow_ups():
+    assert not is_follow_up("What are the payment terms?")
+    assert not is_follow_up("What does the Acme agreement say about that clause?")
+    assert not is_follow_up("What about the other contracts?")
+    assert not is_follow_up("What is the notice period in lease.pdf?")
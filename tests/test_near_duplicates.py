@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.near_duplicates import NearDuplicateIndex
+
+NOTICE = ("Either party may terminate this Agreement for convenience by giving the other party not less than "
+          "{days} days prior written notice, and all fees accrued up to the effective date of termination "
+          "shall remain payable in full by the Customer to the Supplier without any set-off or deduction.")
+
+
+def test_clauses_differing_only_in_numbers_are_kept_apart():
+    index = NearDuplicateIndex(threshold=0.8)
+    first, second = NOTICE.format(days="thirty (30)"), NOTICE.format(days="sixty (60)")
+    # The MinHash estimate alone would call them duplicates
+    assert index.similarity(index.signature(first), index.signature(second)) >= index.threshold
+    index.add("a", index.signature(first), first)
+    assert index.find(index.signature(second), second) is None
+    assert index.find(index.signature(first), first)[0] == "a"
+    assert index.collapse([first, second, first]) == [0, 1]